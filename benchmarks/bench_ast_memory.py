@@ -0,0 +1,81 @@
+'''
+Compares the memory held by a parsed 100k-statement program using the
+slotted AST node classes against the same tree built from plain
+dict-backed Elements. The Element copy reuses the parsed tree's strings and
+ints, so its figure is a lower bound.
+
+Run from the repo root:
+    python -m benchmarks.bench_ast_memory [--statements N]
+'''
+import argparse
+import gc
+import tracemalloc
+
+import brewparse
+from element import Element, Node
+
+
+def generate_program(statements):
+    lines = ['func main() {', '  a = 1; b = 2; c = 3;']
+    for index in range(statements):
+        kind = index % 5
+        if kind == 0:
+            lines.append(f'  a = a + b * {index} - c / 2;')
+        elif kind == 1:
+            lines.append(f'  if (a > {index} && b != c) {{ print("x", a); }}')
+        elif kind == 2:
+            lines.append(f'  b = f(a, {index}, "s");')
+        elif kind == 3:
+            lines.append(f'  while (c < 0) {{ c = c + 1; }}')
+        else:
+            lines.append(f'  c = !(a == b) || -a <= {index};')
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+def to_elements(value):
+    if isinstance(value, Node):
+        return Element(value.elem_type, **{key: to_elements(v) for key, v in value.dict.items()})
+    if isinstance(value, (list, tuple)):
+        return [to_elements(v) for v in value]
+    return value
+
+
+def count_nodes(value):
+    if isinstance(value, Node):
+        return 1 + sum(count_nodes(v) for v in value.dict.values())
+    if isinstance(value, (list, tuple)):
+        return sum(count_nodes(v) for v in value)
+    return 0
+
+
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--statements', type=int, default=100_000)
+    args = parser.parse_args()
+
+    program = generate_program(args.statements)
+    ast, slotted_bytes = traced(lambda: brewparse.parse_program(program, use_cache=False, backend='pratt'))
+    nodes = count_nodes(ast)
+    plain, plain_bytes = traced(lambda: to_elements(ast))
+    if str(plain) != str(ast):
+        raise SystemExit('converted tree differs')
+
+    print(f'{args.statements} statements, {nodes} nodes')
+    print(f'  slotted nodes: {slotted_bytes / 2**20:7.1f} MiB ({slotted_bytes / nodes:5.1f} bytes/node)')
+    print(f'  dict Elements: {plain_bytes / 2**20:7.1f} MiB ({plain_bytes / nodes:5.1f} bytes/node)')
+
+
+if __name__ == '__main__':
+    main()
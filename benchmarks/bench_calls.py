@@ -0,0 +1,88 @@
+'''
+Times call-heavy recursive Brewin programs on the tree-walking interpreters.
+
+Run from the repo root:
+    python -m benchmarks.bench_calls [--runs N] [--versions 3,4]
+
+Every program passes its arguments through nested calls and expressions, so
+the numbers mostly measure the call protocol: resolving the callee,
+evaluating each actual once and binding it into the callee's frame. Each
+run's output is checked against the expected result. Calls used as
+statements are assigned to a variable, since a statement that produces a
+value ends the enclosing function in these interpreters.
+'''
+import argparse
+import importlib
+import sys
+import time
+
+PROGRAMS = {
+    'fib': ('''
+func fib(n) {
+  if (n < 2) { return n; }
+  return fib(n - 1) + fib(n - 2);
+}
+func main() { print(fib(17)); }
+''', ['1597']),
+    'mutual': ('''
+func even(n) { if (n == 0) { return true; } return odd(n - 1); }
+func odd(n) { if (n == 0) { return false; } return even(n - 1); }
+func main() {
+  i = 0;
+  while (i < 40) { r = even(150); i = i + 1; }
+  print(even(150));
+}
+''', ['true']),
+    'nested_args': ('''
+func add(a, b) { return a + b; }
+func sum(n) {
+  if (n == 0) { return 0; }
+  return add(add(n, 0), sum(add(n, -1)));
+}
+func main() {
+  i = 0;
+  while (i < 20) { r = sum(200); i = i + 1; }
+  print(sum(200));
+}
+''', ['20100']),
+    'ref_args': ('''
+func count(ref total, n) {
+  if (n == 0) { return; }
+  total = total + n;
+  count(total, n - 1);
+}
+func main() {
+  total = 0;
+  i = 0;
+  while (i < 30) { r = count(total, 150); i = i + 1; }
+  print(total);
+}
+''', ['339750']),
+}
+
+
+def run(version, program, expected):
+    interpreter = importlib.import_module(f'interpreterv{version}').Interpreter(console_output=False)
+    start = time.perf_counter()
+    interpreter.run(program)
+    elapsed = time.perf_counter() - start
+    if interpreter.get_output() != expected:
+        raise SystemExit(f'v{version} printed {interpreter.get_output()}, expected {expected}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--versions', default='3,4')
+    args = parser.parse_args()
+    sys.setrecursionlimit(20000)
+
+    for name, (program, expected) in PROGRAMS.items():
+        for version in args.versions.split(','):
+            best = min(run(version, program, expected) for _ in range(args.runs))
+            print(f'{name:>12} v{version}: {best * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+'''
+Runs programs that pass and return objects by value on interpreterv4's
+engines, and reports how long each takes and what its by-value copies
+came to (Interpreter.copies.stats(), see brewcopy.py).
+
+Run from the repo root:
+    python -m benchmarks.bench_copies [--runs N] [--engines tree,closure,vm,python]
+
+"deferred" copies are handles that only copied the objects they read
+("objects"); "flushed" ones had to be finished because their source was
+about to change; "eager" ones were deep-copied up front.
+'''
+import argparse
+import time
+
+from interpreterv4 import Interpreter
+
+
+# a 30-node list passed by value to a function that reads its head
+READ_HEAD = ('''
+func head_value(list) {
+  return list.value;
+}
+func main() {
+  head = nil;
+  k = 0;
+  while (k < 30) {
+    node = @;
+    node.value = k;
+    node.next = head;
+    head = node;
+    k = k + 1;
+  }
+  total = 0;
+  i = 0;
+  while (i < 2000) {
+    total = total + head_value(head);
+    i = i + 1;
+  }
+  print(total);
+}
+''', ['58000'])
+
+# an object threaded through calls that update it and return it
+UPDATE_AND_RETURN = ('''
+func bump(counter) {
+  counter.count = counter.count + 1;
+  return counter;
+}
+func main() {
+  counter = @;
+  counter.count = 0;
+  history = @;
+  history.name = "counter";
+  counter.history = history;
+  i = 0;
+  while (i < 2000) {
+    counter = bump(counter);
+    i = i + 1;
+  }
+  print(counter.count);
+}
+''', ['2000'])
+
+# the caller changes the list while the callee still holds its copy
+CHANGED_UNDERNEATH = ('''
+func first_after_change(list) {
+  head.value = head.value + 1;
+  return list.value;
+}
+func main() {
+  head = nil;
+  k = 0;
+  while (k < 10) {
+    node = @;
+    node.value = k;
+    node.next = head;
+    head = node;
+    k = k + 1;
+  }
+  total = 0;
+  i = 0;
+  while (i < 1000) {
+    total = total + first_after_change(head);
+    i = i + 1;
+  }
+  print(total);
+}
+''', ['508500'])
+
+PROGRAMS = {
+    'read_head': READ_HEAD,
+    'update_and_return': UPDATE_AND_RETURN,
+    'changed_underneath': CHANGED_UNDERNEATH,
+}
+
+
+def run(engine, program, expected):
+    interpreter = Interpreter(console_output=False, engine=engine)
+    start = time.perf_counter()
+    interpreter.run(program)
+    elapsed = time.perf_counter() - start
+    if interpreter.get_output() != expected:
+        raise SystemExit(f'{engine} printed {interpreter.get_output()}, expected {expected}')
+    return elapsed, interpreter.copies.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--engines', default='tree,closure,vm,python')
+    args = parser.parse_args()
+
+    for name, (program, expected) in PROGRAMS.items():
+        for engine in args.engines.split(','):
+            elapsed, stats = min((run(engine, program, expected) for _ in range(args.runs)),
+                                 key=lambda result: result[0])
+            print(f'{name:>18}  {engine:>7} {elapsed * 1000:7.1f} ms  deferred {stats["deferred"]:5}'
+                  f'  objects {stats["objects_copied"]:5}  flushed {stats["flushed"]:5}  eager {stats["eager"]:5}')
+
+
+if __name__ == '__main__':
+    main()
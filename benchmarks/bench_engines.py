@@ -0,0 +1,82 @@
+'''
+Compares interpreterv4's execution engines on a small benchmark suite and
+reports the speedup of each over the tree walker.
+
+Run from the repo root:
+    python -m benchmarks.bench_engines [--runs N] [--engines tree,closure,vm,python]
+
+The suite is the call-heavy programs from bench_calls, a loop from
+bench_loops and a program built on lambdas and objects. Every engine must
+print the expected output for every program.
+'''
+import argparse
+import sys
+import time
+
+from benchmarks.bench_calls import PROGRAMS
+from benchmarks.bench_loops import loop_program
+from interpreterv4 import Interpreter
+
+SUITE = dict(PROGRAMS)
+SUITE['loop'] = (loop_program(100, 20000), ['20000'])
+SUITE['lambdas_objects'] = ('''
+func make_counter() {
+  c = @;
+  c.count = 0;
+  c.step = lambda(n) { return n + 1; };
+  return c;
+}
+func main() {
+  counter = make_counter();
+  total = 0;
+  i = 0;
+  while (i < 3000) {
+    f = counter.step;
+    counter.count = f(counter.count);
+    add = lambda(x) { return x + i; };
+    total = add(total);
+    i = i + 1;
+  }
+  print(counter.count, " ", total);
+}
+''', ['3000 4498500'])
+
+
+def run(engine, program, expected):
+    interpreter = Interpreter(console_output=False, engine=engine)
+    start = time.perf_counter()
+    interpreter.run(program)
+    elapsed = time.perf_counter() - start
+    if interpreter.get_output() != expected:
+        raise SystemExit(f'{engine} printed {interpreter.get_output()}, expected {expected}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--engines', default='tree,closure,vm,python')
+    args = parser.parse_args()
+    sys.setrecursionlimit(20000)
+    engines = args.engines.split(',')
+
+    totals = dict.fromkeys(engines, 0.0)
+    for name, (program, expected) in SUITE.items():
+        times = {}
+        for engine in engines:
+            times[engine] = min(run(engine, program, expected) for _ in range(args.runs))
+            totals[engine] += times[engine]
+        cells = ''.join(
+            f'  {engine} {times[engine] * 1000:7.1f} ms ({times[engines[0]] / times[engine]:4.2f}x)'
+            for engine in engines
+        )
+        print(f'{name:>16}:{cells}')
+    cells = ''.join(
+        f'  {engine} {totals[engine] * 1000:7.1f} ms ({totals[engines[0]] / totals[engine]:4.2f}x)'
+        for engine in engines
+    )
+    print(f'{"total":>16}:{cells}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+'''
+Runs loops full of && and || guards on interpreterv4's engines, with both
+operands always evaluated (the default) and with Interpreter(short_circuit=True),
+and reports the speedup of the latter.
+
+Run from the repo root:
+    python -m benchmarks.bench_guards [--runs N] [--iterations N] [--engines tree,closure,vm,python]
+
+In each program the right operand is a call that's only needed for some
+iterations: a loop, a deep copy of an object passed by value, or a chain
+of calls. None of them print or fail, so both modes must print the same
+output.
+'''
+import argparse
+import time
+
+from interpreterv4 import Interpreter
+
+
+# the right operand runs a loop; it only matters for the upper half of i
+def costly_check(iterations):
+    return f'''
+func costly(n) {{
+  j = 0;
+  while (j < 20) {{
+    j = j + 1;
+  }}
+  return n > j;
+}}
+func main() {{
+  count = 0;
+  i = 0;
+  while (i < {iterations}) {{
+    if (i >= {iterations // 2} && costly(i)) {{
+      count = count + 1;
+    }}
+    i = i + 1;
+  }}
+  print(count);
+}}
+''', [str(iterations - max(iterations // 2, 21))]
+
+
+# the right operand deep-copies an object holding a 10-node list
+def copied_object(iterations):
+    return f'''
+func has_total(table) {{
+  return table.total > 0;
+}}
+func main() {{
+  table = @;
+  table.total = 1;
+  table.items = nil;
+  k = 0;
+  while (k < 10) {{
+    node = @;
+    node.value = k;
+    node.next = table.items;
+    table.items = node;
+    k = k + 1;
+  }}
+  hits = 0;
+  i = 0;
+  while (i < {iterations}) {{
+    cached = i > 10;
+    if (cached || has_total(table)) {{
+      hits = hits + 1;
+    }}
+    i = i + 1;
+  }}
+  print(hits);
+}}
+''', [str(iterations)]
+
+
+# the right operand is a chain of calls; the left one almost always decides
+def call_chain(iterations):
+    return f'''
+func a(n) {{ return b(n) + 1; }}
+func b(n) {{ return c(n) + 1; }}
+func c(n) {{ return n; }}
+func main() {{
+  found = 0;
+  i = 0;
+  while (i < {iterations}) {{
+    miss = i == 7;
+    if (!miss || a(i) == 9) {{
+      found = found + 1;
+    }}
+    i = i + 1;
+  }}
+  print(found);
+}}
+''', [str(iterations)]
+
+
+PROGRAMS = {
+    'costly_check': costly_check,
+    'copied_object': copied_object,
+    'call_chain': call_chain,
+}
+
+
+def run(engine, short_circuit, program, expected):
+    interpreter = Interpreter(console_output=False, engine=engine, short_circuit=short_circuit)
+    start = time.perf_counter()
+    interpreter.run(program)
+    elapsed = time.perf_counter() - start
+    if interpreter.get_output() != expected:
+        raise SystemExit(f'{engine} printed {interpreter.get_output()}, expected {expected}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--engines', default='tree,closure,vm,python')
+    args = parser.parse_args()
+
+    for name, make_program in PROGRAMS.items():
+        program, expected = make_program(args.iterations)
+        cells = ''
+        for engine in args.engines.split(','):
+            both = min(run(engine, False, program, expected) for _ in range(args.runs))
+            short = min(run(engine, True, program, expected) for _ in range(args.runs))
+            cells += f'  {engine} {both * 1000:7.1f} -> {short * 1000:7.1f} ms ({both / short:4.2f}x)'
+        print(f'{name:>14}:{cells}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+'''
+Measures how long `import brewparse` takes in a fresh interpreter.
+
+Run from the repo root:
+    python -m benchmarks.bench_import [--runs N] [--budget-ms MS]
+
+Exits non-zero if the median import time exceeds the budget, so it can be
+used as a gate after grammar changes (a stale or missing tables/ directory
+shows up here as a jump to full table generation).
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time_ms(module):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # lines look like "import time:   self [us] | cumulative | name"
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000
+    raise RuntimeError(f'no import time reported for {module}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=100.0)
+    parser.add_argument('--module', default='brewparse')
+    args = parser.parse_args()
+
+    times = [import_time_ms(args.module) for _ in range(args.runs)]
+    median = statistics.median(times)
+    print(f'import {args.module}: median {median:.1f} ms, '
+          f'min {min(times):.1f} ms, max {max(times):.1f} ms over {args.runs} runs '
+          f'(budget {args.budget_ms:.0f} ms)')
+    if median > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+'''
+Lexes pathological inputs at doubling sizes to check that comment and
+string scanning stay linear.
+
+Run from the repo root:
+    python -m benchmarks.bench_lex_stress [--size N] [--steps N]
+
+For each input the time per character should stay roughly flat as the size
+doubles; a quadratic scan shows up as the per-character cost doubling too.
+'''
+import argparse
+import contextlib
+import io
+import time
+
+import brewlex
+import brewpratt
+
+CASES = {
+    'huge comment': lambda n: 'func main() { /*' + 'x*' * (n // 2) + '*/ print(1); }',
+    'huge comment, many lines': lambda n: 'func main() { /*' + 'ab\n' * (n // 3) + '*/ print(1); }',
+    'unterminated comment': lambda n: 'func main() { /*' + 'ab\n' * (n // 3),
+    'repeated unterminated comments': lambda n: '/* ' * (n // 3),
+    'huge string': lambda n: 'func main() { print("' + 'a' * n + '"); }',
+    'unterminated string': lambda n: 'func main() { print("' + 'a' * n,
+    'many unterminated strings': lambda n: '"a\n' * (n // 3),
+}
+
+LEXERS = {
+    'ply': brewpratt.ply_tokens,
+    'fast': brewlex.tokenize,
+}
+
+
+def lex_time(lexer, program):
+    start = time.perf_counter()
+    # illegal characters and stray quotes are reported on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in lexer(program):
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=250_000)
+    parser.add_argument('--steps', type=int, default=3)
+    args = parser.parse_args()
+
+    for case, make_program in CASES.items():
+        print(case)
+        for lexer_name, lexer in LEXERS.items():
+            row = []
+            for step in range(args.steps):
+                program = make_program(args.size << step)
+                elapsed = lex_time(lexer, program)
+                row.append(f'{len(program):>9,} chars {elapsed * 1000:8.1f} ms '
+                           f'({elapsed * 1e9 / len(program):6.1f} ns/char)')
+            print(f'  {lexer_name:>4}: ' + ' | '.join(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+'''
+Measures the per-iteration cost of a Brewin while loop as the number of live
+variables grows.
+
+Run from the repo root:
+    python -m benchmarks.bench_loops [--iterations N] [--runs N] [--variables 10,100,1000] [--versions 3,4]
+
+Each program declares the given number of variables before a loop whose
+body does a fixed amount of work, including an if block; the time of the
+same program with zero iterations is subtracted. Both are the best of
+--runs runs, and a loop too short to measure shows as 0.0 rather than
+going negative. Entering a block or an
+iteration pushes a frame onto the scope chain instead of copying every live
+variable, so the time per iteration should stay flat down the table.
+'''
+import argparse
+import importlib
+import time
+
+
+def loop_program(variables, iterations):
+    lines = ['func main() {']
+    for index in range(variables):
+        lines.append(f'  v{index} = {index};')
+    lines.append('  i = 0;')
+    lines.append('  total = 0;')
+    lines.append(f'  while (i < {iterations}) {{')
+    lines.append('    if (i / 2 * 2 == i) { total = total + v0; }')
+    lines.append('    i = i + 1;')
+    lines.append('  }')
+    lines.append('  print(i);')
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+def run(version, program, expected):
+    interpreter = importlib.import_module(f'interpreterv{version}').Interpreter(console_output=False)
+    start = time.perf_counter()
+    interpreter.run(program)
+    elapsed = time.perf_counter() - start
+    if interpreter.get_output() != expected:
+        raise SystemExit(f'v{version} printed {interpreter.get_output()}, expected {expected}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--variables', default='10,100,1000')
+    parser.add_argument('--versions', default='3,4')
+    args = parser.parse_args()
+
+    for version in args.versions.split(','):
+        for variables in [int(v) for v in args.variables.split(',')]:
+            setup_program = loop_program(variables, 0)
+            loop = loop_program(variables, args.iterations)
+            setup = min(run(version, setup_program, ['0']) for _ in range(args.runs))
+            total = min(run(version, loop, [str(args.iterations)]) for _ in range(args.runs))
+            elapsed = max(total - setup, 0.0)
+            print(f'v{version} {variables:>5} variables: {elapsed / args.iterations * 1e6:8.1f} us/iteration'
+                  f'  (setup {setup * 1000:6.1f} ms)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+'''
+Compares the memory held by a million small Brewin objects (a linked list
+of points, each with x, y and next) as interpreterv4 stores them, with
+shared shapes and a list of values (see brewobjects.py), against the same
+objects as dict-backed Elements holding a Variable per field, which is how
+they used to be stored. Both builds do what evaluating @ and assigning
+o.x, o.y and o.next does, and reuse the same int values, so the figures are
+for the objects alone.
+
+Run from the repo root:
+    python -m benchmarks.bench_object_memory [--objects N]
+'''
+import argparse
+import gc
+import tracemalloc
+
+from brewobjects import ROOT_SHAPE, count_shapes
+from brewvalues import NIL, Variable, new_object
+from element import Element
+
+
+def build_shaped(coordinates):
+    head = NIL
+    for x, y in coordinates:
+        point = new_object()
+        point.set('x', x)
+        point.set('y', y)
+        point.set('next', head)
+        head = point
+    return head
+
+
+def build_elements(coordinates):
+    head = NIL
+    for x, y in coordinates:
+        point = Element('obj', proto=Variable(NIL))
+        point.dict['x'] = Variable(x)
+        point.dict['y'] = Variable(y)
+        point.dict['next'] = Variable(head)
+        head = point
+    return head
+
+
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--objects', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    coordinates = [(index, -index) for index in range(args.objects)]
+    shapes_before = count_shapes(ROOT_SHAPE)
+    shaped, shaped_bytes = traced(lambda: build_shaped(coordinates))
+    if shaped.values[1:3] != [args.objects - 1, 1 - args.objects]:
+        raise SystemExit('shaped objects hold the wrong values')
+    new_shapes = count_shapes(ROOT_SHAPE) - shapes_before
+    del shaped
+    _, element_bytes = traced(lambda: build_elements(coordinates))
+
+    print(f'{args.objects} objects, {new_shapes} new shapes')
+    print(f'  shaped objects: {shaped_bytes / 2**20:7.1f} MiB ({shaped_bytes / args.objects:5.1f} bytes/object)')
+    print(f'  dict Elements:  {element_bytes / 2**20:7.1f} MiB ({element_bytes / args.objects:5.1f} bytes/object)')
+
+
+if __name__ == '__main__':
+    main()
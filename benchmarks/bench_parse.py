@@ -0,0 +1,64 @@
+'''
+Compares the PLY and Pratt parser backends on a large generated program.
+
+Run from the repo root:
+    python -m benchmarks.bench_parse [--functions N] [--statements N] [--repeat N]
+
+Reports tokens/sec for each backend and checks that both produce the same
+Element tree.
+'''
+import argparse
+import gc
+import time
+
+import brewparse
+import brewlex
+from benchmarks.programs import random_program
+
+
+def count_tokens(program):
+    return sum(1 for _ in brewlex.tokenize(program))
+
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--functions', type=int, default=500)
+    parser.add_argument('--statements', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    program = random_program(1, args.functions, args.statements)
+    tokens = count_tokens(program)
+    print(f'program: {len(program)} chars, {tokens} tokens')
+
+    results = {}
+    for backend in ('ply', 'pratt'):
+        elapsed, ast = best_time(
+            lambda: brewparse.parse_program(program, use_cache=False, backend=backend), args.repeat
+        )
+        results[backend] = str(ast)
+        print(f'{backend:>6}: {elapsed * 1000:8.1f} ms  {tokens / elapsed:12,.0f} tokens/sec')
+
+    if results['ply'] != results['pratt']:
+        raise SystemExit('backends produced different trees')
+    print('trees identical')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Parses a batch of generated programs from a thread pool and reports
+throughput per thread count.
+
+Run from the repo root:
+    python -m benchmarks.bench_parse_threads [--programs N] [--threads 1,2,4,8] [--backend ply|pratt]
+
+Each worker thread gets its own brewparse.Parser through parse_program, and
+every result is checked against a serial parse. With the GIL, throughput is
+expected to stay roughly flat rather than scale; the point is that
+concurrent parses are correct and don't serialize on shared state.
+'''
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import brewparse
+from benchmarks.programs import random_program
+
+
+def parse(program, backend):
+    return str(brewparse.parse_program(program, use_cache=False, backend=backend))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--programs', type=int, default=200)
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--backend', default='ply')
+    args = parser.parse_args()
+
+    programs = [random_program(seed, 10, 10) for seed in range(args.programs)]
+    expected = [parse(program, args.backend) for program in programs]
+
+    for threads in [int(t) for t in args.threads.split(',')]:
+        with ThreadPoolExecutor(threads) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(lambda program: parse(program, args.backend), programs))
+            elapsed = time.perf_counter() - start
+        if results != expected:
+            raise SystemExit(f'{threads} threads produced different trees')
+        print(f'{threads:>2} threads: {len(programs) / elapsed:8.1f} programs/sec')
+
+
+if __name__ == '__main__':
+    main()
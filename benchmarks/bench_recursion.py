@@ -0,0 +1,124 @@
+'''
+Runs deeply recursive Brewin programs on interpreterv4's engines and
+reports how long each takes, or that it ran out of stack.
+
+Run from the repo root:
+    python -m benchmarks.bench_recursion [--depths 100,1000,10000,50000] [--engines tree,closure,python,vm]
+        [--call-depth-limit N]
+
+The tree, closure and python engines nest Python frames for every Brewin
+call, so they fail with a RecursionError after a few hundred calls under
+Python's default recursion limit. The vm engine keeps calls on its own
+frame stack and should handle every depth up to --call-depth-limit, in
+time linear in the depth. The tree engine runs `return f(...)` in place of
+the current call, so list_walk and even_odd (all tail calls) run at any
+depth there too; sum_down adds to the result and can't.
+'''
+import argparse
+import time
+
+from interpreterv4 import Interpreter
+
+
+# a linked list built in a loop, then walked recursively; node is passed by
+# ref so the rest of the list isn't deep-copied at every step
+def list_walk(depth):
+    return f'''
+func length(ref node, count) {{
+  if (node == nil) {{
+    return count;
+  }}
+  return length(node.next, count + 1);
+}}
+func main() {{
+  head = nil;
+  i = 0;
+  while (i < {depth}) {{
+    node = @;
+    node.value = i;
+    node.next = head;
+    head = node;
+    i = i + 1;
+  }}
+  print(length(head, 0));
+}}
+''', [str(depth)]
+
+
+def sum_down(depth):
+    return f'''
+func sum(n) {{
+  if (n == 0) {{
+    return 0;
+  }}
+  return n + sum(n - 1);
+}}
+func main() {{
+  print(sum({depth}));
+}}
+''', [str(depth * (depth + 1) // 2)]
+
+
+def even_odd(depth):
+    return f'''
+func even(n) {{
+  if (n == 0) {{
+    return true;
+  }}
+  return odd(n - 1);
+}}
+func odd(n) {{
+  if (n == 0) {{
+    return false;
+  }}
+  return even(n - 1);
+}}
+func main() {{
+  print(even({depth}));
+}}
+''', [str(depth % 2 == 0).lower()]
+
+
+PROGRAMS = {
+    'list_walk': list_walk,
+    'sum_down': sum_down,
+    'even_odd': even_odd,
+}
+
+
+def run(engine, program, expected, call_depth_limit):
+    interpreter = Interpreter(console_output=False, engine=engine, call_depth_limit=call_depth_limit)
+    start = time.perf_counter()
+    try:
+        interpreter.run(program)
+    except RecursionError:
+        return None
+    elapsed = time.perf_counter() - start
+    if interpreter.get_output() != expected:
+        raise SystemExit(f'{engine} printed {interpreter.get_output()}, expected {expected}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depths', default='100,1000,10000,50000')
+    parser.add_argument('--engines', default='tree,closure,python,vm')
+    parser.add_argument('--call-depth-limit', type=int, default=100000)
+    args = parser.parse_args()
+    engines = args.engines.split(',')
+
+    for name, make_program in PROGRAMS.items():
+        for depth in [int(d) for d in args.depths.split(',')]:
+            program, expected = make_program(depth)
+            cells = ''
+            for engine in engines:
+                elapsed = run(engine, program, expected, args.call_depth_limit)
+                if elapsed is None:
+                    cells += f'  {engine} {"RecursionError":>14}'
+                else:
+                    cells += f'  {engine} {elapsed * 1000:11.1f} ms'
+            print(f'{name:>10} {depth:>7}:{cells}')
+
+
+if __name__ == '__main__':
+    main()
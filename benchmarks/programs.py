@@ -0,0 +1,65 @@
+'''
+Generators for synthetic Brewin programs used by the benchmarks.
+'''
+import random
+
+BINARY_OPERATORS = ['+', '-', '*', '/', '==', '!=', '<', '<=', '>', '>=', '&&', '||']
+
+
+def random_expression(rng, depth=3):
+    if depth <= 0 or rng.random() < 0.3:
+        choice = rng.randrange(7 if depth > 0 else 4)
+        if choice == 0:
+            return str(rng.randrange(1000))
+        if choice == 1:
+            return f'"s{rng.randrange(100)}"'
+        if choice == 2:
+            return rng.choice(['true', 'false', 'nil'])
+        if choice == 3:
+            return rng.choice(['a', 'b', 'c', 'obj.f'])
+        if choice == 4:
+            args = ', '.join(random_expression(rng, depth - 1) for _ in range(rng.randrange(3)))
+            return f'f{rng.randrange(10)}({args})'
+        if choice == 5:
+            return f'-{random_expression(rng, depth - 1)}'
+        return f'!{random_expression(rng, depth - 1)}'
+    left = random_expression(rng, depth - 1)
+    right = random_expression(rng, depth - 1)
+    if rng.random() < 0.2:
+        return f'({left} {rng.choice(BINARY_OPERATORS)} {right})'
+    return f'{left} {rng.choice(BINARY_OPERATORS)} {right}'
+
+
+def random_statement(rng, depth=2):
+    choice = rng.randrange(8)
+    if depth > 0 and choice == 0:
+        body = ' '.join(random_statement(rng, depth - 1) for _ in range(rng.randrange(1, 4)))
+        text = f'if ({random_expression(rng)}) {{ {body} }}'
+        if rng.random() < 0.5:
+            other = ' '.join(random_statement(rng, depth - 1) for _ in range(rng.randrange(1, 3)))
+            text += f' else {{ {other} }}'
+        return text
+    if depth > 0 and choice == 1:
+        body = ' '.join(random_statement(rng, depth - 1) for _ in range(rng.randrange(1, 4)))
+        return f'while ({random_expression(rng)}) {{ {body} }}'
+    if choice == 2:
+        return rng.choice(['return;', f'return {random_expression(rng)};'])
+    if choice == 3:
+        return f'x = lambda(p, ref q) {{ return p + q; }};'
+    if choice == 4:
+        return f'obj.f = {random_expression(rng)};'
+    if choice == 5:
+        return f'o.m({random_expression(rng)});'
+    if choice == 6:
+        return f'{random_expression(rng)};'
+    return f'{rng.choice(["a", "b", "c"])} = {random_expression(rng)};'
+
+
+def random_program(seed, functions=20, statements=10):
+    rng = random.Random(seed)
+    lines = []
+    for index in range(functions):
+        formals = ', '.join(rng.choice(['', 'ref ']) + f'p{i}' for i in range(rng.randrange(3)))
+        body = '\n    '.join(random_statement(rng) for _ in range(statements))
+        lines.append(f'/* function {index} */\nfunc f{index}({formals}) {{\n    {body}\n}}\n')
+    return '\n'.join(lines)
@@ -0,0 +1,451 @@
+from intbase import InterpreterBase
+from intbase import ErrorType
+from brewoperators import BINARY_OPERATORS, SHORT_CIRCUIT_OPERATORS, UNARY_OPERATORS
+from brewresolve import BUILTINS
+from brewvalues import CONSTANT_TYPES, NIL
+
+'''
+Bytecode compiler for Brewin (interpreterv4), run by brewvm.VirtualMachine.
+
+Every function and lambda is compiled into a CodeObject:
+    code:   list of (opcode, argument) pairs, one per instruction; jump
+            targets are indexes into this list
+    consts: runtime values and lambda CodeObjects, indexed by LOAD_CONST
+            and MAKE_LAMBDA
+    names:  any other operand, e.g. variable names, pre-split member paths,
+            call targets and error messages
+
+The instructions follow Interpreter.run_statement and friends step for step,
+so both backends behave the same; see brewvm.py for what each one does.
+
+    python -m brewbytecode program.br
+
+prints the disassembly of every function in a program.
+'''
+
+OPCODES = (
+    'LOAD_CONST',
+    'LOAD_SLOT',
+    'LOAD_LOCAL',
+    'LOAD_NAME',
+    'STORE_SLOT',
+    'STORE_LOCAL',
+    'STORE_NAME',
+    'BINARY_OP',
+    'BINARY_OP_CONST',
+    'NAME_OP_CONST',
+    'LOCAL_OP_CONST',
+    'COPY_VALUE',
+    'VALUE_ARG',
+    'REF_ARG',
+    'CALL_FUNCTION',
+    'CALL_VALUE',
+    'CALL_NAME',
+    'RETURN',
+    'RETURN_COPY',
+    'RETURN_NONE',
+    'RETURN_IF_VALUE',
+    'NONE_TO_NIL',
+    'JUMP',
+    'IF_FALSE',
+    'WHILE_FALSE',
+    'WHILE_TRUE',
+    'PUSH_SCOPE',
+    'POP_SCOPE',
+    # from here on, the ones most loops don't run: brewvm looks them up
+    # separately, past a single opcode >= FIRST_RARE_OPCODE test
+    'LOAD_VAR',
+    'REF_VAR',
+    'LOAD_OBJECT_VAR',
+    'STORE_VARIABLE',
+    'STORE_MEMBER',
+    'LOAD_MEMBER',
+    'STORE_LOCAL_MEMBER',
+    'LOGICAL_OPERAND',
+    'UNARY_OP',
+    'NEW_OBJECT',
+    'MAKE_LAMBDA',
+    'RESOLVE_CALL',
+    'DYNAMIC_VAR_ARG',
+    'DYNAMIC_VALUE_ARG',
+    'RAISE',
+    'RAISE_CALL_ERROR',
+    'POP',
+    'TO_OUTPUT',
+    'PRINT',
+    'INPUTI',
+    'INPUTS',
+    'JUMP_IF_FALSE_OR_POP',
+    'JUMP_IF_TRUE_OR_POP',
+)
+
+# LOAD_CONST == 0, LOAD_SLOT == 1, ...
+globals().update({name: opcode for opcode, name in enumerate(OPCODES)})
+FIRST_RARE_OPCODE = LOAD_VAR
+
+BINARY_OPERATOR_NAMES = tuple(BINARY_OPERATORS)
+UNARY_OPERATOR_NAMES = tuple(UNARY_OPERATORS)
+
+# opcodes whose argument is a jump target, an index into consts or one into names
+JUMP_OPCODES = {JUMP, IF_FALSE, WHILE_FALSE, WHILE_TRUE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP}
+CONST_OPCODES = {LOAD_CONST, MAKE_LAMBDA}
+NAME_OPCODES = {
+    LOAD_NAME, LOAD_VAR, REF_VAR, STORE_NAME, STORE_VARIABLE, LOAD_OBJECT_VAR, STORE_MEMBER, LOAD_MEMBER,
+    STORE_LOCAL_MEMBER, BINARY_OP_CONST, NAME_OP_CONST, LOCAL_OP_CONST, CALL_FUNCTION, RESOLVE_CALL, DYNAMIC_VAR_ARG, CALL_VALUE,
+    CALL_NAME, RAISE,
+}
+
+
+class CodeObject:
+    def __init__(self, name, node, formals):
+        self.name = name
+        self.node = node  # the FuncDef or LambdaDef this was compiled from
+        self.formals = formals  # ((name, is_ref, is_local), ...), as brewvalues.formal_params
+        self.formal_names = tuple(name for name, _, _ in formals)  # what capture_variables skips
+        self.code = []
+        self.consts = []
+        self.names = []
+
+    def __repr__(self):
+        return f"<code {self.name}>"
+
+
+class CodeBuilder:
+    def __init__(self, code_object):
+        self.code_object = code_object
+        self.code = []
+        self.const_index = {}
+        self.name_index = {}
+        # (index, opcode, func_name, args, tail) for every call through a
+        # variable, whose error path is emitted after the body
+        self.error_paths = []
+
+    def emit(self, opcode, argument=0):
+        self.code.append((opcode, argument))
+        return len(self.code) - 1  # the instruction's index, for patch()
+
+    def label(self):
+        return len(self.code)
+
+    def patch(self, position, target):
+        self.code[position] = (self.code[position][0], target)
+
+    def const(self, value):
+        # constants are shared Elements and CodeObjects, so dedupe them by identity
+        key = id(value)
+        if key not in self.const_index:
+            self.const_index[key] = len(self.code_object.consts)
+            self.code_object.consts.append(value)
+        return self.const_index[key]
+
+    def name(self, operand):
+        if operand not in self.name_index:
+            self.name_index[operand] = len(self.code_object.names)
+            self.code_object.names.append(operand)
+        return self.name_index[operand]
+
+    # a names entry of its own, for operands holding constants: those can't
+    # be deduplicated by equality, since True == 1
+    def operand(self, value):
+        self.code_object.names.append(value)
+        return len(self.code_object.names) - 1
+
+    def finish(self):
+        self.code_object.code = self.code
+        return self.code_object
+
+
+class Compiler:
+    def __init__(self, interpreter):
+        # reads the tables Interpreter.run() builds: constants, formals,
+        # function_index and function_overloads
+        self.interpreter = interpreter
+        self.codes = {}  # FuncDef node -> CodeObject
+
+    def compile_program(self, functions):
+        # create every CodeObject first so calls can refer to functions defined later
+        for func_node in functions:
+            self.codes[func_node] = CodeObject(func_node.name, func_node, self.interpreter.formals[func_node])
+        for func_node in functions:
+            self.compile_body(self.codes[func_node], func_node.statements)
+        return self.codes
+
+    def compile_body(self, code_object, statements):
+        builder = CodeBuilder(code_object)
+        for statement in statements:
+            self.compile_statement(builder, statement)
+        builder.emit(RETURN_NONE)
+        # an argument on an error path can hold a call with an error path of its own
+        while builder.error_paths:
+            position, opcode, func_name, args, tail = builder.error_paths.pop(0)
+            error_path = builder.label()
+            for arg in args:
+                self.compile_expression(builder, arg)
+                builder.emit(POP)
+            builder.emit(RAISE_CALL_ERROR)
+            if opcode == CALL_NAME:
+                operands = tuple((arg.slot, arg.path, arg.name) for arg in args)
+                builder.code[position] = (CALL_NAME, builder.name((func_name, len(args), error_path, operands, tail)))
+            else:
+                builder.code[position] = (RESOLVE_CALL, builder.name((func_name, len(args), error_path)))
+        return builder.finish()
+
+    # statements
+
+    def compile_block(self, builder, statements):
+        builder.emit(PUSH_SCOPE)
+        for statement in statements:
+            self.compile_statement(builder, statement)
+        builder.emit(POP_SCOPE)
+
+    def compile_statement(self, builder, node):
+        if node.elem_type == '=':
+            self.compile_assign(builder, node)
+        elif node.elem_type == InterpreterBase.IF_DEF:
+            self.compile_expression(builder, node.condition)
+            to_else = builder.emit(IF_FALSE)
+            self.compile_block(builder, node.statements)
+            if node.else_statements is None:
+                builder.patch(to_else, builder.label())
+            else:
+                to_end = builder.emit(JUMP)
+                builder.patch(to_else, builder.label())
+                self.compile_block(builder, node.else_statements)
+                builder.patch(to_end, builder.label())
+        elif node.elem_type == InterpreterBase.WHILE_DEF:
+            # the condition is tested again after the body, so an iteration
+            # ends in one WHILE_TRUE instead of a JUMP back to the first test
+            self.compile_expression(builder, node.condition)
+            to_end = builder.emit(WHILE_FALSE)
+            start = builder.label()
+            self.compile_block(builder, node.statements)
+            self.compile_expression(builder, node.condition)
+            builder.emit(WHILE_TRUE, start)
+            builder.patch(to_end, builder.label())
+        elif node.elem_type == InterpreterBase.RETURN_DEF:
+            expression = node.expression
+            if expression is None:
+                builder.emit(LOAD_CONST, builder.const(NIL))
+            elif (expression.elem_type == InterpreterBase.FCALL_DEF or expression.elem_type == InterpreterBase.MCALL_DEF) \
+                    and expression.name not in BUILTINS:
+                # the callee's frame replaces this one, and it returns to our caller
+                self.compile_call(builder, expression.name, expression.args, tail=True)
+                return
+            else:
+                self.compile_expression(builder, expression)
+                builder.emit(RETURN_COPY)
+                return
+            builder.emit(RETURN)
+        elif node.elem_type == InterpreterBase.FCALL_DEF:
+            # as in the tree walker, a call statement that produces a value ends the function
+            self.compile_call(builder, node.name, node.args)
+            builder.emit(RETURN_IF_VALUE)
+        # any other expression statement does nothing
+
+    def compile_assign(self, builder, node):
+        path = node.path
+        if node.local:
+            # a local formal's slot holds its value (see brewresolve.py)
+            self.compile_expression(builder, node.expression)
+            if len(path) > 1:
+                builder.emit(STORE_LOCAL_MEMBER, builder.name((node.slot, path)))
+            else:
+                builder.emit(STORE_LOCAL, node.slot)
+            return
+        if len(path) > 1:
+            builder.emit(LOAD_OBJECT_VAR, builder.name((node.slot, path[0], node.name)))
+            self.compile_expression(builder, node.expression)
+            builder.emit(STORE_MEMBER, builder.name(path))
+            return
+        self.compile_expression(builder, node.expression)
+        right = node.expression
+        if node.slot is not None:
+            builder.emit(STORE_SLOT, node.slot)
+        elif right.elem_type == InterpreterBase.VAR_DEF and len(right.path) == 1:
+            # a new name can share the variable's cell (see brewvalues.assigned_variable)
+            builder.emit(STORE_VARIABLE, builder.name((path[0], right.slot, right.name)))
+        else:
+            builder.emit(STORE_NAME, builder.name(path[0]))
+
+    # expressions
+
+    def compile_expression(self, builder, node):
+        elem_type = node.elem_type
+        if elem_type in CONSTANT_TYPES:
+            builder.emit(LOAD_CONST, builder.const(self.interpreter.constants[node]))
+        elif elem_type == InterpreterBase.VAR_DEF:
+            self.compile_var(builder, node)
+        elif elem_type == InterpreterBase.LAMBDA_DEF:
+            code_object = CodeObject('lambda', node, self.interpreter.formals[node])
+            self.compile_body(code_object, node.statements)
+            builder.emit(MAKE_LAMBDA, builder.const(code_object))
+        elif elem_type in SHORT_CIRCUIT_OPERATORS and self.interpreter.short_circuit:
+            # op1 stays on the stack as the result if it decides the operator
+            operator = BINARY_OPERATOR_NAMES.index(elem_type)
+            self.compile_expression(builder, node.op1)
+            builder.emit(LOGICAL_OPERAND, operator)
+            to_end = builder.emit(JUMP_IF_FALSE_OR_POP if elem_type == '&&' else JUMP_IF_TRUE_OR_POP)
+            self.compile_expression(builder, node.op2)
+            builder.emit(LOGICAL_OPERAND, operator)
+            builder.patch(to_end, builder.label())
+        elif elem_type in BINARY_OPERATORS:
+            self.compile_binary_operation(builder, node)
+        elif elem_type in UNARY_OPERATORS:
+            self.compile_expression(builder, node.op1)
+            builder.emit(UNARY_OP, UNARY_OPERATOR_NAMES.index(elem_type))
+        elif elem_type == InterpreterBase.FCALL_DEF or elem_type == InterpreterBase.MCALL_DEF:
+            # method calls are still dispatched by method name alone, as in the tree walker
+            self.compile_call(builder, node.name, node.args)
+            if node.name == 'print':
+                # a function call's nil comes from returning (see brewvm.py)
+                builder.emit(NONE_TO_NIL)
+        elif elem_type == InterpreterBase.OBJ_DEF:
+            builder.emit(NEW_OBJECT)
+        else:
+            builder.emit(RAISE, builder.name((ErrorType.NAME_ERROR, f"Unknown expression {node}")))
+
+    def compile_binary_operation(self, builder, node):
+        operator = BINARY_OPERATOR_NAMES.index(node.elem_type)
+        op1 = node.op1
+        if node.op2.elem_type not in CONSTANT_TYPES:
+            self.compile_expression(builder, op1)
+            self.compile_expression(builder, node.op2)
+            builder.emit(BINARY_OP, operator)
+            return
+        # i + 1, n < 2, ...: the constant goes in the instruction, and so
+        # does op1 if it's a plain name or local formal
+        constant = self.interpreter.constants[node.op2]
+        if op1.elem_type == InterpreterBase.VAR_DEF and len(op1.path) == 1 and op1.local:
+            builder.emit(LOCAL_OP_CONST, builder.operand((op1.slot, operator, constant)))
+        elif op1.elem_type == InterpreterBase.VAR_DEF and len(op1.path) == 1 and op1.slot is None:
+            builder.emit(NAME_OP_CONST, builder.operand((op1.name, operator, constant)))
+        else:
+            self.compile_expression(builder, op1)
+            builder.emit(BINARY_OP_CONST, builder.operand((operator, constant)))
+
+    def compile_var(self, builder, node, ref=False):
+        path = node.path
+        if node.local:
+            # only ever passed by ref as a.b, which is a field's cell
+            builder.emit(LOAD_LOCAL, node.slot)
+            if len(path) > 1:
+                builder.emit(LOAD_MEMBER, builder.name((path[1], node.name, ref)))
+        elif ref:
+            builder.emit(REF_VAR, builder.name((node.slot, path, node.name)))
+        elif len(path) == 1 and node.slot is not None:
+            builder.emit(LOAD_SLOT, node.slot)
+        elif len(path) == 1:
+            builder.emit(LOAD_NAME, builder.name(node.name))
+        else:
+            builder.emit(LOAD_VAR, builder.name((node.slot, path, node.name)))
+
+    # calls
+
+    def compile_call(self, builder, func_name, args, tail=False):
+        if func_name == 'print':
+            for arg in args:
+                self.compile_expression(builder, arg)
+                builder.emit(TO_OUTPUT)
+            builder.emit(PRINT, len(args))
+            return
+        if func_name == 'inputi' or func_name == 'inputs':
+            if len(args) > 1:
+                message = f"No {func_name}() function found that takes > 1 parameter"
+                builder.emit(RAISE, builder.name((ErrorType.NAME_ERROR, message)))
+                return
+            for arg in args:
+                self.compile_expression(builder, arg)
+            builder.emit(INPUTI if func_name == 'inputi' else INPUTS, len(args))
+            return
+
+        func_node = self.interpreter.function_index.get((func_name, len(args)))
+        if func_node is not None:
+            # the callee is known, so each argument is compiled for its formal
+            for arg, (_, reference, local) in zip(args, self.interpreter.formals[func_node]):
+                if reference and arg.elem_type == InterpreterBase.VAR_DEF:
+                    self.compile_var(builder, arg, ref=True)
+                elif local:
+                    self.compile_expression(builder, arg)
+                    builder.emit(COPY_VALUE)
+                else:
+                    self.compile_expression(builder, arg)
+                    builder.emit(REF_ARG if reference else VALUE_ARG)
+            builder.emit(CALL_FUNCTION, builder.name((self.codes[func_node], len(args), tail)))
+            return
+
+        # otherwise the callee is a variable; RESOLVE_CALL (or CALL_NAME) jumps
+        # to the error path, which still evaluates the arguments, if it can't
+        # be called. The error paths go after the body (see compile_body), out
+        # of the way of calls that succeed. When every argument is a variable,
+        # CALL_NAME does the whole call in one instruction.
+        if all(arg.elem_type == InterpreterBase.VAR_DEF for arg in args):
+            builder.error_paths.append((builder.emit(CALL_NAME), CALL_NAME, func_name, args, tail))
+            return
+        builder.error_paths.append((builder.emit(RESOLVE_CALL), RESOLVE_CALL, func_name, args, tail))
+        for index, arg in enumerate(args):
+            if arg.elem_type == InterpreterBase.VAR_DEF:
+                builder.emit(DYNAMIC_VAR_ARG, builder.name((index, (arg.slot, arg.path, arg.name))))
+            else:
+                self.compile_expression(builder, arg)
+                builder.emit(DYNAMIC_VALUE_ARG, index)
+        builder.emit(CALL_VALUE, builder.name((len(args), tail)))
+
+
+def describe(code_object, opcode, argument):
+    if opcode in JUMP_OPCODES:
+        return f"to {argument}"
+    if opcode in CONST_OPCODES:
+        return repr(code_object.consts[argument]) if opcode == MAKE_LAMBDA else str(code_object.consts[argument])
+    if opcode == BINARY_OP_CONST:
+        operator, constant = code_object.names[argument]
+        return f"{BINARY_OPERATOR_NAMES[operator]} {constant}"
+    if opcode == NAME_OP_CONST or opcode == LOCAL_OP_CONST:
+        operand, operator, constant = code_object.names[argument]
+        return f"{operand!r} {BINARY_OPERATOR_NAMES[operator]} {constant}"
+    if opcode in NAME_OPCODES:
+        return repr(code_object.names[argument])
+    if opcode == BINARY_OP or opcode == LOGICAL_OPERAND:
+        return BINARY_OPERATOR_NAMES[argument]
+    if opcode == UNARY_OP:
+        return UNARY_OPERATOR_NAMES[argument]
+    return ''
+
+
+def disassemble(code_object):
+    formals = ', '.join(('ref ' if reference else '') + name for name, reference, _ in code_object.formals)
+    lines = [f"{code_object.name}({formals}):"]
+    lambdas = []
+    for offset, (opcode, argument) in enumerate(code_object.code):
+        if opcode == MAKE_LAMBDA:
+            lambdas.append(code_object.consts[argument])
+        detail = describe(code_object, opcode, argument)
+        line = f"  {offset:5} {OPCODES[opcode]:<18} {argument:5}"
+        if detail:
+            line += f"  ({detail})"
+        lines.append(line)
+    text = '\n'.join(lines)
+    for lambda_code in lambdas:
+        text += '\n\n' + disassemble(lambda_code)
+    return text
+
+
+def main(argv):
+    import sys
+    from interpreterv4 import Interpreter
+
+    if len(argv) != 2:
+        print("usage: python -m brewbytecode program.br", file=sys.stderr)
+        return 2
+    with open(argv[1]) as f:
+        program = f.read()
+    interpreter = Interpreter()
+    interpreter.prepare(program)
+    codes = Compiler(interpreter).compile_program(interpreter.functions)
+    print('\n\n'.join(disassemble(code_object) for code_object in codes.values()))
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+
+    sys.exit(main(sys.argv))
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import pickle
+import stat
+import threading
+from collections import OrderedDict
+
+'''
+Content-addressed cache of parsed programs.
+
+Entries are keyed by a hash of the program source and the parser backend.
+AST nodes are immutable, so the in-memory tier keeps the tree itself and
+every hit hands back the same shared tree; it is an LRU bounded by
+max_entries. The optional disk tier (cache_dir) keeps one pickled
+<key>.ast file per program and survives process restarts. A cache may be
+shared between threads.
+
+Unpickling a file can run arbitrary code, so the disk tier trusts whoever
+can write to cache_dir. It is only used while cache_dir is a directory
+owned by the current user that no one else can write to (it is created
+that way, and checked before every read and write), and entries are only
+read back if they start with the header put() wrote for that key. Point
+BREWIN_PARSE_CACHE_DIR at a private directory, never at a shared one.
+'''
+
+# bump whenever the grammar or the Element layout changes so that stale
+# on-disk entries are never returned
+CACHE_VERSION = '4'
+
+HEADER = b'brewin-ast'  # + CACHE_VERSION and the entry's key, see entry_header
+
+
+class ParseCache:
+    def __init__(self, max_entries=128, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def key(self, program, backend):
+        digest = hashlib.sha256()
+        digest.update(CACHE_VERSION.encode())
+        digest.update(b'\0')
+        digest.update(backend.encode())
+        digest.update(b'\0')
+        digest.update(program.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def get(self, program, backend):
+        key = self.key(program, backend)
+        with self.lock:
+            ast = self.entries.get(key)
+            if ast is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return ast
+        data = self.read_disk(key)
+        header = entry_header(key)
+        if data is not None and data.startswith(header):
+            try:
+                ast = pickle.loads(data[len(header):])
+            except Exception:
+                ast = None  # truncated or foreign file, treat it as a miss
+            if ast is not None:
+                with self.lock:
+                    self.remember(key, ast)
+                    self.disk_hits += 1
+                return ast
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, program, backend, ast):
+        key = self.key(program, backend)
+        with self.lock:
+            self.remember(key, ast)
+        if self.cache_dir is None:
+            return
+        try:
+            data = pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RecursionError):
+            # very deeply nested expressions can't be pickled; keep them in memory only
+            return
+        self.write_disk(key, entry_header(key) + data)
+
+    # callers must hold self.lock
+    def remember(self, key, ast):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = ast
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def disk_path(self, key):
+        return os.path.join(self.cache_dir, key + '.ast')
+
+    # whether cache_dir is the current user's and only they can write to it
+    def private_dir(self):
+        try:
+            st = os.stat(self.cache_dir)
+        except OSError:
+            return False
+        if not stat.S_ISDIR(st.st_mode) or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            return False
+        return not hasattr(os, 'getuid') or st.st_uid == os.getuid()
+
+    def read_disk(self, key):
+        if self.cache_dir is None or not self.private_dir():
+            return None
+        try:
+            with open(self.disk_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def write_disk(self, key, data):
+        if self.cache_dir is None:
+            return
+        # write to a temp file and rename so readers never see a partial entry
+        path = self.disk_path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            if not self.private_dir():
+                return
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with open(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def entry_header(key):
+    return HEADER + CACHE_VERSION.encode() + b'\0' + key.encode() + b'\n'
+
+
+def cache_from_environment():
+    max_entries = int(os.environ.get('BREWIN_PARSE_CACHE_SIZE', '128'))
+    cache_dir = os.environ.get('BREWIN_PARSE_CACHE_DIR') or None
+    return ParseCache(max_entries, cache_dir)
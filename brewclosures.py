@@ -0,0 +1,487 @@
+from intbase import InterpreterBase
+from intbase import ErrorType
+from element import Element
+from brewobjects import PROTO
+from brewoperators import BINARY_OPERATORS, SHORT_CIRCUIT_OPERATORS, UNARY_OPERATORS
+from brewresolve import BUILTINS
+from brewvalues import CONSTANT_TYPES, NIL, Environment, FieldRef, TailCall, Variable, capture_variables
+from brewvalues import assigned_variable, is_function, is_object, new_object, output_text, primitive_value
+
+'''
+Closure-compiling engine for interpreterv4.
+
+Instead of re-dispatching on elem_type every time a node is evaluated, each
+function body is compiled once into nested Python closures, one per node,
+with its operands, constants and call targets bound when it is compiled.
+Select it with Interpreter(engine='closure').
+
+The closures follow the tree walker in interpreterv4.py step for step and
+reuse its operators (Interpreter.binary_operators, ...), so programs print
+the same output and fail with the same errors in both engines. trace_output
+only applies to the tree walker.
+
+A compiled statement takes the current Environment and returns None to
+carry on, or the value that ends the enclosing function, like
+Interpreter.run_statement. A compiled expression returns its value.
+`return f(...)` ends it with a brewvalues.TailCall instead, which the
+call that ran the function runs in a loop (see run_tail_calls), so tail
+recursion doesn't nest Python calls.
+'''
+
+CONDITION_TYPES = (bool, int)
+
+
+def skip(context):
+    return None
+
+
+class ClosureCompiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        # FuncDef node -> compiled body; filled in before anything runs
+        self.bodies = {}
+
+    def compile_program(self, functions):
+        for func_node in functions:
+            self.bodies[func_node] = self.compile_block(func_node.statements)
+
+    def run_main_func(self, func_node):
+        run_result = self.bodies[func_node](Environment())
+        if type(run_result) is TailCall:
+            return self.run_tail_calls(run_result)
+        return run_result
+
+    # runs the tail call a body returned, and each one that returns in turn,
+    # and gives what `return f(...)` would have made of the last result,
+    # like Interpreter.run_body
+    def run_tail_calls(self, run_result):
+        while type(run_result) is TailCall:
+            run_result = run_result.body(run_result.context)
+        if run_result is None:
+            return NIL
+        return self.interpreter.copies.copy(run_result)
+
+    def error(self, error_type, description):
+        self.interpreter.error(error_type, description)
+
+    # statements
+
+    def compile_block(self, statements):
+        compiled = tuple(self.compile_statement(statement) for statement in statements)
+
+        def run_block(context):
+            for statement in compiled:
+                run_result = statement(context)
+                if run_result is not None:
+                    return run_result
+            return None
+
+        return run_block
+
+    def compile_statement(self, node):
+        if node.elem_type == '=':
+            return self.compile_assign(node)
+        elif node.elem_type == InterpreterBase.IF_DEF:
+            return self.compile_if(node)
+        elif node.elem_type == InterpreterBase.WHILE_DEF:
+            return self.compile_while(node)
+        elif node.elem_type == InterpreterBase.RETURN_DEF:
+            return self.compile_return(node)
+        elif node.elem_type == InterpreterBase.FCALL_DEF:
+            return self.compile_call(node.name, node.args)
+        # like the tree walker, any other expression statement does nothing
+        return skip
+
+    def compile_assign(self, node):
+        path = node.path
+        slot = node.slot
+        expression = self.compile_expression(node.expression)
+        name = path[0]
+        error = self.error
+
+        if len(path) == 1:
+            if node.local:
+                def assign_local(context):
+                    context.frame.slots[slot] = expression(context)
+                    return None
+
+                return assign_local
+
+            if slot is not None:
+                def assign_slot(context):
+                    context.frame.slots[slot].value = expression(context)
+                    return None
+
+                return assign_slot
+
+            right = node.expression
+            if right.elem_type == InterpreterBase.VAR_DEF and len(right.path) == 1:
+                # a new name shares the variable's cell for a function or
+                # lambda (see brewvalues.assigned_variable); never a local formal
+                right_name = right.name
+                right_slot = right.slot
+
+                def assign_variable(context):
+                    variable = context.lookup(name)
+                    if variable is not None:
+                        variable.value = expression(context)
+                    else:
+                        value = expression(context)
+                        if right_slot is not None:
+                            source = context.frame.slots[right_slot]
+                        else:
+                            source = context.lookup(right_name)
+                        context.vars[name] = assigned_variable(source, value)
+                    return None
+
+                return assign_variable
+
+            def assign(context):
+                variable = context.lookup(name)
+                if variable is not None:
+                    variable.value = expression(context)
+                else:
+                    context.vars[name] = Variable(expression(context))
+                return None
+
+            return assign
+
+        member = path[1]
+        full_name = node.name
+        copies = self.interpreter.copies
+
+        local = node.local
+
+        def assign_member(context):
+            if local:
+                value = expression(context)
+                obj = context.frame.slots[slot]
+            else:
+                if slot is not None:
+                    variable = context.frame.slots[slot]
+                else:
+                    variable = context.lookup(name)
+                if variable is None:
+                    error(ErrorType.NAME_ERROR, f"Unknown object {full_name}")
+                value = expression(context)
+                obj = variable.value
+            if not is_object(obj):
+                error(ErrorType.TYPE_ERROR, f"{name} is not an object")
+            copies.before_write(obj)
+            obj.set(member, value)
+            return None
+
+        return assign_member
+
+    def compile_condition(self, node, description):
+        condition = self.compile_expression(node)
+        error = self.error
+
+        def evaluate_condition(context):
+            condition_value = condition(context)
+            if type(condition_value) not in CONDITION_TYPES:
+                error(ErrorType.TYPE_ERROR, description)
+            return condition_value
+
+        return evaluate_condition
+
+    def compile_if(self, node):
+        condition = self.compile_condition(node.condition, "Incompatible type for if condition")
+        statements = self.compile_block(node.statements)
+        if node.else_statements is None:
+            else_statements = skip
+        else:
+            else_statements = self.compile_block(node.else_statements)
+
+        def run_if(context):
+            if condition(context):
+                return statements(Environment(context))
+            return else_statements(Environment(context))
+
+        return run_if
+
+    def compile_while(self, node):
+        condition = self.compile_condition(node.condition, "Incompatible type for while condition")
+        statements = self.compile_block(node.statements)
+
+        def run_while(context):
+            while condition(context):
+                run_result = statements(Environment(context))
+                if run_result is not None:
+                    return run_result
+            return None
+
+        return run_while
+
+    def compile_return(self, node):
+        if node.expression is None:
+            return lambda context: NIL
+        elem_type = node.expression.elem_type
+        if (elem_type == InterpreterBase.FCALL_DEF or elem_type == InterpreterBase.MCALL_DEF) \
+                and node.expression.name not in BUILTINS:
+            return self.compile_call(node.expression.name, node.expression.args, tail=True)
+        expression = self.compile_expression(node.expression)
+        copy_value = self.interpreter.copies.copy
+        return lambda context: copy_value(expression(context))
+
+    # expressions
+
+    def compile_expression(self, node):
+        elem_type = node.elem_type
+        interpreter = self.interpreter
+        if elem_type in CONSTANT_TYPES:
+            constant = interpreter.constants[node]
+            return lambda context: constant
+        elif elem_type == InterpreterBase.VAR_DEF:
+            return self.compile_var(node)
+        elif elem_type == InterpreterBase.LAMBDA_DEF:
+            return self.compile_lambda(node)
+        elif elem_type in SHORT_CIRCUIT_OPERATORS and interpreter.short_circuit:
+            return self.compile_short_circuit(node)
+        elif elem_type in BINARY_OPERATORS:
+            operator = interpreter.binary_operators[elem_type]
+            op1 = self.compile_expression(node.op1)
+            op2 = self.compile_expression(node.op2)
+            return lambda context: operator(op1(context), op2(context))
+        elif elem_type in UNARY_OPERATORS:
+            operator = interpreter.unary_operators[elem_type]
+            op1 = self.compile_expression(node.op1)
+            return lambda context: operator(op1(context))
+        elif elem_type == InterpreterBase.FCALL_DEF or elem_type == InterpreterBase.MCALL_DEF:
+            # method calls are still dispatched by method name alone, as in the tree walker
+            call = self.compile_call(node.name, node.args)
+
+            def call_expression(context):
+                run_result = call(context)
+                if run_result is None:
+                    return NIL
+                return run_result
+
+            return call_expression
+        elif elem_type == InterpreterBase.OBJ_DEF:
+            return lambda context: new_object()
+        error = self.error
+
+        def unknown_expression(context):
+            error(ErrorType.NAME_ERROR, f"Unknown expression {node}")
+
+        return unknown_expression
+
+    def compile_short_circuit(self, node):
+        elem_type = node.elem_type
+        logical_operand = self.interpreter.logical_operand
+        decided = SHORT_CIRCUIT_OPERATORS[elem_type]
+        op1 = self.compile_expression(node.op1)
+        op2 = self.compile_expression(node.op2)
+
+        def short_circuit(context):
+            value = logical_operand(elem_type, op1(context))
+            if value is decided:
+                return value
+            return logical_operand(elem_type, op2(context))
+
+        return short_circuit
+
+    def compile_var(self, node, ref=False):
+        path = node.path
+        slot = node.slot
+        name = path[0]
+        var_name = node.name
+        overloads = self.interpreter.function_overloads.get(var_name, ())
+        copies = self.interpreter.copies
+        error = self.error
+
+        # what evaluate_var does once the name isn't a variable
+        def function_value():
+            if len(overloads) > 1:
+                error(ErrorType.NAME_ERROR, f"Ambigous function {var_name}")
+            if overloads:
+                if ref:
+                    return Variable(overloads[0])
+                return overloads[0]
+            error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined")
+
+        if len(path) == 1:
+            if node.local:
+                # a local formal's slot holds its value, and it's never passed by ref itself
+                return lambda context: context.frame.slots[slot]
+            if slot is not None:
+                if ref:
+                    return lambda context: context.frame.slots[slot]
+                return lambda context: context.frame.slots[slot].value
+
+            def read_var(context):
+                variable = context.lookup(name)
+                if variable is not None:
+                    return variable if ref else variable.value
+                return function_value()
+
+            return read_var
+
+        member = path[1]
+        local = node.local
+
+        def read_member(context):
+            if local:
+                obj = context.frame.slots[slot]
+            else:
+                if slot is not None:
+                    variable = context.frame.slots[slot]
+                else:
+                    variable = context.lookup(name)
+                obj = variable.value if variable is not None else None
+            while is_object(obj):
+                index = obj.shape.index.get(member)
+                if index is not None:
+                    if ref:
+                        copies.pin(obj)
+                        return FieldRef(obj, index)
+                    return obj.values[index]
+                obj = obj.values[PROTO]
+            return function_value()
+
+        return read_member
+
+    def compile_lambda(self, node):
+        formal_args = [arg.name for arg in node.args]
+        formals = self.interpreter.formals[node]
+        captures = self.interpreter.outer_names[node]
+        body = self.compile_block(node.statements)
+        args = node.args
+        statements = node.statements
+
+        def make_lambda(context):
+            free_vars = capture_variables(context, captures, formal_args)
+            return Element(InterpreterBase.LAMBDA_DEF, args=args, statements=statements,
+                           formals=formals, free_vars=free_vars, body=body, node=node)
+
+        return make_lambda
+
+    # calls
+
+    # with tail, the call is `return func_name(...)`: it returns a TailCall
+    # for the callee's body, in a frame under Interpreter.tail_call_scope
+    def compile_call(self, func_name, args, tail=False):
+        if func_name == 'inputi':
+            return self.compile_input(args, 'inputi', int)
+        elif func_name == 'print':
+            return self.compile_print(args)
+        elif func_name == 'inputs':
+            return self.compile_input(args, 'inputs', str)
+
+        values = tuple(self.compile_expression(arg) for arg in args)
+        refs = tuple(
+            self.compile_var(arg, ref=True) if arg.elem_type == InterpreterBase.VAR_DEF else None
+            for arg in args
+        )
+        arity = len(args)
+        interpreter = self.interpreter
+        copy_value = interpreter.copies.copy
+        func_node = interpreter.function_index.get((func_name, arity))
+        tail_call_scope = interpreter.tail_call_scope
+        run_tail_calls = self.run_tail_calls
+
+        # evaluates each actual once and binds it into the callee's frame, as bind_args does
+        def bind_args(formals, context, func_context):
+            for index in range(len(formals)):
+                name, reference, local = formals[index]
+                if local:
+                    func_context.slots.append(copy_value(values[index](context)))
+                    continue
+                if reference and refs[index] is not None:
+                    variable = refs[index](context)
+                elif reference:
+                    variable = Variable(values[index](context))
+                else:
+                    variable = Variable(copy_value(values[index](context)))
+                func_context.vars[name] = variable
+                func_context.slots.append(variable)
+
+        if func_node is not None:
+            formals = interpreter.formals[func_node]
+            bodies = self.bodies
+
+            if tail:
+                def tail_call_function(context):
+                    func_context = Environment(tail_call_scope(func_node, context), [])
+                    bind_args(formals, context, func_context)
+                    return TailCall(bodies[func_node], func_context, func_name)
+
+                return tail_call_function
+
+            def call_function(context):
+                func_context = Environment(context, [])
+                bind_args(formals, context, func_context)
+                run_result = bodies[func_node](func_context)
+                if type(run_result) is TailCall:
+                    return run_tail_calls(run_result)
+                return run_result
+
+            return call_function
+
+        bodies = self.bodies
+        error = self.error
+
+        def evaluate_args(context):
+            for value in values:
+                value(context)
+
+        def call_value(context):
+            variable = context.lookup(func_name)
+            if variable is None:
+                evaluate_args(context)
+                error(ErrorType.NAME_ERROR, f"No {func_name} function found that takes {arity} parameters")
+            target = variable.value
+            if not is_function(target):
+                evaluate_args(context)
+                error(ErrorType.TYPE_ERROR, f"{func_name} is not a function")
+            if arity != len(target.dict['args']):
+                evaluate_args(context)
+                error(ErrorType.TYPE_ERROR, f"{func_name} does not take {arity} parameters")
+            func_context = Environment(tail_call_scope(target, context) if tail else context, [])
+            if target.elem_type == InterpreterBase.LAMBDA_DEF:
+                bind_args(target.dict['formals'], context, func_context)
+                func_context.vars.update(target.dict['free_vars'])
+                body = target.dict['body']
+            else:
+                bind_args(interpreter.formals[target], context, func_context)
+                body = bodies[target]
+            if tail:
+                return TailCall(body, func_context, func_name)
+            run_result = body(func_context)
+            if type(run_result) is TailCall:
+                return run_tail_calls(run_result)
+            return run_result
+
+        return call_value
+
+    def compile_print(self, args):
+        values = tuple(self.compile_expression(arg) for arg in args)
+        interpreter = self.interpreter
+        error = self.error
+
+        def run_print(context):
+            string_to_output = ''
+            for value in values:
+                value = value(context)
+                if value is None:
+                    error(ErrorType.NAME_ERROR, f"Missing some var")
+                string_to_output += output_text(value)
+            interpreter.output(string_to_output)
+            return None
+
+        return run_print
+
+    def compile_input(self, args, func_name, convert):
+        interpreter = self.interpreter
+        error = self.error
+        prompt = self.compile_expression(args[0]) if len(args) == 1 else None
+
+        def run_input(context):
+            if prompt is not None:
+                interpreter.output(primitive_value(prompt(context)))
+            elif len(args) > 1:
+                error(ErrorType.NAME_ERROR, f"No {func_name}() function found that takes > 1 parameter")
+            return convert(interpreter.get_input())
+
+        return run_input
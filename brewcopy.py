@@ -0,0 +1,142 @@
+import copy
+import weakref
+
+from element import Element
+from brewobjects import LazyObject
+from brewvalues import NIL, is_object
+
+'''
+Copy-on-write for interpreterv4's by-value arguments and return values.
+
+Passing or returning an object by value used to deep-copy everything it
+reaches. Now the copy is a handle: a brewobjects.LazyObject with the
+source's shape that copies the source's values the first time they're
+used, turning any object found there into a handle of the same copy in
+turn. So only the parts of the copy that are used get made, one object at
+a time, and a callee that only reads a field or two copies next to
+nothing.
+
+That is only right while nothing changes the objects a handle may still
+read from. So copying freezes the objects reachable from the source, and
+assigning a field of a frozen object, or passing one of its fields by
+ref, first finishes every copy in progress (CopyOnWrite.flush). Objects
+holding lambdas, which change their captured variables when they run,
+and objects whose fields have been passed by ref are still deep-copied
+up front.
+
+Every interpreter run has its own CopyOnWrite (Interpreter.copies), and
+stats() says how many copies were deferred and how many of them had to
+be finished.
+'''
+
+# one deferred copy: the handle made for each source object it reached so
+# far, so objects shared or cyclic in the source stay that way in the copy
+class Copy:
+    __slots__ = ("copies", "handles")
+
+    def __init__(self, copies):
+        self.copies = copies
+        self.handles = weakref.WeakValueDictionary()  # id of source object -> its handle
+
+    def translate(self, value):
+        if not is_object(value):
+            return value
+        handle = self.handles.get(id(value))
+        if handle is None:
+            handle = LazyObject(value.shape, self, value)
+            self.copies.lazy.add(handle)
+            self.handles[id(value)] = handle
+            self.copies.objects_copied += 1
+        return handle
+
+    # called by handle the first time its values are used
+    def make_values(self, handle, source):
+        self.copies.lazy.discard(handle)
+        return [self.translate(value) for value in source.values]
+
+
+class CopyOnWrite:
+    def __init__(self):
+        self.frozen = {}  # id -> object that a handle may still read from
+        self.pinned = weakref.WeakSet()  # objects whose fields were passed by ref
+        self.lazy = weakref.WeakSet()  # handles that haven't been used yet
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.immutable = 0
+        self.deferred = 0
+        self.eager = 0
+        self.flushed = 0
+        self.objects_copied = 0
+
+    def stats(self):
+        return {
+            'immutable': self.immutable,
+            'deferred': self.deferred,
+            'eager': self.eager,
+            'flushed': self.flushed,
+            'objects_copied': self.objects_copied,
+            # copies that never had to copy everything they could reach
+            'avoided': self.immutable + self.deferred - self.flushed,
+        }
+
+    # value, as passed or returned by value
+    def copy(self, value):
+        if is_object(value):
+            if self.freeze(value):
+                self.deferred += 1
+                return Copy(self).translate(value)
+        elif type(value) is not Element or value is NIL:
+            # ints, strings, bools, nil and functions never change once created
+            self.immutable += 1
+            return value
+        self.eager += 1
+        return copy.deepcopy(value)
+
+    # freezes every object reachable from obj, or returns False if the copy
+    # has to be made now
+    def freeze(self, obj):
+        if not self.lazy:
+            # no copy is reading from anything frozen any more
+            self.frozen.clear()
+        frozen = self.frozen
+        reached = {}
+        pending = [obj]
+        while pending:
+            obj = pending.pop()
+            key = id(obj)
+            if key in reached or key in frozen:
+                continue
+            if obj in self.pinned:
+                return False
+            reached[key] = obj
+            for value in obj.values:
+                if is_object(value):
+                    pending.append(value)
+                elif type(value) is Element and value is not NIL:
+                    return False  # a lambda
+        frozen.update(reached)
+        return True
+
+    # called before a field of obj is assigned
+    def before_write(self, obj):
+        if id(obj) in self.frozen:
+            self.flush()
+
+    # called before a field of obj is passed by ref, after which it can be
+    # assigned without going through before_write
+    def pin(self, obj):
+        if id(obj) in self.frozen:
+            self.flush()
+        self.pinned.add(obj)
+
+    # finishes every copy in progress, so the frozen objects may change
+    def flush(self):
+        copies = set()
+        while self.lazy:
+            for handle in list(self.lazy):
+                if type(handle) is LazyObject:
+                    copies.add(handle.maker())
+                    handle.force()
+        self.flushed += len(copies)
+        self.frozen.clear()
@@ -0,0 +1,60 @@
+import operator
+
+'''
+Binary operator kernels for interpreterv4's native values.
+
+KERNELS maps (operator, type of op1, type of op2) to a routine that computes
+the result for exactly that pair of Python types, with no further checks:
+int + int, str + str, bool == int, ... Pairs that aren't in the table
+(a type error, or nil, functions and objects on both sides of == and !=)
+go to the interpreter's evaluate_* method for the operator, which reports
+the same TYPE_ERRORs as before.
+'''
+
+ARITHMETIC_TYPES = (int, bool)
+NATIVE_TYPES = (int, bool, str)
+
+KERNELS = {}
+
+# arithmetic takes ints and bools, as ints; Python already treats a bool as
+# 0 or 1 here and gives back an int
+for left in ARITHMETIC_TYPES:
+    for right in ARITHMETIC_TYPES:
+        KERNELS['+', left, right] = operator.add
+        KERNELS['-', left, right] = operator.sub
+        KERNELS['*', left, right] = operator.mul
+        KERNELS['/', left, right] = operator.floordiv
+        KERNELS['&&', left, right] = lambda op1, op2: bool(op1) and bool(op2)
+        KERNELS['||', left, right] = lambda op1, op2: bool(op1) or bool(op2)
+KERNELS['+', str, str] = operator.add
+
+for name, compare in (('<', operator.lt), ('<=', operator.le), ('>', operator.gt), ('>=', operator.ge)):
+    KERNELS[name, int, int] = compare
+
+# == between two native values: same type compares the values, a bool and an
+# int compare as bools, and anything else is unequal
+for left in NATIVE_TYPES:
+    for right in NATIVE_TYPES:
+        if left is right:
+            KERNELS['==', left, right] = operator.eq
+            KERNELS['!=', left, right] = operator.ne
+        elif left in ARITHMETIC_TYPES and right in ARITHMETIC_TYPES:
+            KERNELS['==', left, right] = lambda op1, op2: bool(op1) == bool(op2)
+            KERNELS['!=', left, right] = lambda op1, op2: bool(op1) != bool(op2)
+        else:
+            KERNELS['==', left, right] = lambda op1, op2: False
+            KERNELS['!=', left, right] = lambda op1, op2: True
+
+
+# the binary operator `name` as one function: its kernel for the operands'
+# types when there is one, otherwise fallback (an evaluate_* method)
+def kernel_operator(name, fallback):
+    kernels = {(left, right): kernel for (op, left, right), kernel in KERNELS.items() if op == name}
+
+    def evaluate(op1, op2):
+        kernel = kernels.get((type(op1), type(op2)))
+        if kernel is None:
+            return fallback(op1, op2)
+        return kernel(op1, op2)
+
+    return evaluate
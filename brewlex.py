@@ -1,3 +1,7 @@
+import re
+import sys
+import threading
+import brewtables
 from ply import lex
 
 reserved = (
@@ -111,20 +115,143 @@ def t_newline(t):
 
 
 def t_comment(t):
-    r"/\*(.|\n)*?\*/"
-    t.lexer.lineno += t.value.count("\n")
+    r"/\*"
+    # find the terminator with str.find rather than a lazy regex so that long
+    # comments lex in linear time
+    lexer = t.lexer
+    end = -1
+    if not comment_known_unterminated(lexer, t.lexpos):
+        end = lexer.lexdata.find("*/", lexer.lexpos)
+    if end < 0:
+        # unterminated comments lex as a "/" followed by ordinary tokens; no
+        # later "/*" can be terminated either, so remember not to search again
+        lexer.unterminated_comment = (lexer.lexdata, t.lexpos)
+        lexer.lexpos = t.lexpos + 1
+        t.type = "DIVIDE"
+        t.value = "/"
+        return t
+    lexer.lineno += lexer.lexdata.count("\n", t.lexpos, end)
+    lexer.lexpos = end + 2
+
+
+def comment_known_unterminated(lexer, lexpos):
+    unterminated = getattr(lexer, "unterminated_comment", None)
+    return (
+        unterminated is not None
+        and unterminated[0] is lexer.lexdata
+        and unterminated[1] <= lexpos
+    )
 
 
 def t_STRING(t):
-    r'".*?"'
+    r'"[^"\n]*"'
     t.value = t.value[1:-1]
     return t
 
 
+# Syntax errors and illegal characters are printed through report(), which
+# counts them per thread so that brewparse.parse_program can tell whether
+# parsing a program printed anything.
+_reports = threading.local()
+
+
+def report(message):
+    print(message)
+    _reports.count = report_count() + 1
+
+
+def report_count():
+    return getattr(_reports, "count", 0)
+
+
 def t_error(t):
-    print(f"Illegal character {t.value[0]}")
+    report(f"Illegal character {t.value[0]}")
     t.lexer.skip(1)
 
 
-# Build the lexer
-lex.lex()
+# Fast lexer
+#
+# tokenize() scans with one master regex built from the same t_ rules, in the
+# order PLY tries them (function rules by line, then string rules longest
+# regex first), and yields (type, value, lineno) tuples lazily instead of
+# LexToken objects.
+
+_function_rules = [t_NUMBER, t_NAME, t_newline, t_comment, t_STRING]
+_string_rules = sorted(
+    [
+        (name, value)
+        for name, value in list(globals().items())
+        if name.startswith("t_") and name != "t_ignore" and isinstance(value, str)
+    ],
+    key=lambda rule: len(rule[1]),
+    reverse=True,
+)
+_simple_token_types = {name: name[2:] for name, _ in _string_rules}
+
+_master_re = re.compile(
+    "|".join(
+        [f"(?P<t_ignore>[{re.escape(t_ignore)}]+)"]
+        + [f"(?P<{f.__name__}>{f.__doc__})" for f in _function_rules]
+        + [f"(?P<{name}>{regex})" for name, regex in _string_rules]
+        + [f"(?P<literal>[{re.escape(''.join(literals))}])", "(?P<error>.)"]
+    ),
+    re.VERBOSE,
+)
+
+
+# report gets each "Illegal character" message, as t_error reports them
+def tokenize(program, report=report):
+    lineno = 1
+    simple_types = _simple_token_types
+    reserved_get = reserved_map.get
+    # see t_comment: no "*/" exists after a failed search position
+    unterminated_from = len(program)
+    pos = 0
+    while True:
+        # comments move the scan position, so restart finditer after each one
+        for match in _master_re.finditer(program, pos):
+            kind = match.lastgroup
+            if kind == "t_ignore":
+                continue
+            if kind == "t_NAME":
+                value = match.group()
+                yield (reserved_get(value, "NAME"), value, lineno)
+            elif kind in simple_types:
+                yield (simple_types[kind], match.group(), lineno)
+            elif kind == "t_NUMBER":
+                yield ("NUMBER", int(match.group()), lineno)
+            elif kind == "t_newline":
+                lineno += match.end() - match.start()
+            elif kind == "t_STRING":
+                yield ("STRING", match.group()[1:-1], lineno)
+            elif kind == "t_comment":
+                start = match.start()
+                end = -1
+                if start < unterminated_from:
+                    end = program.find("*/", start + 2)
+                if end < 0:
+                    unterminated_from = start
+                    yield ("DIVIDE", "/", lineno)
+                    pos = start + 1
+                else:
+                    lineno += program.count("\n", start, end)
+                    pos = end + 2
+                break
+            elif kind == "literal":
+                value = match.group()
+                yield (value, value, lineno)
+            else:
+                report(f"Illegal character {match.group()}")
+        else:
+            return
+
+
+# Build the lexer from the pre-generated tables (see brewtables.py)
+_table_dir = brewtables.table_dir()
+with brewtables.tables_on_path(_table_dir):
+    lexer = lex.lex(
+        module=sys.modules[__name__],
+        optimize=True,
+        lextab=brewtables.lexer_table_module(sys.modules[__name__]),
+        outputdir=_table_dir,
+    )
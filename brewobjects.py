@@ -0,0 +1,122 @@
+import copy
+
+'''
+Objects made with @ (interpreterv4).
+
+An Object doesn't keep a dict of its fields. It keeps a Shape, which maps
+each field name to an index, and a list of the field values in that order.
+Objects whose fields were added in the same order share one Shape, so a
+million small objects of the same kind hold a million short lists and one
+name-to-index map between them.
+
+Every object starts with the root shape, which only has proto (so proto is
+always values[PROTO]). Adding a field moves the object to the next shape
+along the transition for that name, creating it the first time any object
+adds that field to that shape; fields are never removed, so an index stays
+valid for as long as the object lives.
+
+Fields are plain values rather than Variables. Passing a.b by ref hands
+out a brewvalues.FieldRef, a Variable that reads and writes a.b in place,
+and brewcopy hands out LazyObjects whose values are only made when first
+used.
+'''
+
+PROTO = 0  # proto's index in every shape
+
+
+class Shape:
+    __slots__ = ("names", "index", "transitions")
+
+    def __init__(self, names):
+        self.names = names  # field names, in the order they were added
+        self.index = {name: index for index, name in enumerate(names)}
+        self.transitions = {}  # field name -> this shape with it added
+
+    def add(self, name):
+        shape = self.transitions.get(name)
+        if shape is None:
+            shape = Shape(self.names + (name,))
+            self.transitions[name] = shape
+        return shape
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+ROOT_SHAPE = Shape(('proto',))
+
+
+# the number of shapes reachable from shape, itself included
+def count_shapes(shape=ROOT_SHAPE):
+    count = 0
+    pending = [shape]
+    while pending:
+        shape = pending.pop()
+        count += 1
+        pending.extend(shape.transitions.values())
+    return count
+
+
+class Object:
+    __slots__ = ("shape", "values", "__weakref__")  # see brewcopy.Copy for the weak references
+    elem_type = 'obj'
+
+    def __init__(self, shape, values):
+        self.shape = shape
+        self.values = values
+
+    def set(self, name, value):
+        values = self.values
+        index = self.shape.index.get(name)
+        if index is None:
+            self.shape = self.shape.add(name)
+            values.append(value)
+        else:
+            values[index] = value
+
+    def items(self):
+        return zip(self.shape.names, self.values)
+
+    def __deepcopy__(self, memo):
+        obj = Object(self.shape, None)
+        memo[id(self)] = obj
+        obj.values = [copy.deepcopy(value, memo) for value in self.values]
+        return obj
+
+    def __str__(self):
+        fields = ', '.join(f"{name}: {'[obj]' if is_object(value) else value}" for name, value in self.items())
+        return f"obj: {fields}"
+
+
+VALUES = Object.values  # the slot a LazyObject keeps its values in once it has them
+
+
+# An object whose values are made from source by maker.make_values(self,
+# source) the first time they're used, after which it is a plain Object.
+class LazyObject(Object):
+    __slots__ = ()
+
+    def __init__(self, shape, maker, source):
+        self.shape = shape
+        VALUES.__set__(self, (maker, source))
+
+    @property
+    def values(self):
+        self.force()
+        return VALUES.__get__(self)
+
+    def maker(self):
+        return VALUES.__get__(self)[0]
+
+    def force(self):
+        maker, source = VALUES.__get__(self)
+        VALUES.__set__(self, maker.make_values(self, source))
+        self.__class__ = Object
+
+
+def is_object(value):
+    return type(value) is Object or type(value) is LazyObject
+
@@ -0,0 +1,37 @@
+from intbase import InterpreterBase
+
+'''
+The operators of interpreterv4's expressions, shared by all of its engines.
+
+Each table maps an expression node's elem_type to the Interpreter method
+that implements it; Interpreter.binary_operators and unary_operators hold
+those methods (binary ones behind brewkernels' type-pair kernels), and the
+engines call them from there.
+'''
+
+BINARY_OPERATORS = {
+    '+': 'evaluate_add',
+    '-': 'evaluate_subtract',
+    '*': 'evaluate_multiply',
+    '/': 'evaluate_divide',
+    '==': 'evaluate_equality',
+    '!=': 'evaluate_inequality',
+    '<': 'evaluate_less',
+    '<=': 'evaluate_less_equal',
+    '>': 'evaluate_greater',
+    '>=': 'evaluate_greater_equal',
+    '&&': 'evaluate_and_and',
+    '||': 'evaluate_or_or',
+}
+
+# with Interpreter(short_circuit=True), && and || don't evaluate op2 when
+# op1 is this
+SHORT_CIRCUIT_OPERATORS = {
+    '&&': False,
+    '||': True,
+}
+
+UNARY_OPERATORS = {
+    InterpreterBase.NEG_DEF: 'evaluate_neg',
+    '!': 'evaluate_not',
+}
@@ -1,7 +1,29 @@
-from element import Element
+from element import (
+    Arg,
+    Assign,
+    BinaryOp,
+    FuncCall,
+    FuncDef,
+    If,
+    LambdaDef,
+    Leaf,
+    Literal,
+    MethodCall,
+    Program,
+    Return,
+    UnaryOp,
+    Var,
+    While,
+)
+from brewcache import cache_from_environment
 from brewlex import *
 from intbase import InterpreterBase
 from ply import yacc
+import brewtables
+import copy
+import os
+import sys
+import threading
 
 # Parsing rules
 
@@ -25,7 +47,7 @@ def collapse_items(p, group_index, singleton_index):
 
 def p_program(p):
     "program : funcs"
-    p[0] = Element(InterpreterBase.PROGRAM_DEF, functions=p[1])
+    p[0] = Program(InterpreterBase.PROGRAM_DEF, functions=p[1])
 
 
 def p_funcs(p):
@@ -38,18 +60,18 @@ def p_func(p):
     """func : FUNC NAME LPAREN formal_args RPAREN LBRACE statements RBRACE
     | FUNC NAME LPAREN RPAREN LBRACE statements RBRACE"""
     if len(p) == 9:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.FUNC_DEF, name=p[2], args=p[4], statements=p[7])
+        p[0] = FuncDef(InterpreterBase.FUNC_DEF, name=p[2], args=p[4], statements=p[7])
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.FUNC_DEF, name=p[2], args=[], statements=p[6])
+        p[0] = FuncDef(InterpreterBase.FUNC_DEF, name=p[2], args=[], statements=p[6])
 
 
 def p_lambda(p):
     """lambda : LAMBDA LPAREN formal_args RPAREN LBRACE statements RBRACE
     | LAMBDA LPAREN RPAREN LBRACE statements RBRACE"""
     if len(p) == 8:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.LAMBDA_DEF, args=p[3], statements=p[6])
+        p[0] = LambdaDef(InterpreterBase.LAMBDA_DEF, args=p[3], statements=p[6])
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.LAMBDA_DEF, args=[], statements=p[5])
+        p[0] = LambdaDef(InterpreterBase.LAMBDA_DEF, args=[], statements=p[5])
 
 
 def p_formal_args(p):
@@ -60,12 +82,12 @@ def p_formal_args(p):
 
 def p_formal_arg(p):
     "formal_arg : NAME"
-    p[0] = Element(InterpreterBase.ARG_DEF, name=p[1])
+    p[0] = Arg(InterpreterBase.ARG_DEF, name=p[1])
 
 
 def p_formal_ref_arg(p):
     "formal_arg : REF NAME"
-    p[0] = Element(InterpreterBase.REFARG_DEF, name=p[2])
+    p[0] = Arg(InterpreterBase.REFARG_DEF, name=p[2])
 
 
 def p_statements(p):
@@ -76,7 +98,7 @@ def p_statements(p):
 
 def p_statement___assign(p):
     "statement : variable ASSIGN expression SEMI"
-    p[0] = Element("=", name=p[1], expression=p[3])
+    p[0] = Assign("=", name=p[1], expression=p[3])
 
 
 def p_variable(p):
@@ -93,14 +115,14 @@ def p_statement_if(p):
     | IF LPAREN expression RPAREN LBRACE statements RBRACE ELSE LBRACE statements RBRACE
     """
     if len(p) == 8:
-        p[0] = Element(
+        p[0] = If(
             InterpreterBase.IF_DEF,
             condition=p[3],
             statements=p[6],
             else_statements=None,
         )
     else:
-        p[0] = Element(
+        p[0] = If(
             InterpreterBase.IF_DEF,
             condition=p[3],
             statements=p[6],
@@ -110,7 +132,7 @@ def p_statement_if(p):
 
 def p_statement_while(p):
     "statement : WHILE LPAREN expression RPAREN LBRACE statements RBRACE"
-    p[0] = Element(InterpreterBase.WHILE_DEF, condition=p[3], statements=p[6])
+    p[0] = While(InterpreterBase.WHILE_DEF, condition=p[3], statements=p[6])
 
 
 def p_statement_expr(p):
@@ -125,17 +147,17 @@ def p_statement_return(p):
         expr = p[2]
     else:
         expr = None
-    p[0] = Element(InterpreterBase.RETURN_DEF, expression=expr)
+    p[0] = Return(InterpreterBase.RETURN_DEF, expression=expr)
 
 
 def p_expression_not(p):
     "expression : NOT expression"
-    p[0] = Element(InterpreterBase.NOT_DEF, op1=p[2])
+    p[0] = UnaryOp(InterpreterBase.NOT_DEF, op1=p[2])
 
 
 def p_expression_uminus(p):
     "expression : MINUS expression %prec UMINUS"
-    p[0] = Element(InterpreterBase.NEG_DEF, op1=p[2])
+    p[0] = UnaryOp(InterpreterBase.NEG_DEF, op1=p[2])
 
 
 def p_arith_expression_binop(p):
@@ -149,7 +171,7 @@ def p_arith_expression_binop(p):
     | expression MINUS expression
     | expression MULTIPLY expression
     | expression DIVIDE expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p[0] = BinaryOp(p[2], op1=p[1], op2=p[3])
 
 
 def p_expression_group(p):
@@ -160,12 +182,12 @@ def p_expression_group(p):
 def p_expression_and_or(p):
     """expression : expression OR expression
     | expression AND expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p[0] = BinaryOp(p[2], op1=p[1], op2=p[3])
 
 
 def p_expression_number(p):
     "expression : NUMBER"
-    p[0] = Element(InterpreterBase.INT_DEF, val=p[1])
+    p[0] = Literal(InterpreterBase.INT_DEF, val=p[1])
 
 
 def p_expression_lambda(p):
@@ -177,47 +199,47 @@ def p_expression_bool(p):
     """expression : TRUE
     | FALSE"""
     bool_val = p[1] == InterpreterBase.TRUE_DEF
-    p[0] = Element(InterpreterBase.BOOL_DEF, val=bool_val)
+    p[0] = Literal(InterpreterBase.BOOL_DEF, val=bool_val)
 
 
 def p_expression_nil(p):
     "expression : NIL"
-    p[0] = Element(InterpreterBase.NIL_DEF)
+    p[0] = Leaf(InterpreterBase.NIL_DEF)
 
 
 def p_expression_obj(
     p,
 ):  # e.g. a = @;   ### creates a new dictionary/object and stores in a
     "expression : AT"
-    p[0] = Element(InterpreterBase.OBJ_DEF)
+    p[0] = Leaf(InterpreterBase.OBJ_DEF)
 
 
 def p_expression_string(p):
     "expression : STRING"
-    p[0] = Element(InterpreterBase.STRING_DEF, val=p[1])
+    p[0] = Literal(InterpreterBase.STRING_DEF, val=p[1])
 
 
 def p_expression_variable(p):
     "expression : variable"
-    p[0] = Element(InterpreterBase.VAR_DEF, name=p[1])
+    p[0] = Var(InterpreterBase.VAR_DEF, name=p[1])
 
 
 def p_func_call(p):
     """expression : NAME LPAREN args RPAREN
     | NAME LPAREN RPAREN"""
     if len(p) == 5:
-        p[0] = Element(InterpreterBase.FCALL_DEF, name=p[1], args=p[3])
+        p[0] = FuncCall(InterpreterBase.FCALL_DEF, name=p[1], args=p[3])
     else:
-        p[0] = Element(InterpreterBase.FCALL_DEF, name=p[1], args=[])
+        p[0] = FuncCall(InterpreterBase.FCALL_DEF, name=p[1], args=[])
 
 
 def p_method_call(p):
     """expression : NAME DOT NAME LPAREN args RPAREN
     | NAME DOT NAME LPAREN RPAREN"""
     if len(p) == 7:
-        p[0] = Element(InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=p[5])
+        p[0] = MethodCall(InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=p[5])
     else:
-        p[0] = Element(InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=[])
+        p[0] = MethodCall(InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=[])
 
 
 def p_expression_args(p):
@@ -228,18 +250,81 @@ def p_expression_args(p):
 
 def p_error(p):
     if p:
-        print(f"Syntax error at '{p.value}'")
+        report(f"Syntax error at '{p.value}'")
     else:
-        print("Syntax error at EOF")
+        report("Syntax error at EOF")
+
+
+# shared by every interpreter in the process; see brewcache.py
+parse_cache = cache_from_environment()
+
+# 'ply' (the LALR tables below) or 'pratt' (the hand-written parser in brewpratt.py)
+PARSER_BACKEND = os.environ.get("BREWIN_PARSER", "ply")
+
+
+class Parser:
+    """
+    A reentrant parser. Each instance owns its lexer and LR stacks, so
+    separate instances can parse concurrently from different threads; a
+    single instance must not be shared between threads.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or PARSER_BACKEND
+        if self.backend not in ("ply", "pratt"):
+            raise ValueError(f"Unknown parser backend {self.backend}")
+        self.lexer = lexer.clone()
+        # a shallow copy shares the read-only LALR tables but gets its own
+        # statestack/symstack, which PLY keeps on the parser object
+        self.lr_parser = copy.copy(lr_parser)
+
+    def parse(self, program):
+        if self.backend == "pratt":
+            import brewpratt
+
+            return brewpratt.parse(program)
+        self.lexer.lineno = 1
+        return self.lr_parser.parse(program, lexer=self.lexer)
+
+
+_thread_parsers = threading.local()
+
+
+def thread_parser(backend):
+    parsers = getattr(_thread_parsers, "parsers", None)
+    if parsers is None:
+        parsers = _thread_parsers.parsers = {}
+    parser = parsers.get(backend)
+    if parser is None:
+        parser = parsers[backend] = Parser(backend)
+    return parser
 
 
 # exported function
-def parse_program(program):
-    ast = yacc.parse(program)
+def parse_program(program, use_cache=True, backend=None):
+    backend = backend or PARSER_BACKEND
+    if use_cache:
+        ast = parse_cache.get(program, backend)
+        if ast is not None:
+            return ast
+    reports = report_count()
+    ast = thread_parser(backend).parse(program)
     if ast is None:
         raise SyntaxError("Syntax error")
+    # a cached tree couldn't print the errors parsing it printed again
+    if use_cache and report_count() == reports:
+        parse_cache.put(program, backend, ast)
     return ast
 
 
-# generate our parser
-yacc.yacc()
+# load our parser from the pre-generated tables, regenerating them only if
+# the grammar no longer matches their signature (see brewtables.py)
+_table_dir = brewtables.table_dir()
+with brewtables.tables_on_path(_table_dir):
+    lr_parser = yacc.yacc(
+        module=sys.modules[__name__],
+        tabmodule=brewtables.PARSER_TABLE_MODULE,
+        outputdir=_table_dir,
+        debug=False,
+        write_tables=brewtables.tables_writable(_table_dir),
+    )
@@ -0,0 +1,271 @@
+from element import (
+    Arg,
+    Assign,
+    BinaryOp,
+    FuncCall,
+    FuncDef,
+    If,
+    LambdaDef,
+    Leaf,
+    Literal,
+    MethodCall,
+    Program,
+    Return,
+    UnaryOp,
+    Var,
+    While,
+)
+from intbase import InterpreterBase
+import brewlex
+import brewparse
+
+'''
+Hand-written recursive-descent parser for Brewin, with a Pratt loop for
+binary operators. It builds exactly the same Element trees as the PLY
+grammar in brewparse.py, and reads operator binding powers from
+brewparse.precedence so the two backends can't drift apart. Tokens come
+lazily from brewlex.tokenize, so a source is never held as a token list.
+
+A source with a syntax error is handed to the PLY parser instead. PLY's
+error recovery can report more than one error, and sometimes still
+returns a tree for what follows the bad token, so this is the only way to
+print the same messages and get the same result. The lexer's messages
+are held back until the Pratt parse succeeds so none are printed twice.
+
+Select it with parse_program(program, backend='pratt') or by setting
+BREWIN_PARSER=pratt.
+'''
+
+# binding power per token type, lowest level first as in the PLY table
+BINARY_PRECEDENCE = {}
+UNARY_PRECEDENCE = None
+for level, (assoc, *token_types) in enumerate(brewparse.precedence, start=1):
+    if 'UMINUS' in token_types:
+        UNARY_PRECEDENCE = level
+        continue
+    for token_type in token_types:
+        BINARY_PRECEDENCE[token_type] = level
+
+EOF_TOKEN = (None, None, 0)
+
+
+def ply_tokens(program):
+    lexer = brewlex.lexer.clone()
+    lexer.lineno = 1
+    lexer.input(program)
+    for tok in iter(lexer.token, None):
+        yield (tok.type, tok.value, tok.lineno)
+
+
+class PrattParser:
+    def __init__(self, tokens):
+        self.tokens = iter(tokens)
+        self.pending = []
+        self.current = next(self.tokens, EOF_TOKEN)
+
+    def advance(self):
+        tok = self.current
+        if self.pending:
+            self.current = self.pending.pop(0)
+        else:
+            self.current = next(self.tokens, EOF_TOKEN)
+        return tok
+
+    def peek_type(self, offset):
+        while len(self.pending) < offset:
+            self.pending.append(next(self.tokens, EOF_TOKEN))
+        return self.pending[offset - 1][0]
+
+    def expect(self, token_type):
+        tok = self.current
+        if tok[0] != token_type:
+            self.error()
+        self.advance()
+        return tok[1]
+
+    def error(self):
+        # parse() leaves reporting it to PLY
+        raise SyntaxError("Syntax error")
+
+    def parse_program(self):
+        functions = [self.parse_func()]
+        while self.current[0] is not None:
+            functions.append(self.parse_func())
+        return Program(InterpreterBase.PROGRAM_DEF, functions=functions)
+
+    def parse_func(self):
+        self.expect('FUNC')
+        name = self.expect('NAME')
+        args = self.parse_formal_args()
+        statements = self.parse_block()
+        return FuncDef(InterpreterBase.FUNC_DEF, name=name, args=args, statements=statements)
+
+    def parse_lambda(self):
+        self.expect('LAMBDA')
+        args = self.parse_formal_args()
+        statements = self.parse_block()
+        return LambdaDef(InterpreterBase.LAMBDA_DEF, args=args, statements=statements)
+
+    def parse_formal_args(self):
+        self.expect('LPAREN')
+        args = []
+        if self.current[0] != 'RPAREN':
+            args.append(self.parse_formal_arg())
+            while self.current[0] == 'COMMA':
+                self.advance()
+                args.append(self.parse_formal_arg())
+        self.expect('RPAREN')
+        return args
+
+    def parse_formal_arg(self):
+        if self.current[0] == 'REF':
+            self.advance()
+            return Arg(InterpreterBase.REFARG_DEF, name=self.expect('NAME'))
+        return Arg(InterpreterBase.ARG_DEF, name=self.expect('NAME'))
+
+    def parse_block(self):
+        # the grammar requires at least one statement per block
+        self.expect('LBRACE')
+        statements = [self.parse_statement()]
+        while self.current[0] != 'RBRACE':
+            statements.append(self.parse_statement())
+        self.advance()
+        return statements
+
+    def parse_statement(self):
+        tok_type = self.current[0]
+        if tok_type == 'IF':
+            self.advance()
+            condition = self.parse_condition()
+            statements = self.parse_block()
+            else_statements = None
+            if self.current[0] == 'ELSE':
+                self.advance()
+                else_statements = self.parse_block()
+            return If(
+                InterpreterBase.IF_DEF,
+                condition=condition,
+                statements=statements,
+                else_statements=else_statements,
+            )
+        if tok_type == 'WHILE':
+            self.advance()
+            condition = self.parse_condition()
+            statements = self.parse_block()
+            return While(InterpreterBase.WHILE_DEF, condition=condition, statements=statements)
+        if tok_type == 'RETURN':
+            self.advance()
+            expression = None
+            if self.current[0] != 'SEMI':
+                expression = self.parse_expression()
+            self.expect('SEMI')
+            return Return(InterpreterBase.RETURN_DEF, expression=expression)
+        if tok_type == 'NAME' and self.is_assignment():
+            name = self.advance()[1]
+            if self.current[0] == 'DOT':
+                self.advance()
+                name = name + "." + self.advance()[1]
+            self.advance()  # ASSIGN
+            expression = self.parse_expression()
+            self.expect('SEMI')
+            return Assign("=", name=name, expression=expression)
+        expression = self.parse_expression()
+        self.expect('SEMI')
+        return expression
+
+    def is_assignment(self):
+        # variable ASSIGN, where variable is NAME or NAME DOT NAME
+        next_type = self.peek_type(1)
+        if next_type == 'ASSIGN':
+            return True
+        return next_type == 'DOT' and self.peek_type(2) == 'NAME' and self.peek_type(3) == 'ASSIGN'
+
+    def parse_condition(self):
+        self.expect('LPAREN')
+        condition = self.parse_expression()
+        self.expect('RPAREN')
+        return condition
+
+    def parse_expression(self, min_precedence=1):
+        tok_type = self.current[0]
+        if tok_type == 'NOT' or tok_type == 'MINUS':
+            left = self.parse_unary()
+        else:
+            left = self.parse_primary()
+        precedence = BINARY_PRECEDENCE.get(self.current[0])
+        while precedence is not None and precedence >= min_precedence:
+            operator = self.advance()[1]
+            # every binary level is left associative
+            right = self.parse_expression(precedence + 1)
+            left = BinaryOp(operator, op1=left, op2=right)
+            precedence = BINARY_PRECEDENCE.get(self.current[0])
+        return left
+
+    def parse_unary(self):
+        if self.advance()[0] == 'NOT':
+            return UnaryOp(InterpreterBase.NOT_DEF, op1=self.parse_expression(UNARY_PRECEDENCE))
+        return UnaryOp(InterpreterBase.NEG_DEF, op1=self.parse_expression(UNARY_PRECEDENCE))
+
+    def parse_primary(self):
+        tok_type, value, _ = self.current
+        if tok_type == 'NAME':
+            self.advance()
+            return self.parse_name(value)
+        if tok_type == 'NUMBER':
+            self.advance()
+            return Literal(InterpreterBase.INT_DEF, val=value)
+        if tok_type == 'STRING':
+            self.advance()
+            return Literal(InterpreterBase.STRING_DEF, val=value)
+        if tok_type == 'TRUE' or tok_type == 'FALSE':
+            self.advance()
+            return Literal(InterpreterBase.BOOL_DEF, val=value == InterpreterBase.TRUE_DEF)
+        if tok_type == 'NIL':
+            self.advance()
+            return Leaf(InterpreterBase.NIL_DEF)
+        if tok_type == 'AT':
+            self.advance()
+            return Leaf(InterpreterBase.OBJ_DEF)
+        if tok_type == 'LPAREN':
+            self.advance()
+            expression = self.parse_expression()
+            self.expect('RPAREN')
+            return expression
+        if tok_type == 'LAMBDA':
+            return self.parse_lambda()
+        self.error()
+
+    def parse_name(self, name):
+        if self.current[0] == 'LPAREN':
+            return FuncCall(InterpreterBase.FCALL_DEF, name=name, args=self.parse_args())
+        if self.current[0] == 'DOT':
+            self.advance()
+            member = self.expect('NAME')
+            if self.current[0] == 'LPAREN':
+                return MethodCall(
+                    InterpreterBase.MCALL_DEF, objref=name, name=member, args=self.parse_args()
+                )
+            return Var(InterpreterBase.VAR_DEF, name=name + "." + member)
+        return Var(InterpreterBase.VAR_DEF, name=name)
+
+    def parse_args(self):
+        self.expect('LPAREN')
+        args = []
+        if self.current[0] != 'RPAREN':
+            args.append(self.parse_expression())
+            while self.current[0] == 'COMMA':
+                self.advance()
+                args.append(self.parse_expression())
+        self.expect('RPAREN')
+        return args
+
+
+def parse(program):
+    messages = []
+    try:
+        ast = PrattParser(brewlex.tokenize(program, messages.append)).parse_program()
+    except SyntaxError:
+        return brewparse.thread_parser('ply').parse(program)
+    for message in messages:
+        brewlex.report(message)
+    return ast
@@ -0,0 +1,209 @@
+from intbase import InterpreterBase
+from element import Arg, Assign, FuncCall, FuncDef, LambdaDef, Literal, MethodCall, Node, Var
+
+'''
+Name resolution pass, run once on a parsed program before interpreting it.
+
+It returns a new tree in which every Var and Assign node also carries:
+    path:  the name split on '.', e.g. ('a', 'b') for a.b
+    slot:  the index of the enclosing function's (or lambda's) formal
+           parameter that the first part of the path names, or None
+    local: whether that formal is local (below)
+and every formal's Arg node carries local as well.
+
+Formals are the only names that can be bound to a frame slot. Brewin scopes
+dynamically: a callee sees its callers' variables, and assigning to a name
+that already exists anywhere up the call chain updates it there, so any
+other name has to be found by walking the scope chain at run time. Names
+inside a lambda body are resolved against the lambda's own formals only;
+everything else it uses was captured when it was created.
+
+A by-value formal is local when nothing but its own function can see it:
+it's never passed by ref, no function called from there may look its
+name up (see outer_names), no lambda created there captures it, and it's
+never assigned as is to another name, which could then share its
+Variable (see brewvalues.assigned_variable). Its slot then holds the
+value itself rather than a Variable, and it isn't bound by name in the
+frame; every other formal keeps its Variable, which ref arguments and
+callees share.
+'''
+
+
+def resolve(ast):
+    function_index = {}
+    for func_node in ast.functions:
+        function_index.setdefault((func_node.name, len(func_node.args)), func_node)
+    reach = outer_names(ast, function_index)
+    local_names = {scope: local_formals(scope, function_index, reach) for scope in reach}
+    return resolve_node(ast, {}, frozenset(), local_names)
+
+
+def formal_slots(node):
+    # a repeated formal name binds to the last position, as in the frame's dict
+    return {arg.name: index for index, arg in enumerate(node.args)}
+
+
+# slots: formal name -> slot in the enclosing function; local: the names
+# of its local formals; local_names: local_formals for every function
+def resolve_node(node, slots, local, local_names):
+    if isinstance(node, tuple):
+        return tuple(resolve_node(child, slots, local, local_names) for child in node)
+    if not isinstance(node, Node):
+        return node
+    if isinstance(node, Var):
+        path = tuple(node.name.split('.'))
+        return Var(node.elem_type, name=node.name, slot=slots.get(path[0]), path=path, local=path[0] in local)
+    if isinstance(node, Assign):
+        path = tuple(node.name.split('.'))
+        return Assign(
+            node.elem_type,
+            name=node.name,
+            expression=resolve_node(node.expression, slots, local, local_names),
+            slot=slots.get(path[0]),
+            path=path,
+            local=path[0] in local,
+        )
+    if isinstance(node, Arg):
+        return Arg(node.elem_type, name=node.name, local=node.name in local)
+    if isinstance(node, (FuncDef, LambdaDef)):
+        slots = formal_slots(node)
+        local = local_names[node]
+        if isinstance(node, FuncDef) and node.name == 'main':
+            # the program's entry call binds no arguments, so main's formals
+            # (if any) are left to dynamic lookup, which reports them unbound
+            slots = {}
+    if not node.fields or isinstance(node, Literal):
+        return node
+    return type(node)(node.elem_type, **{
+        key: resolve_node(value, slots, local, local_names) for key, value in node.dict.items()
+    })
+
+
+# the names of the local formals of a function or lambda (see above)
+def local_formals(scope, function_index, reach):
+    if isinstance(scope, FuncDef) and scope.name == 'main':
+        return frozenset()
+    names = [arg.name for arg in scope.args]
+    local = {
+        arg.name for arg in scope.args
+        if arg.elem_type == InterpreterBase.ARG_DEF and names.count(arg.name) == 1
+    }
+    pending = list(scope.statements)
+    while pending and local:
+        node = pending.pop()
+        if isinstance(node, tuple):
+            pending.extend(node)
+            continue
+        if not isinstance(node, Node) or isinstance(node, Literal):
+            continue
+        if isinstance(node, LambdaDef):
+            if reach[node] is None:
+                return frozenset()
+            local -= reach[node]
+            continue
+        if isinstance(node, Assign) and isinstance(node.expression, Var):
+            local.discard(node.expression.name)
+        if isinstance(node, (FuncCall, MethodCall)) and node.name not in BUILTINS:
+            callee = function_index.get((node.name, len(node.args)))
+            if callee is None or reach[callee] is None:
+                return frozenset()
+            local -= reach[callee]
+            for arg, formal in zip(node.args, callee.args):
+                if formal.elem_type == InterpreterBase.REFARG_DEF and isinstance(arg, Var):
+                    local.discard(arg.name)
+        pending.extend(node.dict.values())
+    return frozenset(local)
+
+
+BUILTINS = ('print', 'inputi', 'inputs')
+
+
+def outer_names(ast, function_index):
+    '''
+    The names each function and lambda in the program may look up outside
+    its own formals while it runs: a frozenset per FuncDef and LambdaDef
+    node, or None if that could be any name.
+
+    Besides its own body, that covers the lambdas it creates (which capture
+    names when they're created) and, since scoping is dynamic, everything
+    the functions it calls may look up. A call through a variable could run
+    any code, so a function that can reach one gets None.
+
+    For a lambda these are the names it has to capture when it's created;
+    anything else can't be observed from its frame. A tail call can drop
+    the caller's frames if the callee can't look up any name in them (see
+    Interpreter.tail_call_scope).
+    '''
+    scopes = {}
+    pending = [ast]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, tuple):
+            pending.extend(node)
+        elif isinstance(node, Node):
+            if isinstance(node, (FuncDef, LambdaDef)):
+                scopes[node] = scan_scope(node, function_index)
+            if not isinstance(node, Literal):
+                pending.extend(node.dict.values())
+
+    # names each function or lambda can reach: what its body uses, what
+    # the lambdas it creates capture, and what its callees can reach,
+    # minus their own formals; grown until nothing changes
+    reach = {node: scope[0] for node, scope in scopes.items()}
+    changed = True
+    while changed:
+        changed = False
+        for node, (names, inner) in scopes.items():
+            if reach[node] is None:
+                continue
+            reached = set(names)
+            for other in inner:
+                if reach[other] is None:
+                    reached = None
+                    break
+                reached |= reach[other] - formal_names(other)
+            if reached is not None and len(reached) > len(reach[node]):
+                reach[node] = frozenset(reached)
+                changed = True
+            elif reached is None:
+                reach[node] = None
+                changed = True
+    return {
+        node: None if reach[node] is None else reach[node] - formal_names(node)
+        for node in scopes
+    }
+
+
+def formal_names(node):
+    return frozenset(arg.name for arg in node.args)
+
+
+# (names used directly in a function or lambda body, or None if it calls
+# through a variable; the lambdas created and functions called there).
+# The bodies of nested lambdas belong to those lambdas.
+def scan_scope(scope, function_index):
+    names = set()
+    inner = set()
+    dynamic = False
+    pending = list(scope.statements)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, tuple):
+            pending.extend(node)
+            continue
+        if not isinstance(node, Node) or isinstance(node, Literal):
+            continue
+        if isinstance(node, LambdaDef):
+            inner.add(node)
+            continue
+        if isinstance(node, (Var, Assign)):
+            names.add(node.name.split('.')[0])
+        elif isinstance(node, (FuncCall, MethodCall)) and node.name not in BUILTINS:
+            callee = function_index.get((node.name, len(node.args)))
+            if callee is not None:
+                inner.add(callee)
+            else:
+                names.add(node.name)
+                dynamic = True
+        pending.extend(node.dict.values())
+    return (None if dynamic else frozenset(names)), inner
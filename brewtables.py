@@ -0,0 +1,61 @@
+import hashlib
+import os
+import sys
+from contextlib import contextmanager
+
+'''
+Location and versioning of the pre-generated PLY tables.
+
+brewlex.py and brewparse.py load their lexer/parser tables from
+table_dir() instead of reflecting over the grammar at every import. The
+repo ships tables for the current grammar in tables/; point
+BREWIN_TABLE_DIR somewhere else to use (and fill) a different cache.
+Tables are only regenerated when their signature no longer matches the
+grammar, and are only written back when the directory is writable, so a
+read-only install never touches the working directory.
+'''
+
+SHIPPED_TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables')
+
+PARSER_TABLE_MODULE = 'brewparsetab'
+LEXER_TABLE_PREFIX = 'brewlextab_'
+
+
+def table_dir():
+    return os.environ.get('BREWIN_TABLE_DIR') or SHIPPED_TABLE_DIR
+
+
+def tables_writable(directory):
+    if os.path.isdir(directory):
+        return os.access(directory, os.W_OK)
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return False
+    return True
+
+
+# PLY checks the parser signature itself but trusts lextab files blindly in
+# optimize mode, so the lexer table name carries a hash of the token rules
+def lexer_table_module(module):
+    digest = hashlib.sha256()
+    for name in sorted(dir(module)):
+        if name in ('tokens', 'literals', 'reserved') or name.startswith('t_'):
+            value = getattr(module, name)
+            if callable(value):
+                value = value.__doc__
+            digest.update(f'{name}={value!r};'.encode())
+    return LEXER_TABLE_PREFIX + digest.hexdigest()[:16]
+
+
+@contextmanager
+def tables_on_path(directory):
+    # PLY imports table modules by name
+    sys.path.insert(0, directory)
+    try:
+        yield
+    finally:
+        try:
+            sys.path.remove(directory)
+        except ValueError:
+            pass
@@ -0,0 +1,612 @@
+from intbase import InterpreterBase
+from intbase import ErrorType
+from element import Element
+from brewclosures import ClosureCompiler
+from brewoperators import BINARY_OPERATORS, SHORT_CIRCUIT_OPERATORS, UNARY_OPERATORS
+from brewobjects import PROTO
+from brewresolve import BUILTINS
+from brewvalues import CONSTANT_TYPES, NIL, Environment, FieldRef, TailCall, Variable, capture_variables
+from brewvalues import assigned_variable, is_function, is_object, new_object, output_text, primitive_value
+
+'''
+Brewin-to-Python backend for interpreterv4. Select it with
+Interpreter(engine='python').
+
+Every function and lambda in a program is translated into the source of one
+Python function, all of them are compiled together with compile() and the
+resulting functions are called directly, so control flow, calls and
+argument passing run as plain Python with no per-node dispatch.
+
+Values are the same native Python values the other interpreterv4 engines
+use (see brewvalues.NATIVE_TYPES), but only some Brewin variables become
+Python locals. Formals that brewresolve bound to a slot are read into
+Python locals s0, s1, ...: the value itself for a formal it marked local,
+otherwise its Variable cell. Every other variable is a Variable cell in an
+Environment chain (c0 for the function, c1, c2, ... for nested blocks),
+read with load() and written with assign(), because Brewin scoping is
+dynamic: a callee or lambda can see the variable, and assigning a name
+updates whichever frame up the call chain already has it. Making such a
+variable a Python local would mean proving that no caller ever binds the
+name and nothing called ever reads it, and brewresolve only proves that
+for formals.
+Operators, conversions and errors go through the same helpers as the other
+engines (the interpreter's operator kernels and error()), so programs
+print the same output and fail with the same errors.
+
+Python won't compile code nested too deeply (around 200 open parentheses,
+20 nested loops or 100 indents), so an expression nested more than
+MAX_EXPRESSION_DEPTH levels below a statement is moved into a helper
+function e0, e1, ... that returns its value, and a block nested more than
+MAX_BLOCK_DEPTH levels into one generated function runs as a helper
+function b0, b1, ... of its own. Helpers are defined at the top of the
+function that uses them and called where the expression would have been
+evaluated or the block run, so nothing is evaluated any earlier, or more
+often, than before. A program that is still too deep for compile() runs on
+the closure engine instead.
+
+    python -m brewtranspile program.br
+
+prints the generated source for a program.
+'''
+
+CONDITION_TYPES = (bool, int)
+
+MAX_EXPRESSION_DEPTH = 16  # a Brewin call nests up to 6 Python parentheses
+MAX_BLOCK_DEPTH = 8
+LEAF_TYPES = CONSTANT_TYPES + (InterpreterBase.VAR_DEF,)  # never worth a helper of their own
+CALL_TYPES = (InterpreterBase.FCALL_DEF, InterpreterBase.MCALL_DEF)
+
+
+class Runtime:
+    # the helpers generated code calls, besides the operators
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.functions = {}  # FuncDef node -> its compiled Python function
+
+    def error(self, error_type, description):
+        self.interpreter.error(error_type, description)
+
+    # what evaluate_var does once a name isn't a variable
+    def function_value(self, var_name, ref):
+        overloads = self.interpreter.function_overloads.get(var_name, ())
+        if len(overloads) > 1:
+            self.error(ErrorType.NAME_ERROR, f"Ambigous function {var_name}")
+        if overloads:
+            return Variable(overloads[0]) if ref else overloads[0]
+        self.error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined")
+
+    def load(self, context, name):
+        variable = context.lookup(name)
+        if variable is not None:
+            return variable.value
+        return self.function_value(name, False)
+
+    def load_ref(self, context, name):
+        variable = context.lookup(name)
+        if variable is not None:
+            return variable
+        return self.function_value(name, True)
+
+    def load_member(self, variable, member, var_name, ref=False):
+        obj = variable.value if variable is not None else None
+        return self.load_object_member(obj, member, var_name, ref)
+
+    def load_object_member(self, obj, member, var_name, ref=False):
+        while is_object(obj):
+            index = obj.shape.index.get(member)
+            if index is not None:
+                if ref:
+                    self.interpreter.copies.pin(obj)
+                    return FieldRef(obj, index)
+                return obj.values[index]
+            obj = obj.values[PROTO]
+        return self.function_value(var_name, ref)
+
+    def assign(self, context, name, value):
+        variable = context.lookup(name)
+        if variable is not None:
+            variable.value = value
+        else:
+            context.vars[name] = Variable(value)
+
+    # assign for `name = variable`, where source is the variable's cell,
+    # which a new name can share (see brewvalues.assigned_variable)
+    def assign_variable(self, context, name, value, source):
+        variable = context.lookup(name)
+        if variable is not None:
+            variable.value = value
+        else:
+            context.vars[name] = assigned_variable(source, value)
+
+    def object_variable(self, variable, full_name):
+        if variable is None:
+            self.error(ErrorType.NAME_ERROR, f"Unknown object {full_name}")
+        return variable
+
+    def assign_member(self, variable, name, member, value):
+        self.store_member(variable.value, name, member, value)
+
+    def store_member(self, obj, name, member, value):
+        if not is_object(obj):
+            self.error(ErrorType.TYPE_ERROR, f"{name} is not an object")
+        self.interpreter.copies.before_write(obj)
+        obj.set(member, value)
+
+    def condition(self, value, description):
+        if type(value) not in CONDITION_TYPES:
+            self.error(ErrorType.TYPE_ERROR, description)
+        return value
+
+    def enter(self, context, formals, variables):
+        func_context = Environment(context, [])
+        for (name, _, local), variable in zip(formals, variables):
+            # a local formal is passed as its value (see brewresolve.py)
+            if not local:
+                func_context.vars[name] = variable
+            func_context.slots.append(variable)
+        return func_context
+
+    # a call through a variable: each arg is a Var node's (slot, path, name)
+    # or a function evaluating any other expression, since whether it is
+    # passed by ref depends on the target. With tail it's `return
+    # func_name(...)`, and gives back a TailCall
+    def call_value(self, context, func_name, args, tail=False):
+        arity = len(args)
+        variable = context.lookup(func_name)
+        target = variable.value if variable is not None else None
+        if target is None:
+            self.evaluate_args(context, args)
+            self.error(ErrorType.NAME_ERROR, f"No {func_name} function found that takes {arity} parameters")
+        if not is_function(target):
+            self.evaluate_args(context, args)
+            self.error(ErrorType.TYPE_ERROR, f"{func_name} is not a function")
+        if arity != len(target.dict['args']):
+            self.evaluate_args(context, args)
+            self.error(ErrorType.TYPE_ERROR, f"{func_name} does not take {arity} parameters")
+        if target.elem_type == InterpreterBase.LAMBDA_DEF:
+            formals = target.dict['formals']
+        else:
+            formals = self.interpreter.formals[target]
+        copy_value = self.interpreter.copies.copy
+        variables = []
+        for (_, reference, local), arg in zip(formals, args):
+            if isinstance(arg, tuple):
+                variable = self.find_variable(context, arg, reference)
+                if reference:
+                    variables.append(variable)
+                elif local:
+                    variables.append(copy_value(variable))
+                else:
+                    variables.append(Variable(copy_value(variable)))
+            elif reference:
+                variables.append(Variable(arg()))
+            elif local:
+                variables.append(copy_value(arg()))
+            else:
+                variables.append(Variable(copy_value(arg())))
+        parent = self.interpreter.tail_call_scope(target, context) if tail else context
+        func_context = self.enter(parent, formals, variables)
+        if target.elem_type == InterpreterBase.LAMBDA_DEF:
+            func_context.vars.update(target.dict['free_vars'])
+            function = target.dict['function']
+        else:
+            function = self.functions[target]
+        if tail:
+            return TailCall(function, func_context, func_name)
+        return self.run_tail_calls(function(func_context))
+
+    # runs the TailCall a function returned, and each one that returns in
+    # turn, and gives what `return f(...)` would have made of the last
+    # result, like Interpreter.run_body; anything else is passed through
+    def run_tail_calls(self, run_result):
+        if type(run_result) is not TailCall:
+            return run_result
+        while type(run_result) is TailCall:
+            run_result = run_result.body(run_result.context)
+        if run_result is None:
+            return NIL
+        return self.interpreter.copies.copy(run_result)
+
+    def evaluate_args(self, context, args):
+        for arg in args:
+            if isinstance(arg, tuple):
+                self.find_variable(context, arg, False)
+            else:
+                arg()
+
+    def find_variable(self, context, operand, ref):
+        slot, path, var_name = operand
+        if slot is not None:
+            variable = context.frame.slots[slot]
+        else:
+            variable = context.lookup(path[0])
+        if len(path) > 1:
+            return self.load_member(variable, path[1], var_name, ref)
+        if variable is not None:
+            return variable if ref else variable.value
+        return self.function_value(var_name, ref)
+
+    def make_lambda(self, context, node, formals, function):
+        formal_args = [name for name, _, _ in formals]
+        free_vars = capture_variables(context, self.interpreter.outer_names[node], formal_args)
+        return Element(InterpreterBase.LAMBDA_DEF, args=node.args, statements=node.statements,
+                       formals=formals, free_vars=free_vars, function=function, node=node)
+
+    def none_to_nil(self, value):
+        if value is None:
+            return NIL
+        return value
+
+    def to_output(self, value):
+        if value is None:
+            self.error(ErrorType.NAME_ERROR, f"Missing some var")
+        return output_text(value)
+
+    def print_pieces(self, pieces):
+        self.interpreter.output(''.join(pieces))
+        return None
+
+    def inputi(self, prompt=None):
+        if prompt is not None:
+            self.interpreter.output(primitive_value(prompt))
+        return int(self.interpreter.get_input())
+
+    def inputs(self, prompt=None):
+        if prompt is not None:
+            self.interpreter.output(primitive_value(prompt))
+        return str(self.interpreter.get_input())
+
+
+class Transpiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.runtime = Runtime(interpreter)
+        self.constants = []  # Python objects the generated code refers to as k0, k1, ...
+        self.constant_index = {}
+        self.function_names = {}  # FuncDef or LambdaDef node -> name of its Python function
+        self.helper_count = 0
+        self.fallback = None  # the ClosureCompiler running the program if compile() failed
+        # the def being generated: its lines, the helpers to define at its
+        # top, the block depth emit() indents from and how deeply nested the
+        # expression being generated is
+        self.lines = []
+        self.helpers = []
+        self.base = 0
+        self.expression_depth = 0
+
+    def constant(self, value):
+        key = id(value)
+        if key not in self.constant_index:
+            self.constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return f"k{self.constant_index[key]}"
+
+    def emit(self, depth, line):
+        self.lines.append('    ' * (depth - self.base) + line)
+
+    def helper_name(self, prefix):
+        self.helper_count += 1
+        return f"{prefix}{self.helper_count - 1}"
+
+    # starts generating a def whose body is at block depth base + 1
+    def begin_def(self, base):
+        outer = (self.lines, self.helpers, self.base, self.expression_depth)
+        self.lines, self.helpers, self.base, self.expression_depth = [], [], base, 0
+        return outer
+
+    # finishes it, returning its lines, and goes back to generating outer
+    def end_def(self, outer, header):
+        lines = [header] + ['    ' + line for line in self.helpers] + self.lines
+        self.lines, self.helpers, self.base, self.expression_depth = outer
+        return lines
+
+    # source
+
+    def transpile_program(self, functions):
+        for index, func_node in enumerate(functions):
+            self.function_names[func_node] = f"f{index}_{func_node.name}"
+        pending = list(functions)
+        while pending:
+            node = pending.pop(0)
+            pending.extend(self.transpile_function(node))
+        return '\n'.join(self.lines) + '\n'
+
+    def transpile_function(self, node):
+        self.lambdas = []
+        name = self.function_names[node]
+        formals = self.interpreter.formals[node]
+        signature = ', '.join(('ref ' if reference else '') + formal for formal, reference, _ in formals)
+        label = 'lambda' if node.elem_type == InterpreterBase.LAMBDA_DEF else node.name
+        outer = self.begin_def(0)
+        # the locals block helpers assign, which are the local formals' values
+        self.rebound = []
+        if formals and not (node.elem_type == InterpreterBase.FUNC_DEF and node.name == 'main'):
+            cells = ''.join(f"s{index}, " for index in range(len(formals)))
+            self.emit(1, f"{cells}= c0.slots")
+            self.rebound = [f"s{index}" for index, (_, _, local) in enumerate(formals) if local]
+        self.transpile_statements(node.statements, 1)
+        self.emit(1, "return None")
+        lines = self.end_def(outer, f"def {name}(c0):  # {label}({signature})")
+        self.lines.extend(lines)
+        self.emit(0, "")
+        return self.lambdas
+
+    def transpile_statements(self, statements, depth):
+        for statement in statements:
+            self.transpile_statement(statement, depth)
+
+    def transpile_block(self, statements, depth):
+        if depth - self.base > MAX_BLOCK_DEPTH:
+            self.transpile_block_helper(statements, depth)
+            return
+        self.emit(depth, f"c{depth - 1} = Environment(c{depth - 2})")
+        self.transpile_statements(statements, depth)
+
+    # runs the block in a helper that returns what would end the function
+    def transpile_block_helper(self, statements, depth):
+        name = self.helper_name('b')
+        outer = self.begin_def(depth - 1)
+        if self.rebound:
+            self.emit(depth, f"nonlocal {', '.join(self.rebound)}")
+        self.emit(depth, f"c{depth - 1} = Environment(c{depth - 2})")
+        self.transpile_statements(statements, depth)
+        lines = self.end_def(outer, f"def {name}():")
+        self.helpers.extend(lines)
+        self.emit(depth, f"r = {name}()")
+        self.emit(depth, "if r is not None:")
+        self.emit(depth + 1, "return r")
+
+    def transpile_statement(self, node, depth):
+        context = f"c{depth - 1}"
+        elem_type = node.elem_type
+        if elem_type == '=':
+            self.transpile_assign(node, depth)
+        elif elem_type == InterpreterBase.IF_DEF:
+            condition = self.transpile_expression(node.condition, context)
+            self.emit(depth, f"if condition({condition}, 'Incompatible type for if condition'):")
+            self.transpile_block(node.statements, depth + 1)
+            if node.else_statements is not None:
+                self.emit(depth, "else:")
+                self.transpile_block(node.else_statements, depth + 1)
+        elif elem_type == InterpreterBase.WHILE_DEF:
+            condition = self.transpile_expression(node.condition, context)
+            self.emit(depth, f"while condition({condition}, 'Incompatible type for while condition'):")
+            self.transpile_block(node.statements, depth + 1)
+        elif elem_type == InterpreterBase.RETURN_DEF:
+            expression = node.expression
+            if expression is None:
+                self.emit(depth, f"return {self.constant(NIL)}")
+            elif expression.elem_type in CALL_TYPES and expression.name not in BUILTINS:
+                self.emit(depth, f"return {self.transpile_call(expression.name, expression.args, context, tail=True)}")
+            else:
+                self.emit(depth, f"return copy_value({self.transpile_expression(node.expression, context)})")
+        elif elem_type == InterpreterBase.FCALL_DEF:
+            call = self.transpile_call(node.name, node.args, context)
+            if node.name == 'print':
+                self.emit(depth, call)
+            else:
+                # as in the tree walker, a call statement that produces a value ends the function
+                self.emit(depth, f"r = {call}")
+                self.emit(depth, "if r is not None:")
+                self.emit(depth + 1, "return r")
+        # any other expression statement does nothing
+
+    def transpile_assign(self, node, depth):
+        context = f"c{depth - 1}"
+        path = node.path
+        if node.local:
+            value = self.transpile_expression(node.expression, context)
+            if len(path) > 1:
+                self.emit(depth, f"store_member(s{node.slot}, {path[0]!r}, {path[1]!r}, {value})")
+            else:
+                self.emit(depth, f"s{node.slot} = {value}")
+            return
+        if node.slot is not None:
+            base = f"s{node.slot}"
+        else:
+            base = f"{context}.lookup({path[0]!r})"
+        if len(path) > 1:
+            variable = f"object_variable({base}, {node.name!r})"
+            value = self.transpile_expression(node.expression, context)
+            self.emit(depth, f"assign_member({variable}, {path[0]!r}, {path[1]!r}, {value})")
+        elif node.slot is not None:
+            self.emit(depth, f"{base}.value = {self.transpile_expression(node.expression, context)}")
+        else:
+            value = self.transpile_expression(node.expression, context)
+            right = node.expression
+            if right.elem_type == InterpreterBase.VAR_DEF and len(right.path) == 1:
+                # never a local formal (see brewresolve.py)
+                source = f"s{right.slot}" if right.slot is not None else f"{context}.lookup({right.name!r})"
+                self.emit(depth, f"assign_variable({context}, {path[0]!r}, {value}, {source})")
+            else:
+                self.emit(depth, f"assign({context}, {path[0]!r}, {value})")
+
+    def transpile_expression(self, node, context):
+        if self.expression_depth >= MAX_EXPRESSION_DEPTH and node.elem_type not in LEAF_TYPES:
+            return self.transpile_expression_helper(node, context)
+        self.expression_depth += 1
+        value = self.transpile_operation(node, context)
+        self.expression_depth -= 1
+        return value
+
+    def transpile_expression_helper(self, node, context):
+        name = self.helper_name('e')
+        depth = self.expression_depth
+        self.expression_depth = 0
+        value = self.transpile_expression(node, context)
+        self.expression_depth = depth
+        self.helpers.extend([f"def {name}():", f"    return {value}"])
+        return f"{name}()"
+
+    def transpile_operation(self, node, context):
+        elem_type = node.elem_type
+        if elem_type in CONSTANT_TYPES:
+            return self.constant(self.interpreter.constants[node])
+        elif elem_type == InterpreterBase.VAR_DEF:
+            return self.transpile_var(node, context)
+        elif elem_type == InterpreterBase.LAMBDA_DEF:
+            self.function_names[node] = f"lambda{len(self.function_names)}"
+            self.lambdas.append(node)
+            formals = self.constant(self.interpreter.formals[node])
+            return f"make_lambda({context}, {self.constant(node)}, {formals}, {self.function_names[node]})"
+        elif elem_type in SHORT_CIRCUIT_OPERATORS and self.interpreter.short_circuit:
+            # logical_operand gives a bool, so Python's and/or give the same one
+            op1 = self.transpile_expression(node.op1, context)
+            op2 = self.transpile_expression(node.op2, context)
+            keyword = 'and' if elem_type == '&&' else 'or'
+            return f"(logical_operand({elem_type!r}, {op1}) {keyword} logical_operand({elem_type!r}, {op2}))"
+        elif elem_type in BINARY_OPERATORS:
+            op1 = self.transpile_expression(node.op1, context)
+            op2 = self.transpile_expression(node.op2, context)
+            return f"{BINARY_OPERATORS[elem_type]}({op1}, {op2})"
+        elif elem_type in UNARY_OPERATORS:
+            return f"{UNARY_OPERATORS[elem_type]}({self.transpile_expression(node.op1, context)})"
+        elif elem_type == InterpreterBase.FCALL_DEF or elem_type == InterpreterBase.MCALL_DEF:
+            # method calls are still dispatched by method name alone, as in the tree walker
+            return f"none_to_nil({self.transpile_call(node.name, node.args, context)})"
+        elif elem_type == InterpreterBase.OBJ_DEF:
+            return "new_object()"
+        return f"error({self.constant(ErrorType.NAME_ERROR)}, {f'Unknown expression {node}'!r})"
+
+    def transpile_var(self, node, context, ref=False):
+        path = node.path
+        if node.local:
+            # only ever passed by ref as a.b, which is a field's cell
+            if len(path) > 1:
+                return f"load_object_member(s{node.slot}, {path[1]!r}, {node.name!r}, {ref})"
+            return f"s{node.slot}"
+        if node.slot is not None:
+            base = f"s{node.slot}"
+        elif len(path) == 1:
+            return f"load{'_ref' if ref else ''}({context}, {path[0]!r})"
+        else:
+            base = f"{context}.lookup({path[0]!r})"
+        if len(path) > 1:
+            return f"load_member({base}, {path[1]!r}, {node.name!r}, {ref})"
+        return base if ref else f"{base}.value"
+
+    # with tail, the call is `return func_name(...)` and evaluates to a
+    # TailCall for the callee, in a frame under Interpreter.tail_call_scope
+    def transpile_call(self, func_name, args, context, tail=False):
+        if func_name == 'print':
+            pieces = ''.join(f"to_output({self.transpile_expression(arg, context)}), " for arg in args)
+            return f"print_pieces(({pieces}))"
+        if func_name == 'inputi' or func_name == 'inputs':
+            if len(args) > 1:
+                message = f"No {func_name}() function found that takes > 1 parameter"
+                return f"error({self.constant(ErrorType.NAME_ERROR)}, {message!r})"
+            prompt = ', '.join(self.transpile_expression(arg, context) for arg in args)
+            return f"{func_name}({prompt})"
+
+        func_node = self.interpreter.function_index.get((func_name, len(args)))
+        if func_node is not None:
+            # the callee is known, so each argument is passed the way its formal says
+            formals = self.interpreter.formals[func_node]
+            variables = ''
+            for arg, (_, reference, local) in zip(args, formals):
+                if reference and arg.elem_type == InterpreterBase.VAR_DEF:
+                    variables += self.transpile_var(arg, context, ref=True) + ', '
+                elif reference:
+                    variables += f"Variable({self.transpile_expression(arg, context)}), "
+                elif local:
+                    variables += f"copy_value({self.transpile_expression(arg, context)}), "
+                else:
+                    variables += f"Variable(copy_value({self.transpile_expression(arg, context)})), "
+            name = self.function_names[func_node]
+            if tail:
+                parent = f"tail_call_scope({self.constant(func_node)}, {context})"
+                return f"TailCall({name}, enter({parent}, {self.constant(formals)}, ({variables})), {func_name!r})"
+            call = f"{name}(enter({context}, {self.constant(formals)}, ({variables})))"
+            if self.makes_tail_calls(func_node.statements):
+                return f"run_tail_calls({call})"
+            return call
+
+        operands = ''
+        for arg in args:
+            if arg.elem_type == InterpreterBase.VAR_DEF:
+                operands += f"{self.constant((arg.slot, arg.path, arg.name))}, "
+            else:
+                operands += f"lambda: {self.transpile_expression(arg, context)}, "
+        return f"call_value({context}, {func_name!r}, ({operands}){', True' if tail else ''})"
+
+    # whether statements can end their function with a TailCall
+    def makes_tail_calls(self, statements):
+        for node in statements:
+            elem_type = node.elem_type
+            if elem_type == InterpreterBase.RETURN_DEF:
+                expression = node.expression
+                if expression is not None and expression.elem_type in CALL_TYPES and expression.name not in BUILTINS:
+                    return True
+            elif elem_type == InterpreterBase.IF_DEF:
+                if self.makes_tail_calls(node.statements) or \
+                        (node.else_statements is not None and self.makes_tail_calls(node.else_statements)):
+                    return True
+            elif elem_type == InterpreterBase.WHILE_DEF:
+                if self.makes_tail_calls(node.statements):
+                    return True
+        return False
+
+    # running it
+
+    def namespace(self):
+        runtime = self.runtime
+        namespace = {
+            'Environment': Environment,
+            'Variable': Variable,
+            'TailCall': TailCall,
+            'tail_call_scope': self.interpreter.tail_call_scope,
+            'copy_value': self.interpreter.copies.copy,
+            'logical_operand': self.interpreter.logical_operand,
+            'new_object': new_object,
+        }
+        for method in ('error', 'load', 'load_ref', 'load_member', 'load_object_member', 'assign',
+                       'assign_variable', 'object_variable', 'assign_member', 'store_member', 'condition', 'enter',
+                       'call_value', 'run_tail_calls', 'make_lambda', 'none_to_nil', 'to_output', 'print_pieces',
+                       'inputi', 'inputs'):
+            namespace[method] = getattr(runtime, method)
+        for operator, method in BINARY_OPERATORS.items():
+            namespace[method] = self.interpreter.binary_operators[operator]
+        for operator, method in UNARY_OPERATORS.items():
+            namespace[method] = self.interpreter.unary_operators[operator]
+        for index, value in enumerate(self.constants):
+            namespace[f"k{index}"] = value
+        return namespace
+
+    def compile_program(self, functions):
+        try:
+            code = compile(self.transpile_program(functions), '<brewin>', 'exec')
+        except (SyntaxError, RecursionError, MemoryError):
+            self.fallback = ClosureCompiler(self.interpreter)
+            self.fallback.compile_program(functions)
+            return None
+        namespace = self.namespace()
+        exec(code, namespace)
+        self.runtime.functions = {node: namespace[self.function_names[node]] for node in functions}
+        return self.runtime.functions
+
+    def run_main_func(self, func_node):
+        if self.fallback is not None:
+            return self.fallback.run_main_func(func_node)
+        return self.runtime.run_tail_calls(self.runtime.functions[func_node](Environment()))
+
+
+def main(argv):
+    import sys
+    from interpreterv4 import Interpreter
+
+    if len(argv) != 2:
+        print("usage: python -m brewtranspile program.br", file=sys.stderr)
+        return 2
+    with open(argv[1]) as f:
+        program = f.read()
+    interpreter = Interpreter()
+    interpreter.prepare(program)
+    print(Transpiler(interpreter).transpile_program(interpreter.functions), end='')
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+
+    sys.exit(main(sys.argv))
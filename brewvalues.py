@@ -0,0 +1,267 @@
+from element import Element, Node
+from intbase import InterpreterBase
+from brewobjects import ROOT_SHAPE, Object, is_object
+
+'''
+Runtime values, kept separate from the (immutable) AST.
+
+Values are Elements that are never modified once created: assignment
+rebinds a Variable instead of overwriting the Element it holds. Anything
+that used to share an Element to share a variable (block scopes, ref
+arguments, captured functions/objects) shares the Variable instead.
+interpreterv4 goes further and doesn't wrap ints, strings and bools at
+all (see NATIVE_TYPES), and its objects are brewobjects.Objects.
+'''
+
+
+class Variable:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+# a field of an interpreterv4 object, passed by ref: reads and writes go
+# straight to the object's values
+class FieldRef(Variable):
+    __slots__ = ("obj", "index")
+
+    def __init__(self, obj, index):
+        self.obj = obj
+        self.index = index
+
+    @property
+    def value(self):
+        return self.obj.values[self.index]
+
+    @value.setter
+    def value(self, value):
+        self.obj.values[self.index] = value
+
+
+NIL = Element(InterpreterBase.NIL_DEF)
+
+
+# what @ evaluates to in interpreterv4
+def new_object():
+    return Object(ROOT_SHAPE, [NIL])
+
+
+LITERAL_TYPES = (InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF)
+
+# the nodes literal_values has a value for
+CONSTANT_TYPES = LITERAL_TYPES + (InterpreterBase.NIL_DEF,)
+
+
+# interpreterv4 runs on native values: an int, string or bool is the Python
+# int, str or bool itself, so operators don't allocate or unwrap anything.
+# nil is still NIL, and functions, lambdas and objects are still FuncDef
+# nodes and Elements.
+NATIVE_TYPES = {
+    int: InterpreterBase.INT_DEF,
+    str: InterpreterBase.STRING_DEF,
+    bool: InterpreterBase.BOOL_DEF,
+}
+
+
+# the Brewin type of a native value, as elem_type is for the rest
+def value_type(value):
+    native_type = NATIVE_TYPES.get(type(value))
+    if native_type is not None:
+        return native_type
+    return value.elem_type
+
+
+def is_function(value):
+    return type(value) not in NATIVE_TYPES and \
+        (value.elem_type == InterpreterBase.FUNC_DEF or value.elem_type == InterpreterBase.LAMBDA_DEF)
+
+
+# what Element.dict['val'] was for a value: only ints, strings and bools
+# have one, and asking nil, a function or an object still fails the same way
+def primitive_value(value):
+    if type(value) in NATIVE_TYPES:
+        return value
+    raise KeyError('val')
+
+
+# how print shows a value
+def output_text(value):
+    if type(value) is bool:
+        return str(value).lower()
+    return str(primitive_value(value))
+
+
+# the variables a new lambda closes over: functions, lambdas and objects
+# share the caller's Variable, anything else is copied into a new one.
+# names are the ones brewresolve.outer_names found the lambda can
+# reach, or None for every visible name other than its formals.
+def capture_variables(context, names, formal_args):
+    if names is None:
+        visible = context.flatten().items()
+    else:
+        visible = []
+        for name in names:
+            variable = context.lookup(name)
+            if variable is not None:
+                visible.append((name, variable))
+    free_vars = {}
+    for var_name, variable in visible:
+        if var_name in formal_args:
+            continue
+        value = variable.value
+        if is_function(value) or is_object(value):
+            free_vars[var_name] = variable
+        else:
+            free_vars[var_name] = Variable(value)
+    return free_vars
+
+
+# the Variable a new name gets when it's assigned a plain variable, source
+# (None for any other expression, or a function's own name). A function or
+# lambda used to be one Element both names shared, so the new name shares
+# source itself, and assigning either name later changes both; any other
+# value gets a Variable of its own.
+def assigned_variable(source, value):
+    if source is not None and is_function(value):
+        return source
+    return Variable(value)
+
+
+# preallocates the runtime value of every literal in the program, so
+# evaluating a literal is a dict lookup instead of a copy of the node
+def literal_constants(ast):
+    constants = {}
+    interned = {}
+    pending = [ast]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, tuple):
+            pending.extend(node)
+        elif isinstance(node, Node):
+            if node.elem_type in LITERAL_TYPES:
+                key = (node.elem_type, node.val)
+                if key not in interned:
+                    interned[key] = Element(node.elem_type, val=node.val)
+                constants[node] = interned[key]
+            elif node.elem_type == InterpreterBase.NIL_DEF:
+                constants[node] = NIL
+            else:
+                pending.extend(node.dict.values())
+    return constants
+
+
+# the same for interpreterv4's native values: the literal's own int, str or bool
+def literal_values(ast):
+    constants = {}
+    pending = [ast]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, tuple):
+            pending.extend(node)
+        elif isinstance(node, Node):
+            if node.elem_type in LITERAL_TYPES:
+                constants[node] = node.val
+            elif node.elem_type == InterpreterBase.NIL_DEF:
+                constants[node] = NIL
+            else:
+                pending.extend(node.dict.values())
+    return constants
+
+
+# (name, is_ref, is_local) for the formals of every function and lambda in
+# the program, so a call can bind its arguments without inspecting Arg
+# nodes; is_local is only ever true once brewresolve has run
+def formal_params(ast):
+    formals = {}
+    pending = [ast]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, tuple):
+            pending.extend(node)
+        elif isinstance(node, Node):
+            if node.elem_type == InterpreterBase.FUNC_DEF or node.elem_type == InterpreterBase.LAMBDA_DEF:
+                formals[node] = tuple(
+                    (arg.name, arg.elem_type == InterpreterBase.REFARG_DEF, getattr(arg, 'local', False))
+                    for arg in node.args
+                )
+            if node.elem_type not in LITERAL_TYPES:
+                pending.extend(node.dict.values())
+    return formals
+
+
+# A scope in the chain of frames an interpreter runs in. Blocks, loop
+# iterations and calls push a new frame linked to the current one, so
+# entering a scope is O(1) no matter how many variables are live. Lookups
+# walk outwards; new variables always go in the innermost frame.
+#
+# A call's frame also keeps its formals in slots, in declaration order, and
+# every block frame points at its call's frame, so a name that brewresolve
+# bound to a slot is read with context.frame.slots[slot].
+class Environment:
+    __slots__ = ("vars", "parent", "frame", "slots")
+
+    def __init__(self, parent=None, slots=None):
+        self.vars = {}
+        self.parent = parent
+        self.slots = slots
+        if slots is None and parent is not None:
+            self.frame = parent.frame
+        else:
+            self.frame = self
+
+    def lookup(self, name):
+        env = self
+        while env is not None:
+            variable = env.vars.get(name)
+            if variable is not None:
+                return variable
+            env = env.parent
+        return None
+
+    def __contains__(self, name):
+        return self.lookup(name) is not None
+
+    def __getitem__(self, name):
+        variable = self.lookup(name)
+        if variable is None:
+            raise KeyError(name)
+        return variable
+
+    def __setitem__(self, name, variable):
+        self.vars[name] = variable
+
+    # every visible name, with inner frames shadowing outer ones
+    def flatten(self):
+        frames = []
+        env = self
+        while env is not None:
+            frames.append(env.vars)
+            env = env.parent
+        visible = {}
+        for frame in reversed(frames):
+            visible.update(frame)
+        return visible
+
+    def __repr__(self):
+        return repr(self.flatten())
+
+
+# stands in for the frames a tail call dropped; see
+# Interpreter.tail_call_scope
+class TailScope(Environment):
+    __slots__ = ()
+
+
+# what `return f(...)` gives back when f can run in place of the current
+# call: the callee's body (its statements for the tree walker, what the
+# closure and python engines compiled them into) and the frame to run it
+# in. Whoever made the call runs it, and any tail call it returns, in a
+# loop (see Interpreter.run_body).
+class TailCall:
+    __slots__ = ("body", "context", "func_name")
+
+    def __init__(self, body, context, func_name):
+        self.body = body
+        self.context = context
+        self.func_name = func_name
@@ -0,0 +1,450 @@
+from intbase import InterpreterBase
+from intbase import ErrorType
+from element import Element
+from brewbytecode import *
+from brewobjects import PROTO
+from brewvalues import NIL, Environment, FieldRef, Variable, capture_variables
+from brewvalues import assigned_variable, is_function, is_object, new_object, output_text, primitive_value
+
+'''
+Stack virtual machine for the bytecode brewbytecode.Compiler produces.
+Select it with Interpreter(engine='vm').
+
+Operands and results go on one value stack shared by every frame. A call
+saves the caller's (code object, pc, environment) on a frame stack instead
+of recursing in Python, so Brewin recursion isn't bounded by Python's
+stack, only by memory and the interpreter's call_depth_limit (Brewin calls
+in progress); going past that raises a RecursionError, as running out of
+Python stack does in the other engines.
+A tail call (`return f(...)`) saves nothing: the callee's frame replaces
+the caller's and returns straight to the caller's caller, and its
+environment hangs off Interpreter.tail_call_scope, so tail recursion runs
+in constant space.
+
+Call arguments are pushed as the Variables the callee's frame is bound to:
+VALUE_ARG wraps a copy of the value, REF_ARG and REF_VAR share a cell.
+A formal brewresolve marked local is passed as the bare copy (COPY_VALUE)
+and kept as such in its slot, which LOAD_LOCAL and STORE_LOCAL use.
+For a call through a variable the formals aren't known until RESOLVE_CALL
+has pushed the target, so DYNAMIC_VAR_ARG and DYNAMIC_VALUE_ARG look at it
+to pick between the two. When every argument is a variable, CALL_NAME
+does all of that and the call itself in one instruction.
+
+execute() dispatches with one if/elif chain, ordered by how often each
+instruction runs in benchmarks/bench_engines.py, so keep the common ones
+near the top. The opcodes from FIRST_RARE_OPCODE on get a chain of their
+own behind a single test, so they don't slow down the rest. Instructions
+stay (opcode, argument) tuples rather than a flat array('i'): unpacking
+one tuple is cheaper than indexing the opcode and the argument out of an
+array, so the array was slower on every benchmark.
+
+A few instructions do the work of two: BINARY_OP_CONST, NAME_OP_CONST
+and LOCAL_OP_CONST apply an operator to a constant and the top of the
+stack, a name's value or a local, and RETURN_COPY copies the value it
+returns. A call used as an expression gives nil where the callee
+returned nothing; the compiler follows a call used as a statement with
+RETURN_IF_VALUE, which carries on when there's no value, so RETURN_NONE
+leaves the None for it instead.
+
+Like the closure engine, the VM reuses the tree walker's operators
+(Interpreter.binary_operators, ...) and error messages; trace_output only
+applies to the tree walker.
+'''
+
+CONDITION_TYPES = (bool, int)
+
+
+class VirtualMachine:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.codes = {}  # FuncDef node -> CodeObject
+        self.binary_operators = [interpreter.binary_operators[name] for name in BINARY_OPERATOR_NAMES]
+        self.unary_operators = [interpreter.unary_operators[name] for name in UNARY_OPERATOR_NAMES]
+
+    def compile_program(self, functions):
+        self.codes = Compiler(self.interpreter).compile_program(functions)
+
+    def run_main_func(self, func_node):
+        return self.execute(self.codes[func_node], Environment())
+
+    def error(self, error_type, description):
+        self.interpreter.error(error_type, description)
+
+    # the Variable a name or a.b refers to, following the proto chain for a.b,
+    # or what evaluate_var falls back to when there isn't one
+    def find_variable(self, context, operand, ref):
+        slot, path, var_name = operand
+        if slot is not None:
+            variable = context.frame.slots[slot]
+        else:
+            variable = context.lookup(path[0])
+        if len(path) == 1:
+            if variable is not None:
+                return variable if ref else variable.value
+        else:
+            member = path[1]
+            obj = variable.value if variable is not None else None
+            while is_object(obj):
+                index = obj.shape.index.get(member)
+                if index is not None:
+                    if ref:
+                        self.interpreter.copies.pin(obj)
+                        return FieldRef(obj, index)
+                    return obj.values[index]
+                obj = obj.values[PROTO]
+        return self.missing_variable(var_name, ref)
+
+    def missing_variable(self, var_name, ref):
+        overloads = self.interpreter.function_overloads.get(var_name, ())
+        if len(overloads) > 1:
+            self.error(ErrorType.NAME_ERROR, f"Ambigous function {var_name}")
+        if overloads:
+            return Variable(overloads[0]) if ref else overloads[0]
+        self.error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined")
+
+    def store_member(self, obj, path, value):
+        if not is_object(obj):
+            self.error(ErrorType.TYPE_ERROR, f"{path[0]} is not an object")
+        self.interpreter.copies.before_write(obj)
+        obj.set(path[1], value)
+
+    # why func_name can't be called with arity arguments, for RAISE_CALL_ERROR
+    def call_error(self, func_name, arity, target):
+        if target is None:
+            return (ErrorType.NAME_ERROR, f"No {func_name} function found that takes {arity} parameters")
+        if not is_function(target):
+            return (ErrorType.TYPE_ERROR, f"{func_name} is not a function")
+        return (ErrorType.TYPE_ERROR, f"{func_name} does not take {arity} parameters")
+
+    def target_formals(self, target):
+        if target.elem_type == InterpreterBase.LAMBDA_DEF:
+            return target.dict['formals']
+        return self.interpreter.formals[target]
+
+    def make_lambda(self, code_object, context):
+        node = code_object.node
+        free_vars = capture_variables(context, self.interpreter.outer_names[node], code_object.formal_names)
+        return Element(InterpreterBase.LAMBDA_DEF, args=node.args, statements=node.statements,
+                       formals=code_object.formals, free_vars=free_vars, code=code_object, node=node)
+
+    def execute(self, code_object, context):
+        interpreter = self.interpreter
+        error = self.error
+        binary_operators = self.binary_operators
+        unary_operators = self.unary_operators
+        codes = self.codes
+        max_depth = interpreter.call_depth_limit
+        copies = interpreter.copies
+        copy_value = copies.copy
+
+        stack = []
+        frames = []
+        code = code_object.code
+        consts = code_object.consts
+        names = code_object.names
+        pc = 0
+        tail_called = False  # whether the running call replaced its caller's frame
+        while True:
+            opcode, argument = code[pc]
+            pc += 1
+
+            if opcode == NAME_OP_CONST:
+                name, operator, constant = names[argument]
+                variable = context.lookup(name)
+                if variable is not None:
+                    value = variable.value
+                else:
+                    value = self.find_variable(context, (None, (name,), name), False)
+                stack.append(binary_operators[operator](value, constant))
+            elif opcode == WHILE_TRUE:
+                condition_value = stack.pop()
+                if type(condition_value) not in CONDITION_TYPES:
+                    error(ErrorType.TYPE_ERROR, f"Incompatible type for while condition")
+                if condition_value:
+                    pc = argument
+            elif opcode == IF_FALSE or opcode == WHILE_FALSE:
+                condition_value = stack.pop()
+                if type(condition_value) not in CONDITION_TYPES:
+                    kind = 'if' if opcode == IF_FALSE else 'while'
+                    error(ErrorType.TYPE_ERROR, f"Incompatible type for {kind} condition")
+                if not condition_value:
+                    pc = argument
+            elif opcode == BINARY_OP:
+                op2 = stack.pop()
+                stack[-1] = binary_operators[argument](stack[-1], op2)
+            elif opcode == COPY_VALUE:
+                stack[-1] = copy_value(stack[-1])
+            elif opcode == LOAD_LOCAL:
+                stack.append(context.frame.slots[argument])
+            elif opcode == LOAD_NAME:
+                variable = context.lookup(names[argument])
+                if variable is not None:
+                    stack.append(variable.value)
+                else:
+                    stack.append(self.find_variable(context, (None, (names[argument],), names[argument]), False))
+            elif opcode == STORE_NAME:
+                name = names[argument]
+                variable = context.lookup(name)
+                if variable is not None:
+                    variable.value = stack.pop()
+                else:
+                    context.vars[name] = Variable(stack.pop())
+            elif opcode == LOCAL_OP_CONST:
+                slot, operator, constant = names[argument]
+                stack.append(binary_operators[operator](context.frame.slots[slot], constant))
+            elif opcode == CALL_FUNCTION or opcode == CALL_VALUE or opcode == CALL_NAME:
+                if opcode == CALL_FUNCTION:
+                    target_code, arity, tail = names[argument]
+                    target = None
+                    free_vars = None
+                else:
+                    if opcode == CALL_VALUE:
+                        arity, tail = names[argument]
+                        target = stack[-1 - arity]
+                    else:
+                        func_name, arity, error_pc, operands, tail = names[argument]
+                        variable = context.lookup(func_name)
+                        target = variable.value if variable is not None else None
+                        if target is None or not is_function(target) or arity != len(target.dict['args']):
+                            stack.append(self.call_error(func_name, arity, target))
+                            pc = error_pc
+                            continue
+                    if target.elem_type == InterpreterBase.LAMBDA_DEF:
+                        target_code = target.dict['code']
+                        free_vars = target.dict['free_vars']
+                    else:
+                        target_code = codes[target]
+                        free_vars = None
+                    if opcode == CALL_NAME:
+                        # the arguments, as DYNAMIC_VAR_ARG pushes each of them
+                        for (_, reference, local), operand in zip(target_code.formals, operands):
+                            if reference:
+                                stack.append(self.find_variable(context, operand, True))
+                                continue
+                            slot, path, _ = operand
+                            variable = None
+                            if len(path) == 1:
+                                if slot is not None:
+                                    variable = context.frame.slots[slot]
+                                else:
+                                    variable = context.lookup(path[0])
+                            if variable is not None:
+                                value = copy_value(variable.value)
+                            else:
+                                value = copy_value(self.find_variable(context, operand, False))
+                            stack.append(value if local else Variable(value))
+                if tail:
+                    parent = interpreter.tail_call_scope(target_code.node if target is None else target, context)
+                else:
+                    parent = context
+                func_context = Environment(parent, [])
+                if arity:
+                    for (name, _, local), variable in zip(target_code.formals, stack[-arity:]):
+                        # a local formal is passed as its value (see brewresolve.py)
+                        if not local:
+                            func_context.vars[name] = variable
+                        func_context.slots.append(variable)
+                    del stack[-arity:]
+                if opcode == CALL_VALUE:
+                    stack.pop()
+                if free_vars is not None:
+                    func_context.vars.update(free_vars)
+                if tail:
+                    # the callee returns straight to this call's caller
+                    tail_called = True
+                else:
+                    if len(frames) >= max_depth:
+                        raise RecursionError("maximum recursion depth exceeded in Brewin call")
+                    frames.append((code_object, pc, context, tail_called))
+                    tail_called = False
+                code_object = target_code
+                code = code_object.code
+                consts = code_object.consts
+                names = code_object.names
+                pc = 0
+                context = func_context
+            elif opcode == PUSH_SCOPE:
+                context = Environment(context)
+            elif opcode == POP_SCOPE:
+                context = context.parent
+            elif opcode == RETURN_COPY or opcode == RETURN or opcode == RETURN_NONE or opcode == RETURN_IF_VALUE:
+                if opcode == RETURN_COPY:
+                    value = copy_value(stack.pop())
+                elif opcode == RETURN_NONE:
+                    value = None
+                else:
+                    value = stack.pop()
+                if value is None and opcode == RETURN_IF_VALUE:
+                    continue
+                if not frames:
+                    return value
+                if value is None and tail_called:
+                    value = NIL  # what `return f(...)` makes of no value
+                code_object, pc, context, tail_called = frames.pop()
+                code = code_object.code
+                consts = code_object.consts
+                names = code_object.names
+                if value is None and code[pc][0] != RETURN_IF_VALUE:
+                    value = NIL  # the call is an expression, not a statement
+                stack.append(value)
+            elif opcode >= FIRST_RARE_OPCODE:
+                if opcode == RESOLVE_CALL:
+                    func_name, arity, error_pc = names[argument]
+                    variable = context.lookup(func_name)
+                    target = variable.value if variable is not None else None
+                    if target is None or not is_function(target) or arity != len(target.dict['args']):
+                        stack.append(self.call_error(func_name, arity, target))
+                        pc = error_pc
+                    else:
+                        stack.append(target)
+                elif opcode == DYNAMIC_VAR_ARG:
+                    index, operand = names[argument]
+                    _, reference, local = self.target_formals(stack[-1 - index])[index]
+                    if reference:
+                        stack.append(self.find_variable(context, operand, True))
+                    elif local:
+                        stack.append(copy_value(self.find_variable(context, operand, False)))
+                    else:
+                        stack.append(Variable(copy_value(self.find_variable(context, operand, False))))
+                elif opcode == LOAD_OBJECT_VAR:
+                    slot, name, full_name = names[argument]
+                    if slot is not None:
+                        variable = context.frame.slots[slot]
+                    else:
+                        variable = context.lookup(name)
+                    if variable is None:
+                        error(ErrorType.NAME_ERROR, f"Unknown object {full_name}")
+                    stack.append(variable)
+                elif opcode == STORE_VARIABLE:
+                    name, slot, source_name = names[argument]
+                    variable = context.lookup(name)
+                    if variable is not None:
+                        variable.value = stack.pop()
+                    else:
+                        # never a local formal (see brewresolve.py)
+                        if slot is not None:
+                            source = context.frame.slots[slot]
+                        else:
+                            source = context.lookup(source_name)
+                        context.vars[name] = assigned_variable(source, stack.pop())
+                elif opcode == STORE_MEMBER:
+                    value = stack.pop()
+                    obj = stack.pop().value
+                    if not is_object(obj):
+                        self.store_member(obj, names[argument], value)  # reports the error
+                    copies.before_write(obj)
+                    obj.set(names[argument][1], value)
+                elif opcode == LOAD_VAR:
+                    operand = names[argument]
+                    slot, path, _ = operand
+                    variable = context.frame.slots[slot] if slot is not None else context.lookup(path[0])
+                    value = None
+                    if variable is not None:
+                        if len(path) == 1:
+                            value = variable.value
+                        else:
+                            obj = variable.value
+                            while is_object(obj):
+                                index = obj.shape.index.get(path[1])
+                                if index is not None:
+                                    value = obj.values[index]
+                                    break
+                                obj = obj.values[PROTO]
+                    if value is None:
+                        value = self.find_variable(context, operand, False)  # reports the error
+                    stack.append(value)
+                elif opcode == MAKE_LAMBDA:
+                    stack.append(self.make_lambda(consts[argument], context))
+                elif opcode == REF_VAR:
+                    stack.append(self.find_variable(context, names[argument], True))
+                elif opcode == UNARY_OP:
+                    stack[-1] = unary_operators[argument](stack[-1])
+                elif opcode == LOAD_MEMBER:
+                    member, var_name, ref = names[argument]
+                    obj = stack[-1]
+                    while is_object(obj):
+                        index = obj.shape.index.get(member)
+                        if index is not None:
+                            if ref:
+                                copies.pin(obj)
+                                stack[-1] = FieldRef(obj, index)
+                            else:
+                                stack[-1] = obj.values[index]
+                            break
+                        obj = obj.values[PROTO]
+                    else:
+                        stack[-1] = self.missing_variable(var_name, ref)
+                elif opcode == STORE_LOCAL_MEMBER:
+                    slot, path = names[argument]
+                    self.store_member(context.frame.slots[slot], path, stack.pop())
+                elif opcode == DYNAMIC_VALUE_ARG:
+                    _, reference, local = self.target_formals(stack[-2 - argument])[argument]
+                    if reference:
+                        stack[-1] = Variable(stack[-1])
+                    elif local:
+                        stack[-1] = copy_value(stack[-1])
+                    else:
+                        stack[-1] = Variable(copy_value(stack[-1]))
+                elif opcode == LOGICAL_OPERAND:
+                    stack[-1] = interpreter.logical_operand(BINARY_OPERATOR_NAMES[argument], stack[-1])
+                elif opcode == JUMP_IF_FALSE_OR_POP:
+                    if stack[-1]:
+                        stack.pop()
+                    else:
+                        pc = argument
+                elif opcode == JUMP_IF_TRUE_OR_POP:
+                    if stack[-1]:
+                        pc = argument
+                    else:
+                        stack.pop()
+                elif opcode == NEW_OBJECT:
+                    stack.append(new_object())
+                elif opcode == TO_OUTPUT:
+                    value = stack[-1]
+                    if value is None:
+                        error(ErrorType.NAME_ERROR, f"Missing some var")
+                    stack[-1] = output_text(value)
+                elif opcode == PRINT:
+                    string_to_output = ''
+                    if argument:
+                        string_to_output = ''.join(stack[-argument:])
+                        del stack[-argument:]
+                    interpreter.output(string_to_output)
+                    stack.append(None)
+                elif opcode == INPUTI or opcode == INPUTS:
+                    if argument:
+                        interpreter.output(primitive_value(stack.pop()))
+                    if opcode == INPUTI:
+                        stack.append(int(interpreter.get_input()))
+                    else:
+                        stack.append(str(interpreter.get_input()))
+                elif opcode == POP:
+                    stack.pop()
+                elif opcode == RAISE:
+                    error(*names[argument])
+                elif opcode == RAISE_CALL_ERROR:
+                    error(*stack.pop())
+                else:
+                    raise ValueError(f"Unknown opcode {opcode}")
+            elif opcode == JUMP:
+                pc = argument
+            elif opcode == BINARY_OP_CONST:
+                operator, constant = names[argument]
+                stack[-1] = binary_operators[operator](stack[-1], constant)
+            elif opcode == LOAD_CONST:
+                stack.append(consts[argument])
+            elif opcode == LOAD_SLOT:
+                stack.append(context.frame.slots[argument].value)
+            elif opcode == STORE_SLOT:
+                context.frame.slots[argument].value = stack.pop()
+            elif opcode == STORE_LOCAL:
+                context.frame.slots[argument] = stack.pop()
+            elif opcode == VALUE_ARG:
+                stack[-1] = Variable(copy_value(stack[-1]))
+            elif opcode == REF_ARG:
+                stack[-1] = Variable(stack[-1])
+            elif opcode == NONE_TO_NIL:
+                if stack[-1] is None:
+                    stack[-1] = NIL
+            else:
+                raise ValueError(f"Unknown opcode {opcode}")
@@ -1,9 +1,8 @@
-class Element:
-    def __init__(self, elem_type, **kwargs):
-        self.elem_type = elem_type
-        self.dict = {}
-        for key, value in kwargs.items():
-            self.dict[key] = value
+from collections.abc import Mapping
+
+
+class BaseElement:
+    __slots__ = ()
 
     def get(self, key):
         if key not in self.dict:
@@ -17,9 +16,9 @@ class Element:
         return s[0:-2]
 
     def __val(self, v):
-        if isinstance(v, Element):
+        if isinstance(v, BaseElement):
             return "[" + str(v) + "]"
-        if isinstance(v, list):
+        if isinstance(v, (list, tuple)):
             s = ""
             for i in v:
                 s += str(i) + ", "
@@ -27,3 +26,152 @@ class Element:
                 return "[" + s[0:-2] + "]"
             return "[" + s + "]"
         return str(v)
+
+
+class Element(BaseElement):
+    __slots__ = ("elem_type", "dict")
+
+    def __init__(self, elem_type, **kwargs):
+        self.elem_type = elem_type
+        self.dict = {}
+        for key, value in kwargs.items():
+            self.dict[key] = value
+
+
+'''
+AST nodes
+
+The parser builds one class per kind of node, each storing its fields in
+__slots__ instead of a per-node dict. Interpreters can read fields as
+attributes (node.op1), while node.dict and node.get() still give the old
+Element view of the same fields.
+
+Nodes are immutable once built (lists of children are stored as tuples), so
+one tree can be shared between interpreters, threads and the parse cache.
+Copying a node returns the node itself. Runtime values live apart from the
+tree; see brewvalues.py.
+'''
+
+
+class Node(BaseElement):
+    __slots__ = ("elem_type",)
+    fields = ()
+
+    def __init__(self, elem_type, **kwargs):
+        object.__setattr__(self, "elem_type", elem_type)
+        for key, value in kwargs.items():
+            if type(value) is list:
+                value = tuple(value)
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise TypeError(f"{self.elem_type} nodes are immutable")
+
+    def __delattr__(self, key):
+        raise TypeError(f"{self.elem_type} nodes are immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        values = {key: getattr(self, key) for key in self.fields if hasattr(self, key)}
+        return (make_node, (type(self), self.elem_type, values))
+
+    @property
+    def dict(self):
+        return NodeFields(self)
+
+    def get(self, key):
+        return getattr(self, key, None) if key in self.fields else None
+
+
+def make_node(cls, elem_type, values):
+    return cls(elem_type, **values)
+
+
+class NodeFields(Mapping):
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    def __getitem__(self, key):
+        node = self.node
+        if key in node.fields:
+            try:
+                return getattr(node, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        node = self.node
+        for key in node.fields:
+            if hasattr(node, key):
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class Program(Node):
+    __slots__ = fields = ("functions",)
+
+
+class FuncDef(Node):
+    __slots__ = fields = ("name", "args", "statements")
+
+
+class LambdaDef(Node):
+    __slots__ = fields = ("args", "statements")
+
+
+class Arg(Node):  # arg and refarg; local is set by brewresolve
+    __slots__ = fields = ("name", "local")
+
+
+class Assign(Node):  # slot, path and local are set by brewresolve
+    __slots__ = fields = ("name", "expression", "slot", "path", "local")
+
+
+class If(Node):
+    __slots__ = fields = ("condition", "statements", "else_statements")
+
+
+class While(Node):
+    __slots__ = fields = ("condition", "statements")
+
+
+class Return(Node):
+    __slots__ = fields = ("expression",)
+
+
+class UnaryOp(Node):  # neg and !
+    __slots__ = fields = ("op1",)
+
+
+class BinaryOp(Node):
+    __slots__ = fields = ("op1", "op2")
+
+
+class Literal(Node):  # int, string and bool
+    __slots__ = fields = ("val",)
+
+
+class Leaf(Node):  # nil and @
+    __slots__ = fields = ()
+
+
+class Var(Node):  # slot, path and local are set by brewresolve
+    __slots__ = fields = ("name", "slot", "path", "local")
+
+
+class FuncCall(Node):
+    __slots__ = fields = ("name", "args")
+
+
+class MethodCall(Node):
+    __slots__ = fields = ("objref", "name", "args")
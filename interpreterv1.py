@@ -2,6 +2,7 @@ from intbase import InterpreterBase
 from intbase import ErrorType
 from element import Element
 from brewparse import parse_program
+from brewvalues import literal_constants
 import copy
 
 class Interpreter(InterpreterBase):
@@ -13,6 +14,7 @@ class Interpreter(InterpreterBase):
     def run(self, program):
         ast = parse_program(program)
         self.variables_values = {}
+        self.constants = literal_constants(ast)
         main_func_node = self.get_main_func_node(ast)
         if self.trace_output:
             print(main_func_node)
@@ -54,7 +56,7 @@ class Interpreter(InterpreterBase):
     
     def evaluate_exp_var_or_val(self, node):
         if node.elem_type == InterpreterBase.INT_DEF or node.elem_type == InterpreterBase.STRING_DEF:
-            return copy.deepcopy(node)
+            return self.constants[node]
         elif node.elem_type == InterpreterBase.VAR_DEF:
             return self.evaluate_var(node)
         else:
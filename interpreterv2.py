@@ -2,6 +2,7 @@ from intbase import InterpreterBase
 from intbase import ErrorType
 from element import Element
 from brewparse import parse_program
+from brewvalues import NIL, Variable, literal_constants
 import copy
 
 class Interpreter(InterpreterBase):
@@ -13,6 +14,13 @@ class Interpreter(InterpreterBase):
     def run(self, program):
         ast = parse_program(program)
         self.functions = ast.dict['functions']
+        # (name, arity) -> the first matching function, and name -> all of its overloads
+        self.function_index = {}
+        self.function_overloads = {}
+        for func_node in self.functions:
+            self.function_index.setdefault((func_node.dict['name'], len(func_node.dict['args'])), func_node)
+            self.function_overloads.setdefault(func_node.dict['name'], []).append(func_node)
+        self.constants = literal_constants(ast)
         main_func_node = self.get_main_func_node(ast)
         if self.trace_output:
             print(main_func_node)
@@ -45,11 +53,9 @@ class Interpreter(InterpreterBase):
             key = statement_node.dict['name']
             right_node = statement_node.dict['expression']
             if key in context:
-                value = self.evaluate_exp_var_or_val(right_node, context)
-                context[key].elem_type = value.elem_type
-                context[key].dict['val'] = value.dict['val']
+                context[key].value = self.evaluate_exp_var_or_val(right_node, context)
             else:
-                context[key] = self.evaluate_exp_var_or_val(right_node, context)
+                context[key] = Variable(self.evaluate_exp_var_or_val(right_node, context))
             return None
         elif statement_node.elem_type == InterpreterBase.IF_DEF:
             condition_value = self.evaluate_exp_var_or_val(statement_node.dict['condition'], context)
@@ -98,7 +104,7 @@ class Interpreter(InterpreterBase):
             return None
         elif statement_node.elem_type == InterpreterBase.RETURN_DEF:
             if statement_node.dict['expression'] is None:
-                return Element(InterpreterBase.NIL_DEF)
+                return NIL
             return self.evaluate_exp_var_or_val(statement_node.dict['expression'], context)
         elif statement_node.elem_type == InterpreterBase.FCALL_DEF:
             func_name = statement_node.dict['name']
@@ -108,9 +114,9 @@ class Interpreter(InterpreterBase):
     
     def evaluate_exp_var_or_val(self, node, context):
         if node.elem_type == InterpreterBase.INT_DEF or node.elem_type == InterpreterBase.STRING_DEF:
-            return copy.deepcopy(node)
+            return self.constants[node]
         elif node.elem_type == InterpreterBase.BOOL_DEF or node.elem_type == InterpreterBase.NIL_DEF:
-            return copy.deepcopy(node)
+            return self.constants[node]
         elif node.elem_type == InterpreterBase.VAR_DEF:
             return self.evaluate_var(node, context)
         else:
@@ -119,7 +125,7 @@ class Interpreter(InterpreterBase):
     def evaluate_var(self, var_node, context):
         var_name = var_node.get('name')
         if var_name in context:
-            return copy.deepcopy(context[var_name])
+            return context[var_name].value
         else:
             super().error(
                 ErrorType.NAME_ERROR,
@@ -186,7 +192,7 @@ class Interpreter(InterpreterBase):
             args = expression_node.dict['args']
             run_result = self.run_func(func_name, args, context)
             if run_result is None:
-                return Element(InterpreterBase.NIL_DEF)
+                return NIL
             else:
                 return run_result
         else:
@@ -342,29 +348,29 @@ class Interpreter(InterpreterBase):
             return self.handle_inputs(args, context)
         
         arg_values = self.evaluate_arg_values(args, context)
-        for func_node in self.functions:
-            if func_node.dict['name'] == func_name and len(arg_values) == len(func_node.dict['args']):
-                func_context = copy.copy(context)
-                for index in range(len(func_node.dict['args'])):
-                    arg_node = func_node.dict['args'][index]
-                    func_context[arg_node.dict['name']] = arg_values[index]
-                statements = func_node.dict['statements']
-                for statement in statements:
-                    run_result = self.run_statement(statement, func_context)
-                    if self.trace_output:
-                        print(func_context)
-                        print("{")
-                        for key in func_context:
-                            print(key + ":" + str(func_context[key].dict['val']))
-                        print("}")
-                        print("{")
-                        for key in context:
-                            print(key + ":" + str(context[key].dict['val']))
-                        print("}")
-                        print(">>")
-                    if run_result is not None:
-                        return run_result
-                return None
+        func_node = self.function_index.get((func_name, len(arg_values)))
+        if func_node is not None:
+            func_context = copy.copy(context)
+            for index in range(len(func_node.dict['args'])):
+                arg_node = func_node.dict['args'][index]
+                func_context[arg_node.dict['name']] = Variable(arg_values[index])
+            statements = func_node.dict['statements']
+            for statement in statements:
+                run_result = self.run_statement(statement, func_context)
+                if self.trace_output:
+                    print(func_context)
+                    print("{")
+                    for key in func_context:
+                        print(key + ":" + str(func_context[key].value.dict['val']))
+                    print("}")
+                    print("{")
+                    for key in context:
+                        print(key + ":" + str(context[key].value.dict['val']))
+                    print("}")
+                    print(">>")
+                if run_result is not None:
+                    return run_result
+            return None
         
         super().error(
             ErrorType.NAME_ERROR,
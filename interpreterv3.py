@@ -2,6 +2,7 @@ from intbase import InterpreterBase
 from intbase import ErrorType
 from element import Element
 from brewparse import parse_program
+from brewvalues import NIL, Environment, Variable, assigned_variable, formal_params, literal_constants
 import copy
 
 class Interpreter(InterpreterBase):
@@ -13,6 +14,14 @@ class Interpreter(InterpreterBase):
     def run(self, program):
         ast = parse_program(program)
         self.functions = ast.dict['functions']
+        # (name, arity) -> the first matching function, and name -> all of its overloads
+        self.function_index = {}
+        self.function_overloads = {}
+        for func_node in self.functions:
+            self.function_index.setdefault((func_node.dict['name'], len(func_node.dict['args'])), func_node)
+            self.function_overloads.setdefault(func_node.dict['name'], []).append(func_node)
+        self.constants = literal_constants(ast)
+        self.formals = formal_params(ast)
         main_func_node = self.get_main_func_node(ast)
         if self.trace_output:
             print(main_func_node)
@@ -34,10 +43,11 @@ class Interpreter(InterpreterBase):
     def run_main_func(self, func_node):
         if func_node.elem_type == InterpreterBase.FUNC_DEF:
             statements = func_node.dict['statements']
-            context = {}
+            context = Environment()
             for statement in statements:
-                print(context)
-                print('main')
+                if self.trace_output:
+                    print(context)
+                    print('main')
                 run_result = self.run_statement(statement, context)
                 if run_result is not None:
                     return run_result
@@ -46,16 +56,18 @@ class Interpreter(InterpreterBase):
         if statement_node.elem_type == '=':
             key = statement_node.dict['name']
             right_node = statement_node.dict['expression']
-            if key in context:
+            variable = context.lookup(key)
+            if variable is not None:
                 value = self.evaluate_exp_var_or_val(right_node, context)
-                print(value)
-                context[key].elem_type = value.elem_type
-                if context[key].elem_type == InterpreterBase.FUNC_DEF:
-                    context[key].dict = value.dict
-                else:
-                    context[key].dict['val'] = value.dict['val']
+                if self.trace_output:
+                    print(value)
+                variable.value = value
             else:
-                context[key] = self.evaluate_exp_var_or_val(right_node, context)
+                value = self.evaluate_exp_var_or_val(right_node, context)
+                source = None
+                if right_node.elem_type == InterpreterBase.VAR_DEF:
+                    source = context.lookup(right_node.dict['name'])
+                context[key] = assigned_variable(source, value)
             return None
         elif statement_node.elem_type == InterpreterBase.IF_DEF:
             condition_value = self.evaluate_exp_var_or_val(statement_node.dict['condition'], context)
@@ -65,7 +77,7 @@ class Interpreter(InterpreterBase):
                     f"Incompatible type for if condition",
                 )
             condition = bool(condition_value.dict['val'])
-            if_context = copy.copy(context)
+            if_context = Environment(context)
             if condition:
                 for if_statement_node in statement_node.dict['statements']:
                     run_result = self.run_statement(if_statement_node, if_context)
@@ -88,7 +100,7 @@ class Interpreter(InterpreterBase):
                 )
             condition = bool(condition_value.dict['val'])
             while condition:
-                while_context = copy.copy(context)
+                while_context = Environment(context)
                 for while_statement_node in statement_node.dict['statements']:
                     run_result = self.run_statement(while_statement_node, while_context)
                     if run_result is not None:
@@ -104,7 +116,7 @@ class Interpreter(InterpreterBase):
             return None
         elif statement_node.elem_type == InterpreterBase.RETURN_DEF:
             if statement_node.dict['expression'] is None:
-                return Element(InterpreterBase.NIL_DEF)
+                return NIL
             return copy.deepcopy(self.evaluate_exp_var_or_val(statement_node.dict['expression'], context))
         elif statement_node.elem_type == InterpreterBase.FCALL_DEF:
             func_name = statement_node.dict['name']
@@ -114,9 +126,9 @@ class Interpreter(InterpreterBase):
     
     def evaluate_exp_var_or_val(self, node, context, ref=False):
         if node.elem_type == InterpreterBase.INT_DEF or node.elem_type == InterpreterBase.STRING_DEF:
-            return copy.deepcopy(node)
+            return self.constants[node]
         elif node.elem_type == InterpreterBase.BOOL_DEF or node.elem_type == InterpreterBase.NIL_DEF:
-            return copy.deepcopy(node)
+            return self.constants[node]
         elif node.elem_type == InterpreterBase.VAR_DEF:
             return self.evaluate_var(node, context, ref)
         elif node.elem_type == InterpreterBase.LAMBDA_DEF:
@@ -128,35 +140,37 @@ class Interpreter(InterpreterBase):
         formal_args = []
         for arg in node.dict['args']:
             formal_args.append(arg.dict['name'])
-        free_vars = copy.deepcopy(context)
-        for var_name in free_vars:
+        # functions and lambdas are captured by reference, everything else by value
+        free_vars = {}
+        for var_name, variable in context.flatten().items():
             if var_name in formal_args:
-                free_vars[var_name] = None
-            elif free_vars[var_name].elem_type == InterpreterBase.FUNC_DEF:
-                free_vars[var_name] = context[var_name]
-            elif free_vars[var_name].elem_type == InterpreterBase.LAMBDA_DEF:
-                free_vars[var_name] = context[var_name]
-        lambda_node = copy.deepcopy(node)
-        lambda_node.dict['free_vars'] = free_vars
-        return lambda_node
+                continue
+            value = variable.value
+            if value.elem_type == InterpreterBase.FUNC_DEF or value.elem_type == InterpreterBase.LAMBDA_DEF:
+                free_vars[var_name] = variable
+            else:
+                free_vars[var_name] = Variable(value)
+        return Element(InterpreterBase.LAMBDA_DEF, args=node.dict['args'], statements=node.dict['statements'],
+                       formals=self.formals[node], free_vars=free_vars)
     
     def evaluate_var(self, var_node, context, ref=False):
         var_name = var_node.get('name')
-        if var_name in context:
-            if ref or context[var_name].elem_type == InterpreterBase.FUNC_DEF or context[var_name].elem_type == InterpreterBase.LAMBDA_DEF:
-               return context[var_name]
-            return copy.deepcopy(context[var_name])
-        function_var = None
-        for func_node in self.functions:
-            if func_node.dict['name'] == var_name:
-                if function_var is None:
-                    function_var = func_node
-                else:
-                    super().error(
-                        ErrorType.NAME_ERROR,
-                        f"Ambigous function {var_name}",
-                    )
+        # with ref=True the caller gets the Variable itself, so assignments through it are shared
+        variable = context.lookup(var_name)
+        if variable is not None:
+            if ref:
+               return variable
+            return variable.value
+        overloads = self.function_overloads.get(var_name, ())
+        if len(overloads) > 1:
+            super().error(
+                ErrorType.NAME_ERROR,
+                f"Ambigous function {var_name}",
+            )
+        function_var = overloads[0] if overloads else None
         if function_var is not None:
+            if ref:
+                return Variable(function_var)
             return function_var
         super().error(
             ErrorType.NAME_ERROR,
@@ -223,7 +237,7 @@ class Interpreter(InterpreterBase):
             args = expression_node.dict['args']
             run_result = self.run_func(func_name, args, context)
             if run_result is None:
-                return Element(InterpreterBase.NIL_DEF)
+                return NIL
             else:
                 return run_result
         else:
@@ -386,20 +400,26 @@ class Interpreter(InterpreterBase):
             )
         return Element(InterpreterBase.BOOL_DEF, val=(not bool(op1.dict['val'])))
     
-    def evaluate_arg_values(self, args, context, formal_params=None):
+    # only used on the error paths, so arguments are still evaluated before a bad call is reported
+    def evaluate_arg_values(self, args, context):
         arg_value_list = []
-        for index in range(len(args)):
-            if formal_params is not None:
-                reference = formal_params[index].elem_type == InterpreterBase.REFARG_DEF
-                value = self.evaluate_exp_var_or_val(args[index], context, reference)
-                if reference:
-                    arg_value_list.append(value)
-                else:
-                    arg_value_list.append(copy.deepcopy(value))
-            else:
-                arg_value_list.append(copy.deepcopy(self.evaluate_exp_var_or_val(args[index], context)))
+        for arg in args:
+            arg_value_list.append(self.evaluate_exp_var_or_val(arg, context))
         return arg_value_list
-    
+
+    # evaluates each actual exactly once and binds it straight into the callee's frame:
+    # ref formals share the caller's Variable, the rest get a deep copy of the value
+    def bind_args(self, formals, args, context, func_context):
+        for index in range(len(formals)):
+            name, reference, _ = formals[index]
+            if reference:
+                value = self.evaluate_exp_var_or_val(args[index], context, True)
+                if not isinstance(value, Variable):
+                    value = Variable(value)
+                func_context[name] = value
+            else:
+                func_context[name] = Variable(copy.deepcopy(self.evaluate_exp_var_or_val(args[index], context)))
+
     def run_func(self, func_name, args, context):
         if func_name == 'inputi':
             return self.handle_inputi(args, context)
@@ -408,39 +428,35 @@ class Interpreter(InterpreterBase):
         elif func_name == 'inputs':
             return self.handle_inputs(args, context)
         
-        arg_values = self.evaluate_arg_values(args, context)
-        for func_node in self.functions:
-            if func_node.dict['name'] == func_name and len(arg_values) == len(func_node.dict['args']):
-                func_context = copy.copy(context)
-                arg_values = self.evaluate_arg_values(args, context, func_node.dict['args'])
-                for index in range(len(func_node.dict['args'])):
-                    arg_node = func_node.dict['args'][index]
-                    func_context[arg_node.dict['name']] = arg_values[index]
-                statements = func_node.dict['statements']
-                for statement in statements:
+        func_node = self.function_index.get((func_name, len(args)))
+        if func_node is not None:
+            func_context = Environment(context)
+            self.bind_args(self.formals[func_node], args, context, func_context)
+            statements = func_node.dict['statements']
+            for statement in statements:
+                if self.trace_output:
                     print(context)
                     print(func_name)
-                    run_result = self.run_statement(statement, func_context)
-                    if run_result is not None:
-                        return run_result
-                return None
+                run_result = self.run_statement(statement, func_context)
+                if run_result is not None:
+                    return run_result
+            return None
         if func_name in context:
-            if context[func_name].elem_type != InterpreterBase.FUNC_DEF and context[func_name].elem_type != InterpreterBase.LAMBDA_DEF:
+            func_node = context[func_name].value
+            if func_node.elem_type != InterpreterBase.FUNC_DEF and func_node.elem_type != InterpreterBase.LAMBDA_DEF:
+                self.evaluate_arg_values(args, context)
                 super().error(
                     ErrorType.TYPE_ERROR,
                     f"{func_name} is not a function",
                 )
-            func_node = context[func_name]
-            if len(arg_values) == len(func_node.dict['args']):
-                func_context = copy.copy(context)
-                arg_values = self.evaluate_arg_values(args, context, func_node.dict['args'])
-                for index in range(len(func_node.dict['args'])):
-                    arg_node = func_node.dict['args'][index]
-                    func_context[arg_node.dict['name']] = arg_values[index]
-                if context[func_name].elem_type == InterpreterBase.LAMBDA_DEF:
+            if len(args) == len(func_node.dict['args']):
+                func_context = Environment(context)
+                if func_node.elem_type == InterpreterBase.LAMBDA_DEF:
+                    self.bind_args(func_node.dict['formals'], args, context, func_context)
                     for key in func_node.dict['free_vars']:
-                        if func_node.dict['free_vars'][key] is not None:
-                            func_context[key] = func_node.dict['free_vars'][key]
+                        func_context[key] = func_node.dict['free_vars'][key]
+                else:
+                    self.bind_args(self.formals[func_node], args, context, func_context)
                 statements = func_node.dict['statements']
                 for statement in statements:
                     run_result = self.run_statement(statement, func_context)
@@ -448,13 +464,15 @@ class Interpreter(InterpreterBase):
                         return run_result
                 return None
             else:
+                self.evaluate_arg_values(args, context)
                 super().error(
                     ErrorType.TYPE_ERROR,
-                    f"{func_name} does not take {len(arg_values)} parameters",
+                    f"{func_name} does not take {len(args)} parameters",
                 )
+        self.evaluate_arg_values(args, context)
         super().error(
             ErrorType.NAME_ERROR,
-            f"No {func_name} function found that takes {len(arg_values)} parameters",
+            f"No {func_name} function found that takes {len(args)} parameters",
         )
 
     def handle_inputi(self, args, context):
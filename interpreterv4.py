@@ -1,14 +1,23 @@
 from intbase import InterpreterBase
 from intbase import ErrorType
 from element import Element
+from brewclosures import ClosureCompiler
+from brewcopy import CopyOnWrite
+from brewkernels import kernel_operator
+from brewoperators import BINARY_OPERATORS, SHORT_CIRCUIT_OPERATORS, UNARY_OPERATORS
 from brewparse import parse_program
-import copy
+from brewresolve import BUILTINS, outer_names, resolve
+from brewtranspile import Transpiler
+from brewvm import VirtualMachine
+from brewobjects import PROTO
+from brewvalues import NIL, Environment, FieldRef, TailCall, TailScope, Variable, capture_variables
+from brewvalues import assigned_variable, formal_params, literal_values
+from brewvalues import is_function, is_object, new_object, output_text, primitive_value, value_type
 
 '''
-An Object is an Element
-where type is 'obj'
-and dict contains
-    proto: another object or None
+An Object is a brewobjects.Object
+whose fields are
+    proto: another object or nil
     [any]: another object or value or func or lambda
 
 context
@@ -16,19 +25,51 @@ context
 - if object, direct reference not copy
 - this - points to encapsulating object, need to manage when this is switched
 '''
+
+# int and bool values are the ones arithmetic, && and || (and if/while conditions) accept
+ARITHMETIC_TYPES = (int, bool)
+
+
 class Interpreter(InterpreterBase):
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    # engine is 'tree' (walk the AST, below), 'closure' (compile it first, see brewclosures.py),
+    # 'vm' (compile it to bytecode and run that, see brewbytecode.py and brewvm.py)
+    # or 'python' (translate it to Python source and compile that, see brewtranspile.py).
+    # The vm engine keeps Brewin calls off the Python stack, so it can recurse
+    # call_depth_limit calls deep; the others are limited by Python's recursion limit.
+    # Every engine runs `return f(...)` in place of the current call, so tail
+    # recursion doesn't count against either limit.
+    # With short_circuit, && and || skip op2 when op1 already decides the result
+    # (every engine); otherwise both operands are evaluated, as Brewin specifies.
+    def __init__(self, console_output=True, inp=None, trace_output=False, engine='tree',
+                 call_depth_limit=100000, short_circuit=False):
+        if engine not in ('tree', 'closure', 'vm', 'python'):
+            raise ValueError(f"Unknown engine {engine}")
         self.trace_output = trace_output
+        self.engine = engine
+        self.call_depth_limit = call_depth_limit
+        self.short_circuit = short_circuit
         super().__init__(console_output, inp)   # call InterpreterBase's constructor
+        self.build_dispatch_tables()
 
     # Students must implement this in their derived class
     def run(self, program):
-        ast = parse_program(program)
-        self.functions = ast.dict['functions']
+        ast = self.prepare(program)
         main_func_node = self.get_main_func_node(ast)
         if self.trace_output:
             print(main_func_node)
-        if main_func_node is not None:
+        if main_func_node is not None and self.engine == 'closure':
+            compiler = ClosureCompiler(self)
+            compiler.compile_program(self.functions)
+            compiler.run_main_func(main_func_node)
+        elif main_func_node is not None and self.engine == 'vm':
+            vm = VirtualMachine(self)
+            vm.compile_program(self.functions)
+            vm.run_main_func(main_func_node)
+        elif main_func_node is not None and self.engine == 'python':
+            transpiler = Transpiler(self)
+            transpiler.compile_program(self.functions)
+            transpiler.run_main_func(main_func_node)
+        elif main_func_node is not None:
             self.run_main_func(main_func_node)
         else:
             super().error(
@@ -36,433 +77,467 @@ class Interpreter(InterpreterBase):
                 "No main() function was found",
             )
 
+    # parses and resolves the program and builds the tables every engine reads
+    def prepare(self, program):
+        ast = resolve(parse_program(program))
+        self.functions = ast.functions
+        # (name, arity) -> the first matching function, and name -> all of its overloads
+        self.function_index = {}
+        self.function_overloads = {}
+        for func_node in self.functions:
+            self.function_index.setdefault((func_node.name, len(func_node.args)), func_node)
+            self.function_overloads.setdefault(func_node.name, []).append(func_node)
+        self.constants = literal_values(ast)
+        self.formals = formal_params(ast)
+        # names each function and lambda may look up outside its own frame
+        self.outer_names = outer_names(ast, self.function_index)
+        # by-value arguments and return values are copied on write
+        self.copies = CopyOnWrite()
+        return ast
+
     def get_main_func_node(self, ast):
         if ast.elem_type == InterpreterBase.PROGRAM_DEF:
-            for func_node in ast.dict['functions']:
-                if func_node.dict['name'] == 'main':
+            for func_node in ast.functions:
+                if func_node.name == 'main':
                     return func_node
         return None
     
     def run_main_func(self, func_node):
         if func_node.elem_type == InterpreterBase.FUNC_DEF:
-            statements = func_node.dict['statements']
-            context = {}
-            for statement in statements:
-                print(context)
-                print('main')
-                run_result = self.run_statement(statement, context)
-                if run_result is not None:
-                    return run_result
+            return self.run_body(func_node.statements, Environment(), 'main')
                 
+    # statements and expressions are dispatched on elem_type through these
+    # tables (built in __init__), so every kind of node costs one dict lookup
+    def build_dispatch_tables(self):
+        self.statement_handlers = {
+            '=': self.run_assign,
+            InterpreterBase.IF_DEF: self.run_if,
+            InterpreterBase.WHILE_DEF: self.run_while,
+            InterpreterBase.RETURN_DEF: self.run_return,
+            InterpreterBase.FCALL_DEF: self.run_call_statement,
+        }
+        self.expression_handlers = {
+            InterpreterBase.INT_DEF: self.evaluate_literal,
+            InterpreterBase.STRING_DEF: self.evaluate_literal,
+            InterpreterBase.BOOL_DEF: self.evaluate_literal,
+            InterpreterBase.NIL_DEF: self.evaluate_literal,
+            InterpreterBase.VAR_DEF: self.evaluate_var,
+            InterpreterBase.LAMBDA_DEF: self.evaluate_lambda,
+            InterpreterBase.FCALL_DEF: self.evaluate_call,
+            InterpreterBase.MCALL_DEF: self.evaluate_mcall,
+            InterpreterBase.OBJ_DEF: self.evaluate_new_object,
+        }
+        self.binary_operators = {}
+        for operator, method in BINARY_OPERATORS.items():
+            # type-pair kernels first, the evaluate_* method for everything else
+            self.binary_operators[operator] = kernel_operator(operator, getattr(self, method))
+            self.expression_handlers[operator] = self.evaluate_binary
+        if self.short_circuit:
+            for operator in SHORT_CIRCUIT_OPERATORS:
+                self.expression_handlers[operator] = self.evaluate_short_circuit
+        self.unary_operators = {}
+        for operator, method in UNARY_OPERATORS.items():
+            self.unary_operators[operator] = getattr(self, method)
+            self.expression_handlers[operator] = self.evaluate_unary
+
     def run_statement(self, statement_node, context):
-        if statement_node.elem_type == '=':
-            key = statement_node.dict['name']
-            right_node = statement_node.dict['expression']
-            if key in context or ('.' in key and key.split('.')[0] in context):
-                value = self.evaluate_exp_var_or_val(right_node, context)
+        handler = self.statement_handlers.get(statement_node.elem_type)
+        if handler is None:
+            return None
+        return handler(statement_node, context)
+
+    def run_assign(self, statement_node, context):
+        path = statement_node.path
+        right_node = statement_node.expression
+        if statement_node.local:
+            # a local formal's slot holds its value (see brewresolve.py)
+            value = self.evaluate_exp_var_or_val(right_node, context)
+            if self.trace_output:
                 print(value)
-                if '.' in key:
-                    obj_key = key.split('.')[0]
-                    internal_key = key.split('.')[1]
-                    context[obj_key].dict[internal_key].elem_type = value.elem_type
-                    if context[obj_key].dict[internal_key].elem_type == InterpreterBase.FUNC_DEF:
-                        context[obj_key].dict[internal_key].dict = value.dict
-                    else:
-                        context[obj_key].dict[internal_key].dict['val'] = value.dict['val']
-                else:
-                    context[key].elem_type = value.elem_type
-                    if context[key].elem_type == InterpreterBase.FUNC_DEF:
-                        context[key].dict = value.dict
-                    else:
-                        context[key].dict['val'] = value.dict['val']
+            if len(path) > 1:
+                self.assign_member(context.frame.slots[statement_node.slot], path, value)
             else:
-                if '.' in key:
-                    super().error(ErrorType.NAME_ERROR,
-                      f"Unknown object {key}")
-                else:
-                    context[key] = self.evaluate_exp_var_or_val(right_node, context)
+                context.frame.slots[statement_node.slot] = value
             return None
-        elif statement_node.elem_type == InterpreterBase.IF_DEF:
-            condition_value = self.evaluate_exp_var_or_val(statement_node.dict['condition'], context)
-            if condition_value.elem_type != InterpreterBase.BOOL_DEF and condition_value.elem_type != InterpreterBase.INT_DEF:
-                super().error(
-                    ErrorType.TYPE_ERROR,
-                    f"Incompatible type for if condition",
-                )
-            condition = bool(condition_value.dict['val'])
-            if_context = copy.copy(context)
-            if condition:
-                for if_statement_node in statement_node.dict['statements']:
-                    run_result = self.run_statement(if_statement_node, if_context)
-                    if run_result is not None:
-                        return run_result
+        if statement_node.slot is not None:
+            variable = context.frame.slots[statement_node.slot]
+        else:
+            variable = context.lookup(path[0])
+        if variable is not None:
+            value = self.evaluate_exp_var_or_val(right_node, context)
+            if self.trace_output:
+                print(value)
+            if len(path) > 1:
+                self.assign_member(variable.value, path, value)
             else:
-                if statement_node.dict['else_statements'] is None:
-                    return None
-                for else_statement_node in statement_node.dict['else_statements']:
-                    run_result = self.run_statement(else_statement_node, if_context)
-                    if run_result is not None:
-                        return run_result
-            return None
-        elif statement_node.elem_type == InterpreterBase.WHILE_DEF:
-            condition_value = self.evaluate_exp_var_or_val(statement_node.dict['condition'], context)
-            if condition_value.elem_type != InterpreterBase.BOOL_DEF and condition_value.elem_type != InterpreterBase.INT_DEF:
+                variable.value = value
+        else:
+            if len(path) > 1:
+                super().error(ErrorType.NAME_ERROR,
+                  f"Unknown object {statement_node.name}")
+            else:
+                value = self.evaluate_exp_var_or_val(right_node, context)
+                source = None
+                if right_node.elem_type == InterpreterBase.VAR_DEF and len(right_node.path) == 1:
+                    # never a local formal (see brewresolve.py)
+                    if right_node.slot is not None:
+                        source = context.frame.slots[right_node.slot]
+                    else:
+                        source = context.lookup(right_node.name)
+                context[path[0]] = assigned_variable(source, value)
+        return None
+
+    def assign_member(self, obj, path, value):
+        if not is_object(obj):
+            super().error(ErrorType.TYPE_ERROR,
+              f"{path[0]} is not an object")
+        self.copies.before_write(obj)
+        obj.set(path[1], value)
+
+    def run_if(self, statement_node, context):
+        condition_value = self.evaluate_exp_var_or_val(statement_node.condition, context)
+        if type(condition_value) not in ARITHMETIC_TYPES:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible type for if condition",
+            )
+        condition = bool(condition_value)
+        if_context = Environment(context)
+        if condition:
+            for if_statement_node in statement_node.statements:
+                run_result = self.run_statement(if_statement_node, if_context)
+                if run_result is not None:
+                    return run_result
+        else:
+            if statement_node.else_statements is None:
+                return None
+            for else_statement_node in statement_node.else_statements:
+                run_result = self.run_statement(else_statement_node, if_context)
+                if run_result is not None:
+                    return run_result
+        return None
+
+    def run_while(self, statement_node, context):
+        condition_value = self.evaluate_exp_var_or_val(statement_node.condition, context)
+        if type(condition_value) not in ARITHMETIC_TYPES:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible type for while condition",
+            )
+        condition = bool(condition_value)
+        while condition:
+            while_context = Environment(context)
+            for while_statement_node in statement_node.statements:
+                run_result = self.run_statement(while_statement_node, while_context)
+                if run_result is not None:
+                    return run_result
+            
+            condition_value = self.evaluate_exp_var_or_val(statement_node.condition, context)
+            if type(condition_value) not in ARITHMETIC_TYPES:
                 super().error(
                     ErrorType.TYPE_ERROR,
                     f"Incompatible type for while condition",
                 )
-            condition = bool(condition_value.dict['val'])
-            while condition:
-                while_context = copy.copy(context)
-                for while_statement_node in statement_node.dict['statements']:
-                    run_result = self.run_statement(while_statement_node, while_context)
-                    if run_result is not None:
-                        return run_result
-                
-                condition_value = self.evaluate_exp_var_or_val(statement_node.dict['condition'], context)
-                if condition_value.elem_type != InterpreterBase.BOOL_DEF and condition_value.elem_type != InterpreterBase.INT_DEF:
-                    super().error(
-                        ErrorType.TYPE_ERROR,
-                        f"Incompatible type for while condition",
-                    )
-                condition = bool(condition_value.dict['val'])
-            return None
-        elif statement_node.elem_type == InterpreterBase.RETURN_DEF:
-            if statement_node.dict['expression'] is None:
-                return Element(InterpreterBase.NIL_DEF)
-            return copy.deepcopy(self.evaluate_exp_var_or_val(statement_node.dict['expression'], context))
-        elif statement_node.elem_type == InterpreterBase.FCALL_DEF:
-            func_name = statement_node.dict['name']
-            args = statement_node.dict['args']
-            return self.run_func(func_name, args, context)
+            condition = bool(condition_value)
         return None
+
+    def run_return(self, statement_node, context):
+        expression = statement_node.expression
+        if expression is None:
+            return NIL
+        if (expression.elem_type == InterpreterBase.FCALL_DEF or expression.elem_type == InterpreterBase.MCALL_DEF) \
+                and expression.name not in BUILTINS:
+            target = self.tail_call_target(expression.name, len(expression.args), context)
+            if target is not None:
+                # the callee takes over this call's place: run_body runs it
+                # once this function has returned
+                parent = self.tail_call_scope(target, context)
+                statements, func_context = self.enter_func(expression.name, expression.args, context, parent)
+                return TailCall(statements, func_context, expression.name)
+        return self.copies.copy(self.evaluate_exp_var_or_val(expression, context))
+
+    def run_call_statement(self, statement_node, context):
+        return self.run_func(statement_node.name, statement_node.args, context)
     
     def evaluate_exp_var_or_val(self, node, context, ref=False):
-        if node.elem_type == InterpreterBase.INT_DEF or node.elem_type == InterpreterBase.STRING_DEF:
-            return copy.deepcopy(node)
-        elif node.elem_type == InterpreterBase.BOOL_DEF or node.elem_type == InterpreterBase.NIL_DEF:
-            return copy.deepcopy(node)
-        elif node.elem_type == InterpreterBase.VAR_DEF:
-            return self.evaluate_var(node, context, ref)
-        elif node.elem_type == InterpreterBase.LAMBDA_DEF:
-            return self.evaluate_lambda(node, context)
-        else:
-            return self.evaluate_expression(node, context)
+        # ref only changes what a variable evaluates to
+        if ref and node.elem_type == InterpreterBase.VAR_DEF:
+            return self.evaluate_var(node, context, True)
+        handler = self.expression_handlers.get(node.elem_type)
+        if handler is None:
+            super().error(ErrorType.NAME_ERROR,
+                      f"Unknown expression {node}")
+        return handler(node, context)
+
+    def evaluate_literal(self, node, context):
+        return self.constants[node]
     
     def evaluate_lambda(self, node, context):
         formal_args = []
-        for arg in node.dict['args']:
-            formal_args.append(arg.dict['name'])
-        free_vars = copy.deepcopy(context)
-        for var_name in free_vars:
-            if var_name in formal_args:
-                free_vars[var_name] = None
-            elif free_vars[var_name].elem_type == InterpreterBase.FUNC_DEF:
-                free_vars[var_name] = context[var_name]
-            elif free_vars[var_name].elem_type == InterpreterBase.LAMBDA_DEF:
-                free_vars[var_name] = context[var_name]
-            elif free_vars[var_name].elem_type == 'obj':
-                free_vars[var_name] = context[var_name]
-        lambda_node = copy.deepcopy(node)
-        lambda_node.dict['free_vars'] = free_vars
-        return lambda_node
+        for arg in node.args:
+            formal_args.append(arg.name)
+        free_vars = capture_variables(context, self.outer_names[node], formal_args)
+        return Element(InterpreterBase.LAMBDA_DEF, args=node.args, statements=node.statements,
+                       formals=self.formals[node], free_vars=free_vars, node=node)
     
     def evaluate_var(self, var_node, context, ref=False):
-        var_name = var_node.get('name')
-        if var_name in context:
-            if ref or context[var_name].elem_type == InterpreterBase.FUNC_DEF \
-                or context[var_name].elem_type == InterpreterBase.LAMBDA_DEF \
-                    or context[var_name].elem_type == 'obj':
-               return context[var_name]
-            return copy.deepcopy(context[var_name])
-        obj_key = var_name.split('.')[0]
-        internal_key = var_name.split('.')[1]
-        if obj_key in context and internal_key in context[obj_key].dict:
-            if ref or context[obj_key].dict[internal_key].elem_type == InterpreterBase.FUNC_DEF \
-                or context[obj_key].dict[internal_key].elem_type == InterpreterBase.LAMBDA_DEF \
-                    or context[obj_key].dict[internal_key].elem_type == 'obj':
-               return context[obj_key].dict[internal_key]
-            return copy.deepcopy(context[obj_key].dict[internal_key])
-        elif obj_key in context:
+        # formals are read straight from the call's frame (see brewresolve.py);
+        # a local one's slot holds its value, and it's never passed by ref itself
+        if var_node.local:
+            obj = context.frame.slots[var_node.slot]
+            if len(var_node.path) == 1:
+                return obj
+            variable = None
+        elif var_node.slot is not None:
+            variable = context.frame.slots[var_node.slot]
+        else:
+            variable = context.lookup(var_node.path[0])
+        # with ref=True the caller gets the Variable itself, so assignments through it are shared
+        if len(var_node.path) == 1:
+            if variable is not None:
+                if ref:
+                   return variable
+                return variable.value
+        else:
+            internal_key = var_node.path[1]
+            if not var_node.local:
+                obj = variable.value if variable is not None else None
             # todo invesitage ref handling for nested items in proto objects
-            proto_obj = context[obj_key].dict['proto']
-            while proto_obj is not None:
-                if internal_key in proto_obj.dict:
-                    if ref or proto_obj.dict[internal_key].elem_type == InterpreterBase.FUNC_DEF \
-                        or proto_obj.dict[internal_key].elem_type == InterpreterBase.LAMBDA_DEF \
-                            or proto_obj.dict[internal_key].elem_type == 'obj':
-                        return proto_obj.dict[internal_key]
-                    return copy.deepcopy(proto_obj.dict[internal_key])
-                else:
-                    proto_obj = proto_obj.dict['proto']
-        function_var = None
-        for func_node in self.functions:
-            if func_node.dict['name'] == var_name:
-                if function_var is None:
-                    function_var = func_node
-                else:
-                    super().error(
-                        ErrorType.NAME_ERROR,
-                        f"Ambigous function {var_name}",
-                    )
+            while is_object(obj):
+                index = obj.shape.index.get(internal_key)
+                if index is not None:
+                    if ref:
+                        self.copies.pin(obj)
+                        return FieldRef(obj, index)
+                    return obj.values[index]
+                obj = obj.values[PROTO]
+        var_name = var_node.name
+        overloads = self.function_overloads.get(var_name, ())
+        if len(overloads) > 1:
+            super().error(
+                ErrorType.NAME_ERROR,
+                f"Ambigous function {var_name}",
+            )
+        function_var = overloads[0] if overloads else None
         if function_var is not None:
+            if ref:
+                return Variable(function_var)
             return function_var
         super().error(
             ErrorType.NAME_ERROR,
             f"Variable {var_name} has not been defined",
         )
     
-    def evaluate_expression(self, expression_node, context):
-        if expression_node.elem_type == '+':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_add(op1, op2)
-        elif expression_node.elem_type == '-':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_subtract(op1, op2)
-        elif expression_node.elem_type == '*':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_multiply(op1, op2)
-        elif expression_node.elem_type == '/':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_divide(op1, op2)
-        elif expression_node.elem_type == '==':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_equality(op1, op2)
-        elif expression_node.elem_type == '!=':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_inequality(op1, op2)
-        elif expression_node.elem_type == '<':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_less(op1, op2)
-        elif expression_node.elem_type == '<=':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_less_equal(op1, op2)
-        elif expression_node.elem_type == '>':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_greater(op1, op2)
-        elif expression_node.elem_type == '>=':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_greater_equal(op1, op2)
-        elif expression_node.elem_type == '&&':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_and_and(op1, op2)
-        elif expression_node.elem_type == '||':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            op2 = self.evaluate_exp_var_or_val(expression_node.dict['op2'], context)
-            return self.evaluate_or_or(op1, op2)
-        elif expression_node.elem_type == InterpreterBase.NEG_DEF:
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            return self.evaluate_neg(op1)
-        elif expression_node.elem_type == '!':
-            op1 = self.evaluate_exp_var_or_val(expression_node.dict['op1'], context)
-            return self.evaluate_not(op1)
-        elif expression_node.elem_type == InterpreterBase.FCALL_DEF:
-            func_name = expression_node.dict['name']
-            args = expression_node.dict['args']
-            run_result = self.run_func(func_name, args, context)
-            if run_result is None:
-                return Element(InterpreterBase.NIL_DEF)
-            else:
-                return run_result
-        elif expression_node.elem_type == InterpreterBase.OBJ_DEF:
-            func_name = expression_node.dict['name']
-            return Element('obj', proto=None)
-        elif expression_node.elem_type == InterpreterBase.MCALL_DEF:
-            obj_ref = expression_node.dict['objref']
-            func_name = expression_node.dict['name']
-            args = expression_node.dict['args']
-            mcall_context = copy.copy(context)
-            # todo this is prob the toughest to think through
-            run_result = self.run_func(func_name, args, context)
-            if run_result is None:
-                return Element(InterpreterBase.NIL_DEF)
-            else:
-                return run_result
+    def evaluate_binary(self, expression_node, context):
+        op1 = self.evaluate_exp_var_or_val(expression_node.op1, context)
+        op2 = self.evaluate_exp_var_or_val(expression_node.op2, context)
+        return self.binary_operators[expression_node.elem_type](op1, op2)
+
+    def evaluate_short_circuit(self, expression_node, context):
+        operator = expression_node.elem_type
+        op1 = self.logical_operand(operator, self.evaluate_exp_var_or_val(expression_node.op1, context))
+        if op1 is SHORT_CIRCUIT_OPERATORS[operator]:
+            return op1
+        return self.logical_operand(operator, self.evaluate_exp_var_or_val(expression_node.op2, context))
+
+    def evaluate_unary(self, expression_node, context):
+        op1 = self.evaluate_exp_var_or_val(expression_node.op1, context)
+        return self.unary_operators[expression_node.elem_type](op1)
+
+    def evaluate_call(self, expression_node, context):
+        func_name = expression_node.name
+        args = expression_node.args
+        run_result = self.run_func(func_name, args, context)
+        if run_result is None:
+            return NIL
         else:
-            super().error(ErrorType.NAME_ERROR,
-                      f"Unknown expression {expression_node}")
+            return run_result
+
+    def evaluate_mcall(self, expression_node, context):
+        obj_ref = expression_node.objref
+        func_name = expression_node.name
+        args = expression_node.args
+        # todo this is prob the toughest to think through
+        run_result = self.run_func(func_name, args, context)
+        if run_result is None:
+            return NIL
+        else:
+            return run_result
+
+    def evaluate_new_object(self, expression_node, context):
+        return new_object()
     
     def evaluate_add(self, op1, op2):
-        if op1.elem_type == InterpreterBase.STRING_DEF and op2.elem_type == InterpreterBase.STRING_DEF:
-            result = copy.deepcopy(op1)
-            result.dict['val'] = op1.dict['val'] + op2.dict['val']
-            return result
-        if (op1.elem_type != InterpreterBase.INT_DEF and op1.elem_type != InterpreterBase.BOOL_DEF) \
-                or (op2.elem_type != InterpreterBase.INT_DEF and op2.elem_type != InterpreterBase.BOOL_DEF):
+        if type(op1) is str and type(op2) is str:
+            return op1 + op2
+        if type(op1) not in ARITHMETIC_TYPES or type(op2) not in ARITHMETIC_TYPES:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for add operation",
             )
-        else:
-            result = Element(InterpreterBase.INT_DEF, val=0)
-            result.dict['val'] = int(op1.dict['val']) + int(op2.dict['val'])
-            return result
+        return int(op1) + int(op2)
         
     def evaluate_subtract(self, op1, op2):
-        if (op1.elem_type != InterpreterBase.INT_DEF and op1.elem_type != InterpreterBase.BOOL_DEF) \
-                or (op2.elem_type != InterpreterBase.INT_DEF and op2.elem_type != InterpreterBase.BOOL_DEF):
+        if type(op1) not in ARITHMETIC_TYPES or type(op2) not in ARITHMETIC_TYPES:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for subtract operation",
             )
-        else:
-            result = Element(InterpreterBase.INT_DEF, val=0)
-            result.dict['val'] = int(op1.dict['val']) - int(op2.dict['val'])
-            return result
+        return int(op1) - int(op2)
         
     def evaluate_multiply(self, op1, op2):
-        if (op1.elem_type != InterpreterBase.INT_DEF and op1.elem_type != InterpreterBase.BOOL_DEF) \
-                or (op2.elem_type != InterpreterBase.INT_DEF and op2.elem_type != InterpreterBase.BOOL_DEF):
+        if type(op1) not in ARITHMETIC_TYPES or type(op2) not in ARITHMETIC_TYPES:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for multiply operation",
             )
-        else:
-            result = Element(InterpreterBase.INT_DEF, val=0)
-            result.dict['val'] = int(op1.dict['val']) * int(op2.dict['val'])
-            return result
+        return int(op1) * int(op2)
     
     def evaluate_divide(self, op1, op2):
-        if (op1.elem_type != InterpreterBase.INT_DEF and op1.elem_type != InterpreterBase.BOOL_DEF) \
-                or (op2.elem_type != InterpreterBase.INT_DEF and op2.elem_type != InterpreterBase.BOOL_DEF):
+        if type(op1) not in ARITHMETIC_TYPES or type(op2) not in ARITHMETIC_TYPES:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for divide operation",
             )
-        else:
-            result = Element(InterpreterBase.INT_DEF, val=0)
-            result.dict['val'] = int(op1.dict['val']) // int(op2.dict['val'])
-            return result
+        return int(op1) // int(op2)
         
     def evaluate_equality(self, op1, op2):
-        if op1.elem_type == InterpreterBase.NIL_DEF and op2.elem_type == InterpreterBase.NIL_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=True)
-        elif op1.elem_type == InterpreterBase.FUNC_DEF and op2.elem_type == InterpreterBase.FUNC_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=op1 is op2)
-        elif op1.elem_type == InterpreterBase.LAMBDA_DEF and op2.elem_type == InterpreterBase.LAMBDA_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=op1 is op2)
-        elif op1.elem_type == InterpreterBase.NIL_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=False)
-        elif op1.elem_type == InterpreterBase.NIL_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=False)
-        elif op1.elem_type == InterpreterBase.BOOL_DEF and op2.elem_type == InterpreterBase.INT_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=op1.dict['val'] == bool(op2.dict['val']))
-        elif op1.elem_type == InterpreterBase.INT_DEF and op2.elem_type == InterpreterBase.BOOL_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=bool(op1.dict['val']) == op2.dict['val'])
-        elif op1.elem_type != op2.elem_type:
-            return Element(InterpreterBase.BOOL_DEF, val=False)
-        return Element(InterpreterBase.BOOL_DEF, val=op1.dict['val'] == op2.dict['val'])
+        type1 = value_type(op1)
+        type2 = value_type(op2)
+        if type1 == InterpreterBase.NIL_DEF and type2 == InterpreterBase.NIL_DEF:
+            return True
+        elif type1 == InterpreterBase.FUNC_DEF and type2 == InterpreterBase.FUNC_DEF:
+            return op1 is op2
+        elif type1 == InterpreterBase.LAMBDA_DEF and type2 == InterpreterBase.LAMBDA_DEF:
+            return op1 is op2
+        elif type1 == InterpreterBase.NIL_DEF:
+            return False
+        elif type1 == InterpreterBase.BOOL_DEF and type2 == InterpreterBase.INT_DEF:
+            return op1 == bool(op2)
+        elif type1 == InterpreterBase.INT_DEF and type2 == InterpreterBase.BOOL_DEF:
+            return bool(op1) == op2
+        elif type1 != type2:
+            return False
+        return primitive_value(op1) == primitive_value(op2)
     
     def evaluate_inequality(self, op1, op2):
-        if op1.elem_type == InterpreterBase.NIL_DEF and op2.elem_type == InterpreterBase.NIL_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=False)
-        elif op1.elem_type == InterpreterBase.FUNC_DEF and op2.elem_type == InterpreterBase.FUNC_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=op1 is not op2)
-        elif op1.elem_type == InterpreterBase.LAMBDA_DEF and op2.elem_type == InterpreterBase.LAMBDA_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=op1 is not op2)
-        elif op1.elem_type == InterpreterBase.NIL_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=True)
-        elif op1.elem_type == InterpreterBase.NIL_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=True)
-        elif op1.elem_type == InterpreterBase.BOOL_DEF and op2.elem_type == InterpreterBase.INT_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=op1.dict['val'] != bool(op2.dict['val']))
-        elif op1.elem_type == InterpreterBase.INT_DEF and op2.elem_type == InterpreterBase.BOOL_DEF:
-            return Element(InterpreterBase.BOOL_DEF, val=bool(op1.dict['val']) != op2.dict['val'])
-        elif op1.elem_type != op2.elem_type:
-            return Element(InterpreterBase.BOOL_DEF, val=True)
-        return Element(InterpreterBase.BOOL_DEF, val=op1.dict['val'] != op2.dict['val'])
+        type1 = value_type(op1)
+        type2 = value_type(op2)
+        if type1 == InterpreterBase.NIL_DEF and type2 == InterpreterBase.NIL_DEF:
+            return False
+        elif type1 == InterpreterBase.FUNC_DEF and type2 == InterpreterBase.FUNC_DEF:
+            return op1 is not op2
+        elif type1 == InterpreterBase.LAMBDA_DEF and type2 == InterpreterBase.LAMBDA_DEF:
+            return op1 is not op2
+        elif type1 == InterpreterBase.NIL_DEF:
+            return True
+        elif type1 == InterpreterBase.BOOL_DEF and type2 == InterpreterBase.INT_DEF:
+            return op1 != bool(op2)
+        elif type1 == InterpreterBase.INT_DEF and type2 == InterpreterBase.BOOL_DEF:
+            return bool(op1) != op2
+        elif type1 != type2:
+            return True
+        return primitive_value(op1) != primitive_value(op2)
     
     def evaluate_less(self, op1, op2):
-        if op1.elem_type != InterpreterBase.INT_DEF or op2.elem_type != InterpreterBase.INT_DEF:
+        if type(op1) is not int or type(op2) is not int:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for < operation",
             )
-        return Element(InterpreterBase.BOOL_DEF, val=op1.dict['val'] < op2.dict['val'])
+        return op1 < op2
     
     def evaluate_less_equal(self, op1, op2):
-        if op1.elem_type != InterpreterBase.INT_DEF or op2.elem_type != InterpreterBase.INT_DEF:
+        if type(op1) is not int or type(op2) is not int:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for <= operation",
             )
-        return Element(InterpreterBase.BOOL_DEF, val=op1.dict['val'] <= op2.dict['val'])
+        return op1 <= op2
 
     def evaluate_greater(self, op1, op2):
-        if op1.elem_type != InterpreterBase.INT_DEF or op2.elem_type != InterpreterBase.INT_DEF:
+        if type(op1) is not int or type(op2) is not int:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for > operation",
             )
-        return Element(InterpreterBase.BOOL_DEF, val=op1.dict['val'] > op2.dict['val'])
+        return op1 > op2
 
     def evaluate_greater_equal(self, op1, op2):
-        if op1.elem_type != InterpreterBase.INT_DEF or op2.elem_type != InterpreterBase.INT_DEF:
+        if type(op1) is not int or type(op2) is not int:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for >= operation",
             )
-        return Element(InterpreterBase.BOOL_DEF, val=op1.dict['val'] >= op2.dict['val'])
+        return op1 >= op2
     
     def evaluate_and_and(self, op1, op2):
-        if (op1.elem_type != InterpreterBase.INT_DEF and op1.elem_type != InterpreterBase.BOOL_DEF) \
-                or (op2.elem_type != InterpreterBase.INT_DEF and op2.elem_type != InterpreterBase.BOOL_DEF):
+        if type(op1) not in ARITHMETIC_TYPES or type(op2) not in ARITHMETIC_TYPES:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for && operation",
             )
-        return Element(InterpreterBase.BOOL_DEF, val=bool(op1.dict['val']) and bool(op2.dict['val']))
+        return bool(op1) and bool(op2)
     
     def evaluate_or_or(self, op1, op2):
-        if (op1.elem_type != InterpreterBase.INT_DEF and op1.elem_type != InterpreterBase.BOOL_DEF) \
-                or (op2.elem_type != InterpreterBase.INT_DEF and op2.elem_type != InterpreterBase.BOOL_DEF):
+        if type(op1) not in ARITHMETIC_TYPES or type(op2) not in ARITHMETIC_TYPES:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for || operation",
             )
-        return Element(InterpreterBase.BOOL_DEF, val=bool(op1.dict['val']) or bool(op2.dict['val']))
+        return bool(op1) or bool(op2)
     
+    # an operand of && or || as a bool, with evaluate_and_and's type check;
+    # for short_circuit, which checks each operand as it's evaluated
+    def logical_operand(self, operator, value):
+        if type(value) not in ARITHMETIC_TYPES:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible types for {operator} operation",
+            )
+        return bool(value)
+
     def evaluate_neg(self, op1):
-        if op1.elem_type != InterpreterBase.INT_DEF:
+        if type(op1) is not int:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for neg operation",
             )
-        return Element(InterpreterBase.INT_DEF, val=-op1.dict['val'])
+        return -op1
     
     def evaluate_not(self, op1):
-        if op1.elem_type != InterpreterBase.BOOL_DEF and op1.elem_type != InterpreterBase.INT_DEF:
+        if type(op1) not in ARITHMETIC_TYPES:
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible types for ! operation",
             )
-        return Element(InterpreterBase.BOOL_DEF, val=(not bool(op1.dict['val'])))
+        return not op1
     
-    def evaluate_arg_values(self, args, context, formal_params=None):
+    # only used on the error paths, so arguments are still evaluated before a bad call is reported
+    def evaluate_arg_values(self, args, context):
         arg_value_list = []
-        for index in range(len(args)):
-            if formal_params is not None:
-                reference = formal_params[index].elem_type == InterpreterBase.REFARG_DEF
-                value = self.evaluate_exp_var_or_val(args[index], context, reference)
-                if reference:
-                    arg_value_list.append(value)
-                else:
-                    arg_value_list.append(copy.deepcopy(value))
-            else:
-                arg_value_list.append(copy.deepcopy(self.evaluate_exp_var_or_val(args[index], context)))
+        for arg in args:
+            arg_value_list.append(self.evaluate_exp_var_or_val(arg, context))
         return arg_value_list
-    
+
+    # evaluates each actual exactly once and binds it straight into the callee's frame:
+    # ref formals share the caller's Variable, the rest get a copy of the value
+    # (local formals keep just the copy in their slot, see brewresolve.py)
+    def bind_args(self, formals, args, context, func_context):
+        for index in range(len(formals)):
+            name, reference, local = formals[index]
+            if local:
+                func_context.slots.append(self.copies.copy(self.evaluate_exp_var_or_val(args[index], context)))
+                continue
+            if reference:
+                variable = self.evaluate_exp_var_or_val(args[index], context, True)
+                if not isinstance(variable, Variable):
+                    variable = Variable(variable)
+            else:
+                variable = Variable(self.copies.copy(self.evaluate_exp_var_or_val(args[index], context)))
+            func_context[name] = variable
+            func_context.slots.append(variable)
+
     def run_func(self, func_name, args, context):
         if func_name == 'inputi':
             return self.handle_inputi(args, context)
@@ -471,59 +546,126 @@ class Interpreter(InterpreterBase):
         elif func_name == 'inputs':
             return self.handle_inputs(args, context)
         
-        arg_values = self.evaluate_arg_values(args, context)
-        for func_node in self.functions:
-            if func_node.dict['name'] == func_name and len(arg_values) == len(func_node.dict['args']):
-                func_context = copy.copy(context)
-                arg_values = self.evaluate_arg_values(args, context, func_node.dict['args'])
-                for index in range(len(func_node.dict['args'])):
-                    arg_node = func_node.dict['args'][index]
-                    func_context[arg_node.dict['name']] = arg_values[index]
-                statements = func_node.dict['statements']
-                for statement in statements:
-                    print(context)
-                    print(func_name)
-                    run_result = self.run_statement(statement, func_context)
-                    if run_result is not None:
-                        return run_result
-                return None
+        statements, func_context = self.enter_func(func_name, args, context, context)
+        return self.run_body(statements, func_context, func_name)
+
+    # binds the call's arguments into a new frame under parent (the caller's
+    # context, or what's above the caller's frame for a tail call)
+    def enter_func(self, func_name, args, context, parent):
+        func_node = self.function_index.get((func_name, len(args)))
+        if func_node is not None:
+            func_context = Environment(parent, [])
+            self.bind_args(self.formals[func_node], args, context, func_context)
+            return func_node.statements, func_context
         if func_name in context:
-            if context[func_name].elem_type != InterpreterBase.FUNC_DEF and context[func_name].elem_type != InterpreterBase.LAMBDA_DEF:
+            func_node = context[func_name].value
+            if not is_function(func_node):
+                self.evaluate_arg_values(args, context)
                 super().error(
                     ErrorType.TYPE_ERROR,
                     f"{func_name} is not a function",
                 )
-            func_node = context[func_name]
-            if len(arg_values) == len(func_node.dict['args']):
-                func_context = copy.copy(context)
-                arg_values = self.evaluate_arg_values(args, context, func_node.dict['args'])
-                for index in range(len(func_node.dict['args'])):
-                    arg_node = func_node.dict['args'][index]
-                    func_context[arg_node.dict['name']] = arg_values[index]
-                if context[func_name].elem_type == InterpreterBase.LAMBDA_DEF:
+            if len(args) == len(func_node.dict['args']):
+                func_context = Environment(parent, [])
+                if func_node.elem_type == InterpreterBase.LAMBDA_DEF:
+                    self.bind_args(func_node.dict['formals'], args, context, func_context)
                     for key in func_node.dict['free_vars']:
-                        if func_node.dict['free_vars'][key] is not None:
-                            func_context[key] = func_node.dict['free_vars'][key]
-                statements = func_node.dict['statements']
-                for statement in statements:
-                    run_result = self.run_statement(statement, func_context)
-                    if run_result is not None:
-                        return run_result
-                return None
+                        func_context[key] = func_node.dict['free_vars'][key]
+                else:
+                    self.bind_args(self.formals[func_node], args, context, func_context)
+                return func_node.dict['statements'], func_context
             else:
+                self.evaluate_arg_values(args, context)
                 super().error(
                     ErrorType.TYPE_ERROR,
-                    f"{func_name} does not take {len(arg_values)} parameters",
+                    f"{func_name} does not take {len(args)} parameters",
                 )
+        self.evaluate_arg_values(args, context)
         super().error(
             ErrorType.NAME_ERROR,
-            f"No {func_name} function found that takes {len(arg_values)} parameters",
+            f"No {func_name} function found that takes {len(args)} parameters",
         )
 
+    # runs a function body, and then the body of every tail call it returns in
+    # the same loop, so a chain of tail calls doesn't nest Python frames
+    def run_body(self, statements, func_context, func_name):
+        tail_called = False
+        while True:
+            run_result = None
+            for statement in statements:
+                if self.trace_output:
+                    print(func_context)
+                    print(func_name)
+                run_result = self.run_statement(statement, func_context)
+                if run_result is not None:
+                    break
+            if type(run_result) is not TailCall:
+                break
+            statements = run_result.body
+            func_context = run_result.context
+            func_name = run_result.func_name
+            tail_called = True
+        if tail_called:
+            # what `return f(...)` would have made of the last call's result
+            if run_result is None:
+                return NIL
+            return self.copies.copy(run_result)
+        return run_result
+
+    # the FuncDef or lambda `return func_name(...)` would call, or None if
+    # the call is going to fail (it's left to run_func to report that)
+    def tail_call_target(self, func_name, arity, context):
+        target = self.function_index.get((func_name, arity))
+        if target is not None:
+            return target
+        variable = context.lookup(func_name)
+        if variable is None:
+            return None
+        target = variable.value
+        if not is_function(target) or arity != len(target.dict['args']):
+            return None
+        return target
+
+    # what a tail call's frame hangs off in place of the caller's frames.
+    # When the callee can't look up any name in them (see
+    # brewresolve.outer_names) that's just what's above them; otherwise the
+    # names they hold are carried into one TailScope over it, so the callee
+    # still finds the same Variables but the chain doesn't grow
+    def tail_call_scope(self, target, context):
+        frame = context.frame
+        if target.elem_type == InterpreterBase.LAMBDA_DEF:
+            names = self.outer_names[target.dict['node']]
+            if names is not None:
+                # captured names are in the lambda's own frame
+                names = names.difference(target.dict['free_vars'])
+        else:
+            names = self.outer_names[target]
+        if names is not None:
+            env = context
+            while names.isdisjoint(env.vars):
+                if env is frame:
+                    return frame.parent
+                env = env.parent
+
+        scopes = []
+        env = context
+        while env is not frame:
+            scopes.append(env)
+            env = env.parent
+        scopes.append(frame)
+        parent = frame.parent
+        if type(parent) is TailScope:
+            scopes.append(parent)
+            parent = parent.parent
+        tail_scope = TailScope(parent)
+        for env in reversed(scopes):
+            tail_scope.vars.update(env.vars)
+        return tail_scope
+
     def handle_inputi(self, args, context):
         if len(args) == 1:
             value = self.evaluate_exp_var_or_val(args[0], context)
-            prompt = value.dict['val']
+            prompt = primitive_value(value)
             super().output(prompt)
         elif len(args) > 1:
             super().error(
@@ -531,14 +673,12 @@ class Interpreter(InterpreterBase):
                 f"No inputi() function found that takes > 1 parameter",
             )
         user_input = super().get_input()
-        int_value = int(user_input)
-        input_element = Element(InterpreterBase.INT_DEF, val=int_value)
-        return input_element
+        return int(user_input)
     
     def handle_inputs(self, args, context):
         if len(args) == 1:
             value = self.evaluate_exp_var_or_val(args[0], context)
-            prompt = value.dict['val']
+            prompt = primitive_value(value)
             super().output(prompt)
         elif len(args) > 1:
             super().error(
@@ -546,9 +686,7 @@ class Interpreter(InterpreterBase):
                 f"No inputs() function found that takes > 1 parameter",
             )
         user_input = super().get_input()
-        str_value = str(user_input)
-        input_element = Element(InterpreterBase.STRING_DEF, val=str_value)
-        return input_element
+        return str(user_input)
     
     def handle_print(self, args, context):
         if self.trace_output:
@@ -561,10 +699,7 @@ class Interpreter(InterpreterBase):
                     ErrorType.NAME_ERROR,
                     f"Missing some var",
                 )
-            output_piece = str(value.dict['val'])
-            if value.elem_type == InterpreterBase.BOOL_DEF:
-                output_piece = output_piece.lower()
-            string_to_output += output_piece
+            string_to_output += output_text(value)
         if self.trace_output:
             print(string_to_output)
         super().output(string_to_output)
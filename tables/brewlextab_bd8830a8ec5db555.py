@@ -0,0 +1,10 @@
+# brewlextab_bd8830a8ec5db555.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('AND', 'ASSIGN', 'AT', 'COMMA', 'DIVIDE', 'DOT', 'ELSE', 'EQ', 'FALSE', 'FUNC', 'GREATER', 'GREATER_EQ', 'IF', 'LAMBDA', 'LBRACE', 'LESS', 'LESS_EQ', 'LPAREN', 'MINUS', 'MULTIPLY', 'NAME', 'NIL', 'NOT', 'NOT_EQ', 'NUMBER', 'OR', 'PLUS', 'RBRACE', 'REF', 'RETURN', 'RPAREN', 'SEMI', 'STRING', 'TRUE', 'WHILE'))
+_lexreflags   = 64
+_lexliterals  = '=+-*/(),{};><".!@'
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_NUMBER>\\d+)|(?P<t_NAME>[A-Za-z_][\\w_]*)|(?P<t_newline>\\n+)|(?P<t_comment>/\\*)|(?P<t_STRING>"[^"\\n]*")|(?P<t_OR>\\|\\|)|(?P<t_AND>&&)|(?P<t_AT>\\@)|(?P<t_DOT>\\.)|(?P<t_EQ>==)|(?P<t_GREATER_EQ>>=)|(?P<t_LBRACE>\\{)|(?P<t_LESS_EQ><=)|(?P<t_LPAREN>\\()|(?P<t_MINUS>\\-)|(?P<t_MULTIPLY>\\*)|(?P<t_NOT_EQ>!=)|(?P<t_PLUS>\\+)|(?P<t_RBRACE>\\})|(?P<t_RPAREN>\\))|(?P<t_ASSIGN>=)|(?P<t_COMMA>,)|(?P<t_DIVIDE>/)|(?P<t_GREATER>>)|(?P<t_LESS><)|(?P<t_NOT>!)|(?P<t_SEMI>;)', [None, ('t_NUMBER', 'NUMBER'), ('t_NAME', 'NAME'), ('t_newline', 'newline'), ('t_comment', 'comment'), ('t_STRING', 'STRING'), (None, 'OR'), (None, 'AND'), (None, 'AT'), (None, 'DOT'), (None, 'EQ'), (None, 'GREATER_EQ'), (None, 'LBRACE'), (None, 'LESS_EQ'), (None, 'LPAREN'), (None, 'MINUS'), (None, 'MULTIPLY'), (None, 'NOT_EQ'), (None, 'PLUS'), (None, 'RBRACE'), (None, 'RPAREN'), (None, 'ASSIGN'), (None, 'COMMA'), (None, 'DIVIDE'), (None, 'GREATER'), (None, 'LESS'), (None, 'NOT'), (None, 'SEMI')])]}
+_lexstateignore = {'INITIAL': ' \t'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
@@ -0,0 +1,240 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+
+import brewparse
+from interpreterv4 import Interpreter
+
+'''
+Differential tests for interpreterv4's engines.
+
+Every engine must print exactly what the tree walker prints and fail with
+exactly the same error, with short_circuit both off and on, and the PLY
+and Pratt parsers must print the same messages and build the same tree.
+This checks the programs in tests/programs, and any number of random
+programs, against all of them and reports every difference.
+
+Run from the repo root:
+    python -m tests.differential [--random N] [--seed S] [--engines closure,vm,python]
+
+tests/programs/<name>.br is a program; <name>.in, if there is one, holds
+its input lines, and <name>.out the transcript the tree walker must
+produce (see transcript()). --write-expected writes the missing .out
+files from what the tree walker does now. python -m pytest runs the same
+checks through tests/test_differential.py.
+'''
+
+PROGRAM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'programs')
+
+REFERENCE_ENGINE = 'tree'
+ENGINES = ('closure', 'vm', 'python')
+PARSER_BACKENDS = ('ply', 'pratt')
+MODES = ({}, {'short_circuit': True})
+
+# Deep enough for the tree walker, which recurses in Python for every
+# Brewin call and block, and shallow enough that a random program that
+# recurses forever fails fast: each call looks names up through all of
+# its callers, so runaway recursion costs the square of its depth. The
+# vm's limit on Brewin calls is 100000 by default.
+sys.setrecursionlimit(max(sys.getrecursionlimit(), 4000))
+CALL_DEPTH_LIMIT = 2000
+
+
+def describe_error(error):
+    if isinstance(error, RecursionError):
+        # each engine words running out of depth its own way
+        return 'RecursionError'
+    return f'{type(error).__name__}: {error}'
+
+
+# what running program on engine looks like from outside: what it printed
+# to stdout (parser and lexer messages), its output and how it failed
+def run(program, engine, inputs=(), **options):
+    interpreter = Interpreter(console_output=False, inp=list(inputs), engine=engine,
+                              call_depth_limit=CALL_DEPTH_LIMIT, **options)
+    stdout = io.StringIO()
+    error = None
+    with contextlib.redirect_stdout(stdout):
+        try:
+            interpreter.run(program)
+        except Exception as e:
+            error = describe_error(e)
+    return stdout.getvalue().splitlines(), interpreter.get_output(), error
+
+
+# the lines a .out file holds for a result
+def transcript(result):
+    messages, output, error = result
+    lines = messages + [str(line) for line in output]
+    if error is not None:
+        lines.append(f'error: {error}')
+    return lines
+
+
+def parse_result(program, backend):
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        try:
+            result = str(brewparse.parse_program(program, use_cache=False, backend=backend))
+        except Exception as e:
+            result = describe_error(e)
+    return stdout.getvalue(), result
+
+
+# every way the engines and parsers disagree on program, as readable lines
+def differences(program, inputs=(), engines=ENGINES, expected=None):
+    found = []
+    for options in MODES:
+        reference = run(program, REFERENCE_ENGINE, inputs, **options)
+        mode = ' short_circuit' if options else ''
+        if expected is not None and transcript(reference) != expected:
+            found.append(f'{REFERENCE_ENGINE}{mode}: {transcript(reference)}, expected {expected}')
+        for engine in engines:
+            result = run(program, engine, inputs, **options)
+            if result != reference:
+                found.append(f'{engine}{mode}: {transcript(result)}, {REFERENCE_ENGINE} gave {transcript(reference)}')
+    parses = {backend: parse_result(program, backend) for backend in PARSER_BACKENDS}
+    first = PARSER_BACKENDS[0]
+    for backend in PARSER_BACKENDS[1:]:
+        if parses[backend] != parses[first]:
+            found.append(f'{backend} parser: {parses[backend]}, {first} gave {parses[first]}')
+    return found
+
+
+# corpus
+
+def read_lines(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def corpus_names():
+    return sorted(name[:-3] for name in os.listdir(PROGRAM_DIR) if name.endswith('.br'))
+
+
+def load_program(name):
+    base = os.path.join(PROGRAM_DIR, name)
+    with open(base + '.br') as f:
+        program = f.read()
+    return program, read_lines(base + '.in') or (), read_lines(base + '.out')
+
+
+def write_expected(name):
+    program, inputs, expected = load_program(name)
+    if expected is None:
+        with open(os.path.join(PROGRAM_DIR, name + '.out'), 'w') as f:
+            f.writelines(line + '\n' for line in transcript(run(program, REFERENCE_ENGINE, inputs)))
+
+
+# random programs: a few overloaded functions with by-value and ref
+# formals, and a main that mixes every kind of statement and expression
+# over variables, fields, functions and lambdas
+
+VARIABLES = ['a', 'b', 'c', 'o.x', 'o.y', 'p', 'q']
+FUNCTIONS = ['f', 'g', 'h']
+OPERATORS = ['+', '-', '*', '/', '==', '!=', '<', '<=', '>', '>=', '&&', '||']
+INPUTS = ['3', '4', '5', '6'] * 50
+
+
+def random_expression(rng, depth=3):
+    if depth <= 0 or rng.random() < 0.3:
+        kind = rng.randrange(6)
+        if kind == 0:
+            return str(rng.randrange(-3, 10))
+        if kind == 1:
+            return rng.choice(['"s"', '"t"', 'true', 'false', 'nil'])
+        if kind == 2:
+            return rng.choice(VARIABLES)
+        if kind == 3:
+            return rng.choice(FUNCTIONS + ['k'])
+        if kind == 4:
+            return '@'
+        return random_call(rng, FUNCTIONS + ['k', 'o.m', 'inputi'], depth - 1)
+    kind = rng.randrange(10)
+    if kind == 0:
+        return f'-{random_expression(rng, depth - 1)}'
+    if kind == 1:
+        return f'!{random_expression(rng, depth - 1)}'
+    if kind == 2:
+        return f'lambda(p) {{ {random_statement(rng, 1)} return p + {random_expression(rng, depth - 1)}; }}'
+    op1 = random_expression(rng, depth - 1)
+    op2 = random_expression(rng, depth - 1)
+    return f'({op1} {rng.choice(OPERATORS)} {op2})'
+
+
+def random_call(rng, names, depth):
+    args = ', '.join(random_expression(rng, depth) for _ in range(rng.randrange(3)))
+    return f'{rng.choice(names)}({args})'
+
+
+def random_statement(rng, depth=2):
+    kind = rng.randrange(9)
+    if depth > 0 and kind == 0:
+        statement = f'if ({random_expression(rng)}) {{ {random_statements(rng, depth - 1)} }}'
+        if rng.random() < 0.5:
+            statement += f' else {{ {random_statements(rng, depth - 1)} }}'
+        return statement
+    if depth > 0 and kind == 1:
+        counter = rng.choice('ijk')
+        body = random_statements(rng, depth - 1)
+        return f'{counter} = 0; while ({counter} < {rng.randrange(4)}) {{ {counter} = {counter} + 1; {body} }}'
+    if kind == 2:
+        return f'return {random_expression(rng)};' if rng.random() < 0.3 else 'print("r");'
+    if kind in (3, 4):
+        return f'print({", ".join(random_expression(rng) for _ in range(rng.randrange(1, 3)))});'
+    if kind == 5:
+        return random_call(rng, FUNCTIONS + ['k'], 3) + ';'
+    if kind == 6:
+        return f'{random_expression(rng)};'
+    return f'{rng.choice(VARIABLES)} = {random_expression(rng)};'
+
+
+def random_statements(rng, depth):
+    return ' '.join(random_statement(rng, depth) for _ in range(rng.randrange(1, 4)))
+
+
+def random_program(seed):
+    rng = random.Random(seed)
+    lines = []
+    for name in FUNCTIONS:
+        for arity in rng.sample([0, 1, 2], rng.randrange(1, 3)):
+            formals = ', '.join(rng.choice(['', 'ref ']) + formal for formal in ['p', 'q'][:arity])
+            lines.append(f'func {name}({formals}) {{ {random_statements(rng, 1)} }}')
+    lines.append('func main() { a = 1; b = "x"; c = true; o = @; o.x = 2; k = lambda(p) { return p; }; '
+                 f'{random_statements(rng, 2)} print(a, b, c); }}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--random', type=int, default=0, help='how many random programs to check')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first random program')
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    parser.add_argument('--write-expected', action='store_true', help='write the missing .out files')
+    args = parser.parse_args()
+    engines = args.engines.split(',')
+
+    failed = 0
+    names = corpus_names()
+    for name in names:
+        if args.write_expected:
+            write_expected(name)
+        program, inputs, expected = load_program(name)
+        for line in differences(program, inputs, engines, expected):
+            failed += 1
+            print(f'{name}: {line}')
+    for seed in range(args.seed, args.seed + args.random):
+        for line in differences(random_program(seed), INPUTS, engines):
+            failed += 1
+            print(f'random seed {seed}: {line}')
+    print(f'{len(names)} programs, {args.random} random programs, {failed} differences')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
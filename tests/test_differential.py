@@ -0,0 +1,23 @@
+import pytest
+
+from differential import INPUTS, corpus_names, differences, load_program, random_program
+
+'''
+Runs tests/differential.py's checks under pytest: every program in
+tests/programs, and the first RANDOM_PROGRAMS random programs. Use
+python -m tests.differential --random N to check more of them.
+'''
+
+RANDOM_PROGRAMS = 50
+
+
+@pytest.mark.parametrize('name', corpus_names())
+def test_program(name):
+    program, inputs, expected = load_program(name)
+    assert expected is not None, f'{name}.out is missing, see --write-expected'
+    assert differences(program, inputs, expected=expected) == []
+
+
+@pytest.mark.parametrize('seed', range(RANDOM_PROGRAMS))
+def test_random_program(seed):
+    assert differences(random_program(seed), INPUTS) == []